@@ -3,6 +3,8 @@ from Resource import Resource
 
 
 class QAPPublisher(Resource):
+    __slots__ = ("id",)
+
     def __init__(
         self,
         publisherId: str,
@@ -1,63 +1,275 @@
+import sys
+import threading
+import time
 from datetime import datetime
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Callable, Iterable, Tuple
 from abc import abstractmethod
+from serialization import dumps
+
+# One shared dict per distinct metadata, so resources described alike cost nothing extra
+_metadata_pool: Dict[Tuple, Dict[str, Any]] = {}
+# Resources are added from request threads while a catalog reload prunes the pool
+_metadata_pool_lock = threading.Lock()
+
+_EMPTY_METADATA: Dict[str, Any] = {}
+
+
+def intern_metadata(metadata: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Return the shared copy of `metadata`. The result must not be mutated."""
+    if not metadata:
+        return _EMPTY_METADATA
+    try:
+        # The type is part of the key: True, 1 and 1.0 hash alike but must not be merged
+        key = tuple(sorted((k, type(v), v) for k, v in metadata.items()))
+        hash(key)
+    except TypeError:
+        # Unhashable values (lists, nested dicts) aren't shared
+        return metadata
+    with _metadata_pool_lock:
+        shared = _metadata_pool.get(key)
+        if shared is None:
+            shared = _metadata_pool[key] = {
+                sys.intern(k): sys.intern(v) if isinstance(v, str) else v
+                for k, v in metadata.items()
+            }
+        return shared
+
+
+def prune_metadata_pool(in_use: Iterable[Dict[str, Any]]) -> None:
+    """Drop shared metadata that no resource in `in_use` refers to any more."""
+    keep = {id(metadata) for metadata in in_use}
+    with _metadata_pool_lock:
+        for key in [key for key, shared in _metadata_pool.items() if id(shared) not in keep]:
+            del _metadata_pool[key]
+
+
+def _to_ts(value: Optional[datetime]) -> Optional[float]:
+    return value.timestamp() if value is not None else None
+
+
+def _to_datetime(ts: Optional[float]) -> Optional[datetime]:
+    return datetime.fromtimestamp(ts) if ts is not None else None
 
 
 @abstractmethod
 class Resource:
+    # Slotted, with epoch-second timestamps and interned metadata, so large
+    # fleets stay small; taken_at and lease_expires_at remain datetimes to callers.
+    __slots__ = (
+        "name", "metadata", "taken_by", "taken_at_ts", "lease_expires_ts",
+        "lock", "resource_type", "resource_id", "dirty", "_on_change",
+        "_generation", "_info_json", "_status_json", "health", "health_checked_ts",
+    )
+
     def __init__(self, name: str, metadata: Optional[Dict[str, Any]] = None):
         self.name = name
-        self.metadata = metadata or {}
+        self.metadata = intern_metadata(metadata)
         self.taken_by: Optional[str] = None
-        self.taken_at: Optional[datetime] = None
+        self.taken_at_ts: Optional[float] = None
+        # When the current hold lapses, if it was taken with a TTL
+        self.lease_expires_ts: Optional[float] = None
+
+        # Guards every state transition. Reentrant so callers can hold it
+        # across several operations (e.g. a take followed by a save).
+        self.lock = threading.RLock()
+
+        # Set by the registry when the resource is registered
+        self.resource_type: Optional[str] = None
+        self.resource_id: Optional[str] = None
+        self.dirty = False
+        self._on_change: Optional[Callable[["Resource", str, Optional[str]], None]] = None
+
+        # Bumped after every change; cached JSON is tagged with the generation it was built at
+        self._generation = 0
+        self._info_json: Optional[Tuple[int, bytes]] = None
+        self._status_json: Optional[Tuple[int, bytes]] = None
+
+        # Latest probe result as (healthy, since, error), and when it was last confirmed
+        self.health: Optional[Tuple[bool, float, Optional[str]]] = None
+        self.health_checked_ts: Optional[float] = None
+
+    def bind(
+        self,
+        resource_type: str,
+        resource_id: str,
+        on_change: Optional[Callable[["Resource", str, Optional[str]], None]] = None
+    ) -> None:
+        """Attach the resource to a registry so it can report its own changes."""
+        self.resource_type = resource_type
+        self.resource_id = resource_id
+        self._on_change = on_change
+
+    @property
+    def taken_at(self) -> Optional[datetime]:
+        return _to_datetime(self.taken_at_ts)
+
+    @taken_at.setter
+    def taken_at(self, value: Optional[datetime]) -> None:
+        self.taken_at_ts = _to_ts(value)
+
+    @property
+    def lease_expires_at(self) -> Optional[datetime]:
+        return _to_datetime(self.lease_expires_ts)
+
+    @lease_expires_at.setter
+    def lease_expires_at(self, value: Optional[datetime]) -> None:
+        self.lease_expires_ts = _to_ts(value)
+
+    def invalidate(self) -> None:
+        """Drop cached JSON after a change made outside the state transitions."""
+        self._generation += 1
+
+    def _mark_changed(self, action: str, previous_holder: Optional[str]) -> None:
+        self.dirty = True
+        self._generation += 1
+        if self._on_change is not None:
+            self._on_change(self, action, previous_holder)
+
+    @staticmethod
+    def _lease_deadline(now: float, ttl: Optional[float]) -> Optional[float]:
+        return now + ttl if ttl else None
 
     def is_taken(self) -> bool:
         return self.taken_by is not None
 
-    def try_to_take(self, user: str) -> bool:
-        if self.is_taken():
-            return False
-        self.taken_by = user
-        self.taken_at = datetime.now()
-        return True
-
-    def steal(self, user: str) -> Dict[str, Any]:
-        previous_holder = self.taken_by
-        previous_taken_at = self.taken_at
-        self.taken_by = user
-        self.taken_at = datetime.now()
-        return {
-            "previous_holder": previous_holder,
-            "previous_taken_at": previous_taken_at,
-        }
+    def try_to_take(self, user: str, ttl: Optional[float] = None, action: str = "take") -> bool:
+        with self.lock:
+            if self.is_taken():
+                return False
+            self.taken_by = user
+            self.taken_at_ts = time.time()
+            self.lease_expires_ts = self._lease_deadline(self.taken_at_ts, ttl)
+            self._mark_changed(action, None)
+            return True
 
-    def release(self, user: Optional[str] = None) -> bool:
-        if not self.is_taken():
-            return False
-        if user is not None and user != self.taken_by:
-            return False
-        self.taken_by = None
-        self.taken_at = None
-        return True
+    def steal(self, user: str, ttl: Optional[float] = None) -> Dict[str, Any]:
+        with self.lock:
+            previous_holder = self.taken_by
+            previous_taken_at = self.taken_at
+            self.taken_by = user
+            self.taken_at_ts = time.time()
+            self.lease_expires_ts = self._lease_deadline(self.taken_at_ts, ttl)
+            self._mark_changed("steal", previous_holder)
+            return {
+                "previous_holder": previous_holder,
+                "previous_taken_at": previous_taken_at,
+            }
+
+    def release(self, user: Optional[str] = None, action: str = "release") -> bool:
+        with self.lock:
+            if not self.is_taken():
+                return False
+            if user is not None and user != self.taken_by:
+                return False
+            previous_holder = self.taken_by
+            self.taken_by = None
+            self.taken_at_ts = None
+            self.lease_expires_ts = None
+            self._mark_changed(action, previous_holder)
+            return True
 
     def force_release(self) -> bool:
-        return self.release() if self.is_taken() else False
+        with self.lock:
+            return self.release(action="force_release") if self.is_taken() else False
+
+    def renew(self, user: str, ttl: float) -> bool:
+        """Extend the holder's lease to `ttl` seconds from now."""
+        with self.lock:
+            if self.taken_by != user:
+                return False
+            self.lease_expires_ts = self._lease_deadline(time.time(), ttl)
+            self._mark_changed("renew", user)
+            return True
+
+    def expire(self, now: Optional[datetime] = None) -> bool:
+        """Release the resource if its lease has lapsed."""
+        with self.lock:
+            now = now.timestamp() if now is not None else time.time()
+            if self.lease_expires_ts is None or self.lease_expires_ts > now:
+                return False
+            return self.release(action="expire")
+
+    def record_health(self, healthy: Optional[bool], error: Optional[str] = None) -> bool:
+        """Record a probe result, or clear it with None. Returns True if the reported health changed.
+
+        Probes that only confirm the current result update health_checked_ts
+        without touching the cached JSON or the registry version.
+        """
+        with self.lock:
+            now = time.time()
+            self.health_checked_ts = now if healthy is not None else None
+            current = self.health
+            if current is None and healthy is None:
+                return False
+            if current is not None and (current[0], current[2]) == (healthy, error):
+                return False
+            self.health = (healthy, now, error) if healthy is not None else None
+            self._generation += 1
+            if self._on_change is not None:
+                # Not a reservation change: nothing to persist or record in history
+                self._on_change(self, None, self.taken_by)
+            return True
+
+    def is_unhealthy(self, ttl: float, now: Optional[float] = None) -> bool:
+        """Whether the latest probe failed and is at most `ttl` seconds old."""
+        health = self.health
+        checked_ts = self.health_checked_ts
+        if health is None or health[0] or checked_ts is None:
+            return False
+        return (now if now is not None else time.time()) - checked_ts <= ttl
+
+    def _health_info(self) -> Optional[Dict[str, Any]]:
+        health = self.health
+        if health is None:
+            return None
+        healthy, since, error = health
+        return {"healthy": healthy, "since": datetime.fromtimestamp(since).isoformat(), "error": error}
 
     def get_current_holder(self) -> Optional[str]:
         return self.taken_by
 
     def get_status(self) -> Dict[str, Any]:
+        taken_at_ts = self.taken_at_ts
+        lease_expires_ts = self.lease_expires_ts
         return {
-            "is_taken": self.is_taken(),
+            "is_taken": self.taken_by is not None,
             "taken_by": self.taken_by,
-            "taken_at": self.taken_at.isoformat() if self.taken_at else None,
+            "taken_at": datetime.fromtimestamp(taken_at_ts).isoformat() if taken_at_ts is not None else None,
+            "lease_expires_at": datetime.fromtimestamp(lease_expires_ts).isoformat() if lease_expires_ts is not None else None,
+            "health": self._health_info(),
         }
 
     def get_info(self) -> Dict[str, Any]:
+        taken_at_ts = self.taken_at_ts
+        lease_expires_ts = self.lease_expires_ts
         return {
             "name": self.name,
-            "is_taken": self.is_taken(),
+            "is_taken": self.taken_by is not None,
             "taken_by": self.taken_by,
-            "taken_at": self.taken_at.isoformat() if self.taken_at else None,
+            "taken_at": datetime.fromtimestamp(taken_at_ts).isoformat() if taken_at_ts is not None else None,
+            "lease_expires_at": datetime.fromtimestamp(lease_expires_ts).isoformat() if lease_expires_ts is not None else None,
+            "health": self._health_info(),
             "metadata": self.metadata
         }
+
+    # A serializer racing a change tags its bytes with the old generation,
+    # so they are never served once the change is complete.
+    def info_json(self) -> bytes:
+        """get_info() as JSON bytes, cached until the resource changes."""
+        generation = self._generation
+        cached = self._info_json
+        if cached is not None and cached[0] == generation:
+            return cached[1]
+        body = dumps(self.get_info())
+        self._info_json = (generation, body)
+        return body
+
+    def status_json(self) -> bytes:
+        """get_status() as JSON bytes, cached until the resource changes."""
+        generation = self._generation
+        cached = self._status_json
+        if cached is not None and cached[0] == generation:
+            return cached[1]
+        body = dumps(self.get_status())
+        self._status_json = (generation, body)
+        return body
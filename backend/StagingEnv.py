@@ -3,6 +3,8 @@ from Resource import Resource
 
 
 class StagingEnv(Resource):
+    __slots__ = ()
+
     def __init__(
         self,
         name: str,
@@ -0,0 +1,402 @@
+import math
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+HOUR = 3600
+DAY = 86400
+
+# Actions that start and end a hold
+ACQUIRE_ACTIONS = ("take", "steal", "handoff")
+END_ACTIONS = ("release", "force_release", "expire")
+# Actions that end a wait without the resource being handed over
+WAIT_END_ACTIONS = ("wait_timeout", "wait_cancel")
+
+
+PERCENTILES = (("p50", 0.50), ("p95", 0.95))
+
+
+def _iso(ts: float) -> str:
+    return datetime.fromtimestamp(ts, timezone.utc).isoformat()
+
+
+class UtilizationAnalytics:
+    """Utilization rollups over the reservation_events log.
+
+    Events are folded, in id order, into rollup tables next to the log:
+    completed holds, queued acquisitions, per-hour held seconds and per-day
+    action counts. A watermark records the last event folded in, so each
+    refresh only reads events appended since the previous one; queries then
+    aggregate the rollups in SQL instead of replaying the log. Durations
+    are stored in covering indexes, so a percentile is one index walk to
+    its rank rather than a sort.
+
+    Hour and day buckets are UTC.
+    """
+
+    def __init__(self, db_path: Path):
+        self.db_path = db_path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        # Holds and waits still open at the watermark, restored from the database
+        self._open_holds: Optional[Dict[Tuple[str, str], Tuple[str, float, str]]] = None
+        self._open_waits: Dict[Tuple[str, str, str], float] = {}
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._init_tables(conn)
+            self._conn = conn
+        return self._conn
+
+    @staticmethod
+    def _init_tables(conn: sqlite3.Connection) -> None:
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS analytics_state (
+                key TEXT PRIMARY KEY,
+                value REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS analytics_holds (
+                resource_type TEXT NOT NULL,
+                resource_id TEXT NOT NULL,
+                user TEXT,
+                start_ts REAL NOT NULL,
+                end_ts REAL NOT NULL,
+                duration REAL NOT NULL,
+                start_action TEXT NOT NULL,
+                end_action TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_holds_resource_duration
+                ON analytics_holds (resource_type, resource_id, duration, start_ts);
+            CREATE INDEX IF NOT EXISTS idx_holds_duration ON analytics_holds (duration, start_ts);
+            CREATE TABLE IF NOT EXISTS analytics_acquires (
+                resource_type TEXT NOT NULL,
+                resource_id TEXT NOT NULL,
+                user TEXT,
+                wait_ts REAL NOT NULL,
+                acquired_ts REAL NOT NULL,
+                duration REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_acquires_resource_duration
+                ON analytics_acquires (resource_type, resource_id, duration, wait_ts);
+            CREATE INDEX IF NOT EXISTS idx_acquires_duration ON analytics_acquires (duration, wait_ts);
+            CREATE TABLE IF NOT EXISTS analytics_occupancy (
+                resource_type TEXT NOT NULL,
+                resource_id TEXT NOT NULL,
+                hour REAL NOT NULL,
+                held_seconds REAL NOT NULL,
+                PRIMARY KEY (resource_type, resource_id, hour)
+            );
+            CREATE INDEX IF NOT EXISTS idx_occupancy_hour ON analytics_occupancy (hour);
+            CREATE TABLE IF NOT EXISTS analytics_occupancy_daily (
+                resource_type TEXT NOT NULL,
+                resource_id TEXT NOT NULL,
+                day REAL NOT NULL,
+                held_seconds REAL NOT NULL,
+                PRIMARY KEY (resource_type, resource_id, day)
+            );
+            CREATE TABLE IF NOT EXISTS analytics_daily_actions (
+                resource_type TEXT NOT NULL,
+                resource_id TEXT NOT NULL,
+                day REAL NOT NULL,
+                action TEXT NOT NULL,
+                count INTEGER NOT NULL,
+                PRIMARY KEY (resource_type, resource_id, day, action)
+            );
+            CREATE TABLE IF NOT EXISTS analytics_open (
+                kind TEXT NOT NULL,
+                resource_type TEXT NOT NULL,
+                resource_id TEXT NOT NULL,
+                user TEXT,
+                ts REAL NOT NULL,
+                action TEXT
+            );
+        """)
+
+    def _load_open(self, conn: sqlite3.Connection) -> None:
+        self._open_holds = {}
+        self._open_waits = {}
+        for kind, resource_type, resource_id, user, ts, action in conn.execute(
+            "SELECT kind, resource_type, resource_id, user, ts, action FROM analytics_open"
+        ):
+            if kind == "hold":
+                self._open_holds[(resource_type, resource_id)] = (user, ts, action)
+            else:
+                self._open_waits[(resource_type, resource_id, user)] = ts
+
+    @staticmethod
+    def _hour_slices(start: float, end: float) -> Iterable[Tuple[float, float]]:
+        """Split [start, end) into (hour, seconds) pieces."""
+        hour = math.floor(start / HOUR) * HOUR
+        while hour < end:
+            seconds = min(end, hour + HOUR) - max(start, hour)
+            if seconds > 0:
+                yield hour, seconds
+            hour += HOUR
+
+    def refresh(self, batch_size: int = 50000) -> int:
+        """Fold events appended since the watermark into the rollups. Returns how many were read."""
+        with self._lock:
+            conn = self._connect()
+            if self._open_holds is None:
+                self._load_open(conn)
+            row = conn.execute("SELECT value FROM analytics_state WHERE key = 'last_event_id'").fetchone()
+            watermark = int(row[0]) if row else 0
+            total = 0
+            while True:
+                events = conn.execute("""
+                    SELECT id, ts, resource_type, resource_id, action, user
+                    FROM reservation_events
+                    WHERE id > ?
+                    ORDER BY id
+                    LIMIT ?
+                """, (watermark, batch_size)).fetchall()
+                if not events:
+                    return total
+                self._fold(conn, events)
+                watermark = events[-1][0]
+                total += len(events)
+
+    def _fold(self, conn: sqlite3.Connection, events: List[tuple]) -> None:
+        holds = []
+        acquires = []
+        occupancy: Dict[Tuple[str, str, float], float] = {}
+        daily: Dict[Tuple[str, str, float], float] = {}
+        actions: Dict[Tuple[str, str, float, str], int] = {}
+        # Folded into copies, kept only once the rollups commit: a failed write
+        # leaves the watermark behind, and the next refresh re-folds these events
+        open_holds = dict(self._open_holds)
+        open_waits = dict(self._open_waits)
+
+        def close_hold(key, end_ts, end_action):
+            user, start_ts, start_action = open_holds.pop(key)
+            holds.append((*key, user, start_ts, end_ts, end_ts - start_ts, start_action, end_action))
+            for hour, seconds in self._hour_slices(start_ts, end_ts):
+                occupancy[(*key, hour)] = occupancy.get((*key, hour), 0.0) + seconds
+                day = (*key, hour // DAY * DAY)
+                daily[day] = daily.get(day, 0.0) + seconds
+
+        for _, ts, resource_type, resource_id, action, user in events:
+            key = (resource_type, resource_id)
+            day_key = (resource_type, resource_id, math.floor(ts / DAY) * DAY, action)
+            actions[day_key] = actions.get(day_key, 0) + 1
+
+            if action in ACQUIRE_ACTIONS:
+                if key in open_holds:
+                    close_hold(key, ts, action)
+                open_holds[key] = (user, ts, action)
+                # Only a hand-off ends a wait with the resource; a direct take is a fresh acquisition
+                if action == "handoff":
+                    waited_since = open_waits.pop((resource_type, resource_id, user), None)
+                    if waited_since is not None:
+                        acquires.append((resource_type, resource_id, user, waited_since, ts, ts - waited_since))
+            elif action in END_ACTIONS:
+                if key in open_holds:
+                    close_hold(key, ts, action)
+            elif action == "wait":
+                open_waits[(resource_type, resource_id, user)] = ts
+            elif action in WAIT_END_ACTIONS:
+                open_waits.pop((resource_type, resource_id, user), None)
+
+        with conn:
+            conn.executemany("""
+                INSERT INTO analytics_holds
+                (resource_type, resource_id, user, start_ts, end_ts, duration, start_action, end_action)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """, holds)
+            conn.executemany("""
+                INSERT INTO analytics_acquires (resource_type, resource_id, user, wait_ts, acquired_ts, duration)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, acquires)
+            conn.executemany("""
+                INSERT INTO analytics_occupancy (resource_type, resource_id, hour, held_seconds)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT (resource_type, resource_id, hour)
+                DO UPDATE SET held_seconds = held_seconds + excluded.held_seconds
+            """, [(*key, seconds) for key, seconds in occupancy.items()])
+            conn.executemany("""
+                INSERT INTO analytics_occupancy_daily (resource_type, resource_id, day, held_seconds)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT (resource_type, resource_id, day)
+                DO UPDATE SET held_seconds = held_seconds + excluded.held_seconds
+            """, [(*key, seconds) for key, seconds in daily.items()])
+            conn.executemany("""
+                INSERT INTO analytics_daily_actions (resource_type, resource_id, day, action, count)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (resource_type, resource_id, day, action)
+                DO UPDATE SET count = count + excluded.count
+            """, [(*key, count) for key, count in actions.items()])
+            conn.execute("DELETE FROM analytics_open")
+            conn.executemany(
+                "INSERT INTO analytics_open (kind, resource_type, resource_id, user, ts, action) VALUES ('hold', ?, ?, ?, ?, ?)",
+                [(*key, user, ts, action) for key, (user, ts, action) in open_holds.items()]
+            )
+            conn.executemany(
+                "INSERT INTO analytics_open (kind, resource_type, resource_id, user, ts) VALUES ('wait', ?, ?, ?, ?)",
+                [(*key, ts) for key, ts in open_waits.items()]
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO analytics_state (key, value) VALUES ('last_event_id', ?)",
+                (events[-1][0],)
+            )
+        self._open_holds = open_holds
+        self._open_waits = open_waits
+
+    @staticmethod
+    def _where(
+        time_column: str,
+        resource_type: Optional[str],
+        resource_id: Optional[str],
+        since: Optional[datetime],
+        until: Optional[datetime]
+    ) -> Tuple[str, list]:
+        clauses = []
+        params = []
+        if resource_type is not None:
+            clauses.append("resource_type = ?")
+            params.append(resource_type)
+        if resource_id is not None:
+            clauses.append("resource_id = ?")
+            params.append(resource_id)
+        if since is not None:
+            clauses.append(f"{time_column} >= ?")
+            params.append(since.timestamp())
+        if until is not None:
+            clauses.append(f"{time_column} < ?")
+            params.append(until.timestamp())
+        return (f"WHERE {' AND '.join(clauses)}" if clauses else ""), params
+
+    def _duration_stats(
+        self,
+        table: str,
+        time_column: str,
+        resource_type: Optional[str],
+        resource_id: Optional[str],
+        since: Optional[datetime],
+        until: Optional[datetime]
+    ) -> Dict[str, Any]:
+        """Per-resource and overall count, percentiles, max and mean of a duration column."""
+        where, params = self._where(time_column, resource_type, resource_id, since, until)
+        with self._lock:
+            conn = self._connect()
+
+            def percentiles(where, params, count):
+                # Nearest rank, read straight off the duration index
+                return {
+                    name: conn.execute(
+                        f"SELECT duration FROM {table} {where} ORDER BY duration LIMIT 1 OFFSET ?",
+                        (*params, max(0, math.ceil(p * count) - 1))
+                    ).fetchone()[0] if count else None
+                    for name, p in PERCENTILES
+                }
+
+            groups = conn.execute(f"""
+                SELECT resource_type, resource_id, COUNT(*), SUM(duration), MAX(duration)
+                FROM {table} {where}
+                GROUP BY resource_type, resource_id
+            """, params).fetchall()
+            per_resource = {}
+            for group_type, group_id, count, total, longest in groups:
+                group_where, group_params = self._where(time_column, group_type, group_id, since, until)
+                per_resource.setdefault(group_type, {})[group_id] = {
+                    "count": count,
+                    **percentiles(group_where, group_params, count),
+                    "max": longest,
+                    "mean": total / count,
+                }
+
+            count = sum(group[2] for group in groups)
+            overall = {
+                "count": count,
+                **percentiles(where, params, count),
+                "max": max((group[4] for group in groups), default=None),
+                "mean": sum(group[3] for group in groups) / count if count else None,
+            }
+        return {"overall": overall, "resources": per_resource}
+
+    def hold_times(
+        self,
+        resource_type: Optional[str] = None,
+        resource_id: Optional[str] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None
+    ) -> Dict[str, Any]:
+        """Hold-time percentiles in seconds for holds that started in the window."""
+        return self._duration_stats("analytics_holds", "start_ts", resource_type, resource_id, since, until)
+
+    def acquire_times(
+        self,
+        resource_type: Optional[str] = None,
+        resource_id: Optional[str] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None
+    ) -> Dict[str, Any]:
+        """Seconds from joining a wait queue to being handed the resource."""
+        return self._duration_stats("analytics_acquires", "wait_ts", resource_type, resource_id, since, until)
+
+    def steal_rates(
+        self,
+        resource_type: Optional[str] = None,
+        resource_id: Optional[str] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None
+    ) -> Dict[str, Any]:
+        """Steals as a share of all acquisitions, per resource, at day granularity."""
+        where, params = self._where("day", resource_type, resource_id, since, until)
+        with self._lock:
+            rows = self._connect().execute(f"""
+                SELECT resource_type, resource_id,
+                       SUM(CASE WHEN action IN ('take', 'steal', 'handoff') THEN count ELSE 0 END),
+                       SUM(CASE WHEN action = 'steal' THEN count ELSE 0 END),
+                       SUM(CASE WHEN action = 'wait' THEN count ELSE 0 END)
+                FROM analytics_daily_actions {where}
+                GROUP BY resource_type, resource_id
+            """, params).fetchall()
+        per_resource = {}
+        for resource_type, resource_id, acquisitions, steals, waits in rows:
+            per_resource.setdefault(resource_type, {})[resource_id] = {
+                "acquisitions": acquisitions,
+                "steals": steals,
+                "waits": waits,
+                "steal_rate": steals / acquisitions if acquisitions else None,
+            }
+        return {"resources": per_resource}
+
+    def occupancy(
+        self,
+        bucket: str = "hour",
+        resource_type: Optional[str] = None,
+        resource_id: Optional[str] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None
+    ) -> Dict[str, Any]:
+        """Share of each hour or day a resource was held, from completed holds."""
+        if bucket == "day":
+            size, table, column = DAY, "analytics_occupancy_daily", "day"
+        else:
+            size, table, column = HOUR, "analytics_occupancy", "hour"
+        where, params = self._where(column, resource_type, resource_id, since, until)
+        with self._lock:
+            rows = self._connect().execute(f"""
+                SELECT resource_type, resource_id, {column}, held_seconds
+                FROM {table} {where}
+                ORDER BY resource_type, resource_id, {column}
+            """, params).fetchall()
+        per_resource = {}
+        for resource_type, resource_id, start, held_seconds in rows:
+            per_resource.setdefault(resource_type, {}).setdefault(resource_id, []).append({
+                "start": _iso(start),
+                "held_seconds": held_seconds,
+                "occupancy": held_seconds / size,
+            })
+        return {"bucket": column, "resources": per_resource}
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -0,0 +1,119 @@
+"""Benchmark: utilization analytics over a year of synthetic reservation history.
+
+Writes a year of take/steal/release/wait/handoff events for a fleet of
+environments straight into reservation_events, times the initial rollup
+and an incremental refresh, then times each analytics query.
+
+    cd backend
+    python benchmarks/analytics_queries.py --resources 50 --holds-per-day 40
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+DAY = 86400
+
+
+def synthetic_events(resources: int, holds_per_day: int, days: int, start: float, seed: int = 1):
+    """Yield (ts, type, id, action, user, previous_holder) in time order per resource."""
+    rng = random.Random(seed)
+    for n in range(resources):
+        resource_id = f"env-{n}"
+        ts = start
+        end = start + days * DAY
+        gap = DAY / holds_per_day
+        holder = None
+        while ts < end:
+            ts += rng.expovariate(1 / gap)
+            user = f"user-{rng.randrange(200)}"
+            roll = rng.random()
+            if holder is None:
+                yield ts, "environment", resource_id, "take", user, None
+                holder = user
+            elif roll < 0.1:
+                yield ts, "environment", resource_id, "steal", user, holder
+                holder = user
+            elif roll < 0.2:
+                yield ts, "environment", resource_id, "wait", user, holder
+                ts += rng.expovariate(1 / (gap / 4))
+                yield ts, "environment", resource_id, "release", None, holder
+                yield ts, "environment", resource_id, "handoff", user, None
+                holder = user
+            else:
+                yield ts, "environment", resource_id, rng.choice(("release", "expire")), None, holder
+                holder = None
+
+
+def timed(label: str, fn, repeat: int = 5):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    print(f"{label:<34}{best * 1000:>10.1f} ms")
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--resources", type=int, default=50)
+    parser.add_argument("--holds-per-day", type=int, default=40)
+    parser.add_argument("--days", type=int, default=365)
+    args = parser.parse_args()
+
+    os.environ["DATA_DIR"] = tempfile.mkdtemp(prefix="eac-bench-")
+    from analytics import UtilizationAnalytics
+    from persistence import ResourcePersistence
+
+    persistence = ResourcePersistence()
+    start = time.time() - args.days * DAY
+    # The live log is in time order across resources; so is this
+    events = sorted(synthetic_events(args.resources, args.holds_per_day, args.days, start))
+    newest = events[-len(events) // 100:]
+    with sqlite3.connect(persistence.db_path) as conn:
+        conn.executemany("""
+            INSERT INTO reservation_events (ts, resource_type, resource_id, action, user, previous_holder)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, events[:-len(newest)])
+    print(f"{len(events):,} events over {args.days} days, {args.resources} resources")
+
+    analytics = UtilizationAnalytics(persistence.db_path)
+    started = time.perf_counter()
+    analytics.refresh()
+    print(f"{'initial rollup':<34}{(time.perf_counter() - started) * 1000:>10.1f} ms")
+
+    with sqlite3.connect(persistence.db_path) as conn:
+        conn.executemany("""
+            INSERT INTO reservation_events (ts, resource_type, resource_id, action, user, previous_holder)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, newest)
+    started = time.perf_counter()
+    analytics.refresh()
+    print(f"{f'incremental refresh ({len(newest):,} events)':<34}"
+          f"{(time.perf_counter() - started) * 1000:>10.1f} ms")
+
+    slowest = max(
+        timed("hold-time p50/p95, all", analytics.hold_times),
+        timed("hold-time p50/p95, one resource", lambda: analytics.hold_times(resource_id="env-0")),
+        timed("time-to-acquire", analytics.acquire_times),
+        timed("steal rates", analytics.steal_rates),
+        timed("occupancy by day", lambda: analytics.occupancy("day")),
+        timed("occupancy by hour, one resource", lambda: analytics.occupancy("hour", resource_id="env-0")),
+        timed("no-op refresh", analytics.refresh),
+    )
+    analytics.close()
+    persistence.close()
+    if slowest >= 1:
+        print("slowest query took over a second")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
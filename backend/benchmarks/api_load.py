@@ -0,0 +1,235 @@
+"""Load test: API throughput and latency, in-process (ASGI) or over a local uvicorn server.
+
+Builds a synthetic catalog of --resources environments in a throwaway data
+directory, then runs each scenario for --duration seconds with --concurrency
+clients issuing requests back to back:
+
+    status     GET /status, the dashboard poll
+    list       GET /environments?taken=false&limit=500, a filtered page of a large registry
+    churn      take then release, each client on its own environment
+    contended  every client steals the same environment
+
+Reports requests/s and latency percentiles per scenario. --save writes the
+results as a baseline; --baseline compares against one and exits non-zero if
+throughput dropped or p99 latency grew by more than --tolerance.
+
+    cd backend
+    python benchmarks/api_load.py --transport asgi uvicorn --save baseline.json
+    python benchmarks/api_load.py --transport asgi uvicorn --baseline baseline.json
+
+Needs httpx (pip install httpx).
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import httpx
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+SCENARIOS = ("status", "list", "churn", "contended")
+TRANSPORTS = ("asgi", "uvicorn")
+
+
+def write_catalog(path: Path, resources: int) -> None:
+    environments = [
+        {"id": f"env-{n}", "name": f"Env {n}", "metadata": {"type": f"group-{n % 20}", "instance": str(n)}}
+        for n in range(resources)
+    ]
+    path.write_text(json.dumps({"publishers": [], "environments": environments}))
+
+
+def percentile(ordered: List[float], q: float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def client_requests(client: httpx.AsyncClient, scenario: str, n: int):
+    """The requests one client sends per iteration."""
+    if scenario == "status":
+        return [client.get("/status")]
+    if scenario == "list":
+        return [client.get("/environments", params={"taken": "false", "limit": 500})]
+    if scenario == "churn":
+        env_id = f"env-{n}"
+        return [
+            client.post(f"/environments/take/{env_id}", params={"user": f"client-{n}"}),
+            client.post(f"/environments/release/{env_id}"),
+        ]
+    return [client.post("/environments/steal/env-0", params={"user": f"client-{n}"})]
+
+
+async def run_scenario(client: httpx.AsyncClient, scenario: str, concurrency: int, duration: float) -> Dict:
+    latencies: List[float] = []
+    errors = 0
+    deadline = time.perf_counter() + duration
+
+    async def run_client(n: int):
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            # Sent one after another, as a real client would
+            for request in await client_requests(client, scenario, n):
+                started = time.perf_counter()
+                response = await request
+                latencies.append(time.perf_counter() - started)
+                if response.status_code >= 400:
+                    errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(run_client(n) for n in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": len(latencies) / elapsed,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p90_ms": percentile(latencies, 0.90) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "max_ms": (latencies[-1] if latencies else 0.0) * 1000,
+    }
+
+
+async def run_all(client: httpx.AsyncClient, transport: str, args) -> Dict[str, Dict]:
+    results = {}
+    # Warm up caches and connections before measuring
+    await run_scenario(client, "status", args.concurrency, 0.2)
+    for scenario in args.scenarios:
+        result = await run_scenario(client, scenario, args.concurrency, args.duration)
+        results[f"{transport}/{scenario}"] = result
+        print(f"{transport:<10}{scenario:<11}{result['rps']:>10,.0f} req/s"
+              f"{result['p50_ms']:>9.2f}{result['p90_ms']:>9.2f}{result['p99_ms']:>9.2f}{result['max_ms']:>9.1f}"
+              f"{result['errors']:>8}")
+    return results
+
+
+def run_asgi(args) -> Dict[str, Dict]:
+    import main as api
+
+    async def go():
+        # ASGITransport does not run the lifespan, so start the registry here
+        api.resources.start()
+        try:
+            transport = httpx.ASGITransport(app=api.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+                return await run_all(client, "asgi", args)
+        finally:
+            api.resources.shutdown()
+
+    return asyncio.run(go())
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def run_uvicorn(args) -> Dict[str, Dict]:
+    port = free_port()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port),
+         "--log-level", "warning", "--no-access-log"],
+        cwd=BACKEND_DIR,
+        env=dict(os.environ),
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        deadline = time.monotonic() + 60
+        while True:
+            try:
+                if httpx.get(f"{base_url}/health").status_code == 200:
+                    break
+            except httpx.TransportError:
+                pass
+            if server.poll() is not None or time.monotonic() > deadline:
+                raise RuntimeError("uvicorn did not start")
+            time.sleep(0.1)
+
+        async def go():
+            # One keep-alive connection per client
+            limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+            async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+                return await run_all(client, "uvicorn", args)
+
+        return asyncio.run(go())
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def compare(results: Dict[str, Dict], baseline: Dict, tolerance: float) -> List[str]:
+    """Describe every scenario that regressed beyond the tolerance."""
+    recorded = baseline.get("config", {})
+    if any(recorded.get(key) != results["config"][key] for key in ("resources", "concurrency")):
+        print(f"warning: baseline was recorded with {recorded}")
+    regressions = []
+    for key, result in results["scenarios"].items():
+        before = baseline.get("scenarios", {}).get(key)
+        if before is None:
+            continue
+        if result["rps"] < before["rps"] * (1 - tolerance):
+            regressions.append(f"{key}: {result['rps']:,.0f} req/s, baseline {before['rps']:,.0f}")
+        if result["p99_ms"] > before["p99_ms"] * (1 + tolerance):
+            regressions.append(f"{key}: p99 {result['p99_ms']:.2f} ms, baseline {before['p99_ms']:.2f}")
+        if result["errors"] > before["errors"]:
+            regressions.append(f"{key}: {result['errors']} errors, baseline {before['errors']}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--transport", nargs="+", choices=TRANSPORTS, default=["asgi"])
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--resources", type=int, default=10000, help="environments in the synthetic catalog")
+    parser.add_argument("--concurrency", type=int, default=32, help="concurrent clients")
+    parser.add_argument("--duration", type=float, default=5, help="seconds per scenario")
+    parser.add_argument("--save", help="write the results to this baseline file")
+    parser.add_argument("--baseline", help="compare against this baseline file")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative regression")
+    args = parser.parse_args()
+    if args.concurrency > args.resources:
+        parser.error("--concurrency cannot exceed --resources (churn uses one environment per client)")
+
+    # Keep the benchmark away from the real database and catalog
+    data_dir = Path(tempfile.mkdtemp(prefix="eac-bench-"))
+    catalog_path = data_dir / "catalog.json"
+    write_catalog(catalog_path, args.resources)
+    os.environ["DATA_DIR"] = str(data_dir)
+    os.environ["CATALOG_PATH"] = str(catalog_path)
+
+    print(f"{args.resources:,} environments, {args.concurrency} clients, {args.duration:g}s per scenario")
+    print(f"{'transport':<10}{'scenario':<11}{'throughput':>16}{'p50 ms':>9}{'p90 ms':>9}{'p99 ms':>9}"
+          f"{'max ms':>9}{'errors':>8}")
+    scenarios = {}
+    for transport in args.transport:
+        scenarios.update(run_asgi(args) if transport == "asgi" else run_uvicorn(args))
+
+    results = {
+        "config": {"resources": args.resources, "concurrency": args.concurrency, "duration": args.duration},
+        "scenarios": scenarios,
+    }
+    if args.save:
+        Path(args.save).write_text(json.dumps(results, indent=2) + "\n")
+        print(f"Saved baseline to {args.save}")
+    if args.baseline:
+        regressions = compare(results, json.loads(Path(args.baseline).read_text()), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions beyond {args.tolerance:.0%} of {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""Benchmark: booking calendar queries over years of bookings.
+
+Fills the bookings table with one booking per resource per working day,
+--days into the past and --future-days ahead, and loads the calendar as
+the registry does at startup. Then it times conflict checks, "who holds it
+at time T" lookups and one-week listings at random times, for the future
+(served from memory) and for the past (served from SQLite). A plain SQL
+range query is timed for comparison.
+
+    cd backend
+    python benchmarks/booking_calendar.py --resources 2000 --days 730 --future-days 90
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+DAY = 86400
+
+
+def per_op(fn, count: int) -> float:
+    started = time.perf_counter()
+    for _ in range(count):
+        fn()
+    return (time.perf_counter() - started) / count * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--resources", type=int, default=2000)
+    parser.add_argument("--days", type=int, default=730, help="days of past bookings per resource")
+    parser.add_argument("--future-days", type=int, default=90, help="days of future bookings per resource")
+    parser.add_argument("--queries", type=int, default=20000)
+    args = parser.parse_args()
+
+    data_dir = Path(tempfile.mkdtemp(prefix="eac-bench-"))
+    os.environ["DATA_DIR"] = str(data_dir)
+    from bookings import BookingCalendar, BookingConflict
+
+    db_path = data_dir / "resources.db"
+    BookingCalendar(db_path).close()
+    now = time.time()
+    origin = now - args.days * DAY
+    span = args.days + args.future_days
+    # Working hours on most days: 08:00-18:00, every 7th day left free
+    rows = (
+        ("environment", f"env-{r}", f"team-{(r + d) % 50}",
+         origin + d * DAY + 8 * 3600, origin + d * DAY + 18 * 3600, origin)
+        for r in range(args.resources) for d in range(span) if d % 7 != 6
+    )
+    with sqlite3.connect(db_path) as conn:
+        conn.executemany("""
+            INSERT INTO bookings (resource_type, resource_id, user, start_ts, end_ts, created_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, rows)
+        total = conn.execute("SELECT COUNT(*) FROM bookings").fetchone()[0]
+
+    tracemalloc.start()
+    probe = BookingCalendar(db_path)
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    probe.close()
+    del probe
+    started = time.perf_counter()
+    calendar = BookingCalendar(db_path)
+    load = time.perf_counter() - started
+    print(f"{total:,} bookings over {args.resources:,} resources, {len(calendar):,} not yet ended: "
+          f"loaded in {load:.2f}s, {memory / 2**20:.0f} MiB")
+
+    rng = random.Random(1)
+
+    def future_point():
+        return f"env-{rng.randrange(args.resources)}", now + rng.random() * args.future_days * DAY
+
+    def past_point():
+        return f"env-{rng.randrange(args.resources)}", origin + rng.random() * args.days * DAY
+
+    def holder(point):
+        resource_id, ts = point()
+        calendar.holder_at("environment", resource_id, ts)
+
+    def conflict():
+        resource_id, ts = future_point()
+        try:
+            # Each probe would conflict or succeed; roll back successes to keep the data fixed
+            booking = calendar.book("environment", resource_id, "probe", ts, ts + 3600)
+            calendar.cancel(booking.id)
+        except BookingConflict:
+            pass
+
+    def week(point):
+        resource_id, ts = point()
+        calendar.find("environment", resource_id, since=ts, until=ts + 7 * DAY)
+
+    sql = sqlite3.connect(db_path)
+
+    def holder_sql():
+        resource_id, ts = future_point()
+        sql.execute("""
+            SELECT id FROM bookings
+            WHERE resource_type = 'environment' AND resource_id = ? AND start_ts <= ? AND end_ts > ?
+        """, (resource_id, ts, ts)).fetchall()
+
+    print(f"{'holder_at, future':<30}{per_op(lambda: holder(future_point), args.queries):>10.1f} us")
+    print(f"{'holder_at, past':<30}{per_op(lambda: holder(past_point), args.queries):>10.1f} us")
+    print(f"{'holder_at as a range query':<30}{per_op(holder_sql, max(1, args.queries // 20)):>10.1f} us")
+    print(f"{'find one week, future':<30}{per_op(lambda: week(future_point), args.queries):>10.1f} us")
+    print(f"{'find one week, past':<30}{per_op(lambda: week(past_point), args.queries):>10.1f} us")
+    print(f"{'book (conflict check)':<30}{per_op(conflict, max(1, args.queries // 20)):>10.1f} us"
+          "  (a write transaction; plus the insert and delete when free)")
+    calendar.close()
+    sql.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Stress benchmark: many concurrent take requests on one resource.
+
+Runs the take endpoint coroutines concurrently on one event loop, the same
+way uvicorn does (their blocking part goes through the anyio thread pool),
+and checks that every round has exactly one winner.
+
+    cd backend
+    python benchmarks/concurrent_take.py --requests 5000 --threads 64 --rounds 5
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import anyio.to_thread
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=5000, help="take requests per round")
+    parser.add_argument("--threads", type=int, default=64, help="worker threads")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--env", default="prime-staging", help="environment to contend on")
+    args = parser.parse_args()
+
+    # Keep the benchmark away from the real database
+    os.environ["DATA_DIR"] = tempfile.mkdtemp(prefix="eac-bench-")
+    import main as api
+
+    failed_rounds = 0
+    total_requests = 0
+    started = time.perf_counter()
+
+    async def take_round():
+        # The blocking part of each request runs on this many threads
+        anyio.to_thread.current_default_thread_limiter().total_tokens = args.threads
+        return await asyncio.gather(*(
+            api.take_environment(args.env, f"user-{i}")
+            for i in range(args.requests)
+        ))
+
+    for round_no in range(1, args.rounds + 1):
+        api.release_environment(args.env)
+
+        results = asyncio.run(take_round())
+        total_requests += len(results)
+
+        winners = [r for r in results if r["success"]]
+        holder = api.resources.get_environment(args.env).taken_by
+        ok = len(winners) == 1 and winners[0]["status"]["taken_by"] == holder
+        if not ok:
+            failed_rounds += 1
+        print(f"round {round_no}: {len(winners)} winner(s) of {len(results)}, "
+              f"holder={holder} {'OK' if ok else 'FAIL'}")
+
+    elapsed = time.perf_counter() - started
+    print(f"{total_requests} take requests in {elapsed:.2f}s "
+          f"({total_requests / elapsed:,.0f} req/s)")
+
+    if failed_rounds:
+        print(f"{failed_rounds} round(s) did not have exactly one winner")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""Benchmark: health probe cycles against a local stub HTTP server.
+
+Starts a stub server on --hosts local ports, each standing in for one host,
+and gives --resources environments a health_url on them. Every tenth
+resource answers 503, one in fifty never answers in time, and the rest
+answer 200, half with chunked bodies. Runs probe cycles with the keep-alive
+pool and again with the server closing every connection, and reports cycle
+time, probes and connections opened. It also checks that every resource
+was classified correctly.
+
+Finally, --shared resources share one host that takes --latency to answer
+every request, as every publisher's transformer_url does. Probes that
+queue for one of its --per-host connections must not time out while they
+wait, so all of them have to come back healthy.
+
+    cd backend
+    python benchmarks/health_probe.py --resources 2000 --hosts 8 --concurrency 64
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+BODY = b"ok" * 512
+
+
+def expected_health(n: int):
+    if n % 50 == 0:
+        return False
+    return n % 10 != 0
+
+
+async def serve(keep_alive: bool, slow_seconds: float, latency: float = 0.0):
+    async def handle(reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                while (await reader.readline()) not in (b"\r\n", b""):
+                    pass
+                n = int(request_line.split()[1].rsplit(b"/", 1)[1])
+                if n % 50 == 0:
+                    await asyncio.sleep(slow_seconds)
+                elif latency:
+                    await asyncio.sleep(latency)
+                status = b"200 OK" if expected_health(n) else b"503 Service Unavailable"
+                connection = b"keep-alive" if keep_alive else b"close"
+                if n % 2:
+                    writer.write(b"HTTP/1.1 " + status + b"\r\nTransfer-Encoding: chunked\r\nConnection: " + connection
+                                 + b"\r\n\r\n" + f"{len(BODY):x}".encode() + b"\r\n" + BODY + b"\r\n0\r\n\r\n")
+                else:
+                    writer.write(b"HTTP/1.1 " + status + b"\r\nContent-Length: " + str(len(BODY)).encode()
+                                 + b"\r\nConnection: " + connection + b"\r\n\r\n" + BODY)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(handle, "127.0.0.1", 0)
+
+
+async def run(args, keep_alive: bool):
+    from StagingEnv import StagingEnv
+    from health import HealthProber
+
+    servers = [await serve(keep_alive, args.timeout * 2) for _ in range(args.hosts)]
+    ports = [server.sockets[0].getsockname()[1] for server in servers]
+    fleet = [
+        StagingEnv(name=f"Env {n}", metadata={"health_url": f"http://127.0.0.1:{ports[n % len(ports)]}/health/{n}"})
+        for n in range(args.resources)
+    ]
+    prober = HealthProber(lambda: fleet, interval=0, timeout=args.timeout,
+                          concurrency=args.concurrency, per_host=args.per_host)
+    label = "keep-alive" if keep_alive else "close"
+    for cycle in range(args.cycles):
+        counts = await prober.probe_all()
+        print(f"{label:<12}{cycle + 1:>6}{prober.last_cycle_seconds * 1000:>12.0f} ms"
+              f"{prober.probes:>10,}{prober.connections_opened:>14,}"
+              f"{counts['healthy']:>10,}{counts['unhealthy']:>11,}")
+    await prober.close()
+    for server in servers:
+        server.close()
+    wrong = sum(1 for n, env in enumerate(fleet) if env.health is None or env.health[0] != expected_health(n))
+    return wrong
+
+
+async def run_shared(args):
+    """Resources on one slow but healthy host, queueing for its few connections."""
+    from StagingEnv import StagingEnv
+    from health import HealthProber
+
+    server = await serve(True, args.timeout * 2, latency=args.latency)
+    port = server.sockets[0].getsockname()[1]
+    # Odd ids only, so none of them is one of the never-answering resources
+    fleet = [
+        StagingEnv(name=f"Env {n}", metadata={"health_url": f"http://127.0.0.1:{port}/health/{2 * n + 1}"})
+        for n in range(args.shared)
+    ]
+    timeout = args.latency * 5
+    prober = HealthProber(lambda: fleet, interval=0, timeout=timeout,
+                          concurrency=args.concurrency, per_host=args.per_host)
+    counts = await prober.probe_all()
+    await prober.close()
+    server.close()
+    print(f"{args.shared} resources on one host answering in {args.latency * 1000:.0f} ms, "
+          f"{args.per_host} connections, {timeout * 1000:.0f} ms timeout: "
+          f"{counts['healthy']} healthy, {counts['unhealthy']} unhealthy in {prober.last_cycle_seconds:.2f}s")
+    return counts["unhealthy"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--resources", type=int, default=2000)
+    parser.add_argument("--hosts", type=int, default=8)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--per-host", type=int, default=4)
+    parser.add_argument("--timeout", type=float, default=0.2)
+    parser.add_argument("--cycles", type=int, default=3)
+    parser.add_argument("--shared", type=int, default=40, help="resources on the one slow shared host")
+    parser.add_argument("--latency", type=float, default=0.1, help="the shared host's response time, in seconds")
+    args = parser.parse_args()
+
+    os.environ["DATA_DIR"] = tempfile.mkdtemp(prefix="eac-bench-")
+    print(f"{args.resources:,} resources on {args.hosts} hosts, {args.concurrency} probes in flight, "
+          f"{args.per_host} connections per host")
+    print(f"{'server':<12}{'cycle':>6}{'time':>15}{'probes':>10}{'connections':>14}{'healthy':>10}{'unhealthy':>11}")
+    wrong = 0
+    for keep_alive in (True, False):
+        started = time.perf_counter()
+        wrong += asyncio.run(run(args, keep_alive))
+        print(f"{'':<12}total {time.perf_counter() - started:.2f}s")
+    wrong += asyncio.run(run_shared(args))
+    if wrong:
+        print(f"{wrong} resources misclassified")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
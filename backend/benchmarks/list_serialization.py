@@ -0,0 +1,72 @@
+"""Benchmark: list endpoint serialization, per-request get_info() vs. cached fragments.
+
+For growing fleets of mostly idle environments, changes one resource and
+then builds the /environments body both ways: the previous path
+(get_info() for every resource, then json.dumps) and the fragment path the
+endpoint now uses.
+
+    cd backend
+    python benchmarks/list_serialization.py --sizes 1000 10000 100000
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def best_of(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    os.environ["DATA_DIR"] = tempfile.mkdtemp(prefix="eac-bench-")
+    from StagingEnv import StagingEnv
+    from resources_config import ResourceRegistry
+    import serialization
+
+    registry = ResourceRegistry()
+    print(f"JSON encoder: {'orjson' if serialization.orjson else 'json'}")
+    print(f"{'resources':>10}{'get_info+dumps':>18}{'fragments':>14}{'unchanged':>14}")
+    for size in args.sizes:
+        for n in range(len(registry.environments), size):
+            registry.add_environment(f"env-{n}", StagingEnv(name=f"Env {n}", metadata={"instance": str(n % 10)}))
+        environments = list(registry.environments.values())
+        busy = environments[0]
+        registry.environments_json()
+
+        def old():
+            return json.dumps({env_id: env.get_info() for env_id, env in registry.environments.items()})
+
+        def change():
+            # One take or release per request, as under live traffic
+            with registry.transaction(busy):
+                busy.release() or busy.try_to_take("bench")
+            return registry.get_cached_view("environments", registry.environments_json)
+
+        def unchanged():
+            return registry.get_cached_view("environments", registry.environments_json)
+
+        assert json.loads(change()[1]) == json.loads(old())
+        print(f"{size:>10,}{best_of(old, args.repeat) * 1000:>15.1f} ms"
+              f"{best_of(change, args.repeat) * 1000:>11.1f} ms"
+              f"{best_of(unchanged, args.repeat) * 1000:>11.3f} ms")
+    registry.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""Stress benchmark: several worker processes sharing one database.
+
+Each worker process builds its own registry, as `uvicorn --workers N` does.
+In every round all workers try to take the same environment at once, and
+the round must have exactly one winner across processes. Then each worker
+steals its own environment repeatedly to measure write throughput, and
+finally every worker's view is checked against the database.
+
+    cd backend
+    python benchmarks/multi_worker.py --workers 4 --rounds 100
+    python benchmarks/multi_worker.py --backend local   # shows the split-brain it fixes
+"""
+import argparse
+import multiprocessing
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+
+def worker(n, args, data_dir, barrier, results):
+    os.environ["DATA_DIR"] = data_dir
+    os.environ["STATE_BACKEND"] = args.backend
+    os.environ["STATE_SYNC_MS"] = str(args.sync_ms)
+    sys.path.insert(0, str(BACKEND_DIR))
+    from resources_config import resources
+
+    resources.start()
+    contended = resources.get_environment(args.env)
+    own = list(resources.environments.values())[n % len(resources.environments)]
+
+    for round_no in range(args.rounds):
+        barrier.wait()
+        success, _ = resources.take(contended, f"worker-{n}-round-{round_no}")
+        results.put(("round", round_no, success))
+        barrier.wait()
+        if n == 0:
+            with resources.transaction(contended):
+                contended.release()
+        barrier.wait()
+
+    barrier.wait()
+    started = time.perf_counter()
+    for i in range(args.mutations):
+        with resources.transaction(own):
+            own.steal(f"worker-{n}-{i}")
+    results.put(("throughput", n, args.mutations / (time.perf_counter() - started)))
+
+    # Give the sync thread time to apply everyone's last writes
+    barrier.wait()
+    time.sleep(max(0.5, args.sync_ms * 5 / 1000))
+    view = {env_id: env.taken_by for env_id, env in resources.environments.items()}
+    results.put(("view", n, view))
+    resources.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--rounds", type=int, default=100)
+    parser.add_argument("--mutations", type=int, default=500, help="steals per worker")
+    parser.add_argument("--backend", default="sqlite", choices=("sqlite", "local"))
+    parser.add_argument("--sync-ms", type=float, default=20)
+    parser.add_argument("--env", default="prime-staging")
+    args = parser.parse_args()
+
+    data_dir = tempfile.mkdtemp(prefix="eac-bench-")
+    context = multiprocessing.get_context("spawn")
+    barrier = context.Barrier(args.workers)
+    results = context.Queue()
+    processes = [
+        context.Process(target=worker, args=(n, args, data_dir, barrier, results))
+        for n in range(args.workers)
+    ]
+    for process in processes:
+        process.start()
+
+    winners = {}
+    throughput = []
+    views = []
+    expected = args.workers * args.rounds + 2 * args.workers
+    for _ in range(expected):
+        kind, key, value = results.get()
+        if kind == "round":
+            winners[key] = winners.get(key, 0) + bool(value)
+        elif kind == "throughput":
+            throughput.append(value)
+        else:
+            views.append(value)
+    for process in processes:
+        process.join()
+
+    bad_rounds = sum(1 for count in winners.values() if count != 1)
+    print(f"{args.backend} backend, {args.workers} workers: "
+          f"{args.rounds - bad_rounds}/{args.rounds} rounds with exactly one winner")
+    print(f"steal throughput: {sum(throughput):,.0f} mutations/s across workers")
+
+    with sqlite3.connect(Path(data_dir) / "resources.db") as conn:
+        stored = dict(conn.execute(
+            "SELECT resource_id, taken_by FROM resource_state WHERE resource_type = 'environment'"
+        ))
+    diverged = sum(
+        1 for view in views
+        for env_id, taken_by in view.items()
+        if stored.get(env_id) != taken_by
+    )
+    print(f"worker views matching the database: {len(views) * len(stored) - diverged}/{len(views) * len(stored)}")
+    if bad_rounds or diverged:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
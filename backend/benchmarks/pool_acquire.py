@@ -0,0 +1,101 @@
+"""Benchmark: CI-style allocation, list-then-take with retries vs. pool acquire.
+
+Many client threads each need --count environments from a pool of
+--resources, hold them briefly and release them. The old way lists the
+available environments and tries to take some, retrying whenever another
+client won the race. The new way asks the pool for `count` members at once.
+Both are checked for double allocation.
+
+    cd backend
+    python benchmarks/pool_acquire.py --resources 1000 --clients 64 --count 2
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def run(label, registry, clients, jobs, acquire):
+    doubles = 0
+    attempts = [0]
+
+    def client(n):
+        nonlocal doubles
+        for job in range(jobs):
+            user = f"ci-{n}-{job}"
+            taken = acquire(user, attempts)
+            time.sleep(0)  # hold briefly, letting other clients run
+            with registry.transaction(*taken):
+                for resource in taken:
+                    # Anyone else holding it now was handed the same resource
+                    if not resource.release(user):
+                        doubles += 1
+
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(clients)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    print(f"{label:<16}{clients * jobs / elapsed:>10,.0f} jobs/s"
+          f"{attempts[0] / (clients * jobs):>8.2f} attempts/job{doubles:>6} double allocations")
+    return doubles
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--resources", type=int, default=1000)
+    parser.add_argument("--clients", type=int, default=64)
+    parser.add_argument("--jobs", type=int, default=50, help="allocations per client")
+    parser.add_argument("--count", type=int, default=2, help="environments per allocation")
+    args = parser.parse_args()
+
+    os.environ["DATA_DIR"] = tempfile.mkdtemp(prefix="eac-bench-")
+    from StagingEnv import StagingEnv
+    from resources_config import ENVIRONMENT, ResourceRegistry
+
+    registry = ResourceRegistry()
+    for n in range(args.resources):
+        registry.add_environment(f"ci-env-{n}", StagingEnv(name=f"CI {n}", metadata={"pool": "ci"}))
+
+    def list_then_take(user, attempts):
+        while True:
+            attempts[0] += 1
+            # What a client did before: list, pick, try to take, retry on a lost race
+            available, _ = registry.find_resources(ENVIRONMENT, taken=False, meta=[("pool", "ci")], limit=100)
+            picked = random.sample(available, min(args.count, len(available)))
+            if len(picked) < args.count:
+                continue
+            taken = []
+            for resource in picked:
+                if registry.take(resource, user)[0]:
+                    taken.append(resource)
+            if len(taken) == args.count:
+                return taken
+            with registry.transaction(*taken):
+                for resource in taken:
+                    resource.release(user)
+
+    def pool(user, attempts):
+        while True:
+            attempts[0] += 1
+            taken = registry.acquire_from_pool("ci", user, args.count)
+            if taken:
+                return taken
+
+    doubles = run("list-then-take", registry, args.clients, args.jobs, list_then_take)
+    doubles += run("pool acquire", registry, args.clients, args.jobs, pool)
+    registry.shutdown()
+    if doubles:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""Benchmark: memory and throughput of slotted resources vs. the previous layout.
+
+The previous layout (dict-backed instances, datetime timestamps and a
+metadata dict per instance) is reproduced below as the baseline. Both are
+measured building a fleet of test devices that share a handful of metadata
+shapes, then cycling take/release and get_info over it.
+
+    cd backend
+    python benchmarks/resource_memory.py --resources 500000
+"""
+import argparse
+import gc
+import sys
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from StagingEnv import StagingEnv
+
+
+class DictResource:
+    """Resource as it was before __slots__: instance dict, datetimes, own metadata."""
+
+    def __init__(self, name: str, metadata: Optional[Dict[str, Any]] = None):
+        self.name = name
+        self.metadata = metadata or {}
+        self.taken_by: Optional[str] = None
+        self.taken_at: Optional[datetime] = None
+        self.lease_expires_at: Optional[datetime] = None
+        self.lock = threading.RLock()
+        self.resource_type: Optional[str] = None
+        self.resource_id: Optional[str] = None
+        self.dirty = False
+        self._on_change = None
+
+    def try_to_take(self, user: str, ttl: Optional[float] = None) -> bool:
+        with self.lock:
+            if self.taken_by is not None:
+                return False
+            self.taken_by = user
+            self.taken_at = datetime.now()
+            self.dirty = True
+            return True
+
+    def release(self) -> bool:
+        with self.lock:
+            if self.taken_by is None:
+                return False
+            self.taken_by = None
+            self.taken_at = None
+            self.lease_expires_at = None
+            self.dirty = True
+            return True
+
+    def get_info(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "is_taken": self.taken_by is not None,
+            "taken_by": self.taken_by,
+            "taken_at": self.taken_at.isoformat() if self.taken_at else None,
+            "lease_expires_at": self.lease_expires_at.isoformat() if self.lease_expires_at else None,
+            "metadata": self.metadata
+        }
+
+
+def metadata_for(n: int) -> Dict[str, Any]:
+    # A fresh dict per resource, as a catalog loader produces them
+    return {"type": f"device-{n % 8}", "platform": ("android", "ios")[n % 2], "pool": f"lab-{n % 4}"}
+
+
+def measure(label: str, cls, count: int) -> Dict[str, float]:
+    gc.collect()
+    tracemalloc.start()
+    fleet = [cls(name=f"Device {n}", metadata=metadata_for(n)) for n in range(count)]
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    # Timed again without tracemalloc's overhead
+    del fleet
+    gc.collect()
+    started = time.perf_counter()
+    fleet = [cls(name=f"Device {n}", metadata=metadata_for(n)) for n in range(count)]
+    build = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for resource in fleet:
+        resource.try_to_take("bench")
+    for resource in fleet[::2]:
+        resource.release()
+    cycle = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for resource in fleet:
+        resource.get_info()
+    info = time.perf_counter() - started
+
+    print(f"{label:<12}{memory / count:>10.0f} B/resource{memory / 2**20:>10.1f} MiB"
+          f"{build:>9.2f}s build{count * 1.5 / cycle:>12,.0f} ops/s take+release"
+          f"{count / info:>12,.0f} get_info/s")
+    return {"memory": memory, "cycle": cycle, "info": info}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--resources", type=int, default=500000)
+    args = parser.parse_args()
+
+    before = measure("dict", DictResource, args.resources)
+    after = measure("slots", StagingEnv, args.resources)
+    print(f"memory: {before['memory'] / after['memory']:.1f}x smaller, "
+          f"take+release: {before['cycle'] / after['cycle']:.2f}x, "
+          f"get_info: {before['info'] / after['info']:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
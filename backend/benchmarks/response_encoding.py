@@ -0,0 +1,82 @@
+"""Benchmark: /environments body size and per-request cost for each response encoding.
+
+For a fleet of --size environments, reports the body size of every
+representation the endpoint can negotiate (JSON, MessagePack, each with
+gzip or brotli), how long producing it takes when the registry just changed,
+and how long serving it takes while nothing changes and the cached encoding
+is reused. brotli and msgpack are skipped when not installed.
+
+    cd backend
+    python benchmarks/response_encoding.py --size 10000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def best_of(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    os.environ["DATA_DIR"] = tempfile.mkdtemp(prefix="eac-bench-")
+    from StagingEnv import StagingEnv
+    from resources_config import ResourceRegistry
+    import serialization
+    from serialization import JSON, MSGPACK, encode_body
+
+    registry = ResourceRegistry()
+    for n in range(args.size):
+        registry.add_environment(f"env-{n}", StagingEnv(name=f"Env {n}", metadata={"instance": str(n % 10)}))
+    busy = registry.environments["env-0"]
+
+    variants = [(JSON, None), (JSON, "gzip")]
+    if serialization.brotli is not None:
+        variants.append((JSON, "br"))
+    if serialization.msgpack is not None:
+        variants += [(MSGPACK, None), (MSGPACK, "gzip")]
+        if serialization.brotli is not None:
+            variants.append((MSGPACK, "br"))
+
+    print(f"{args.size:,} environments")
+    print(f"{'encoding':<20}{'bytes':>12}{'after a change':>18}{'unchanged':>14}")
+    for media, coding in variants:
+        variant = f"{media};{coding}"
+
+        def serve():
+            if media == JSON and coding is None:
+                return registry.get_cached_view("environments", registry.environments_json)
+            return registry.get_encoded_view(
+                "environments", registry.environments_json, variant, lambda body: encode_body(body, media, coding)
+            )
+
+        def change():
+            # One take or release per request, as under live traffic
+            with registry.transaction(busy):
+                busy.release() or busy.try_to_take("bench")
+            return serve()
+
+        _, body = serve()
+        label = ("msgpack" if media == MSGPACK else "json") + (f"+{coding}" if coding else "")
+        print(f"{label:<20}{len(body):>12,}{best_of(change, args.repeat) * 1000:>15.1f} ms"
+              f"{best_of(serve, args.repeat) * 1e6:>11.1f} us")
+    registry.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,343 @@
+import bisect
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+
+class Booking(NamedTuple):
+    id: int
+    resource_type: str
+    resource_id: str
+    user: str
+    start: float
+    end: float
+    created_at: float
+    activated_at: Optional[float] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "resource_type": self.resource_type,
+            "resource_id": self.resource_id,
+            "user": self.user,
+            "start": datetime.fromtimestamp(self.start).isoformat(),
+            "end": datetime.fromtimestamp(self.end).isoformat(),
+            "created_at": datetime.fromtimestamp(self.created_at).isoformat(),
+            "activated_at": datetime.fromtimestamp(self.activated_at).isoformat() if self.activated_at else None,
+        }
+
+
+class BookingConflict(ValueError):
+    """The requested window overlaps an existing booking."""
+
+    def __init__(self, booking: Booking):
+        super().__init__(
+            f"{booking.resource_type} {booking.resource_id} is booked by {booking.user} "
+            f"from {datetime.fromtimestamp(booking.start).isoformat()} "
+            f"to {datetime.fromtimestamp(booking.end).isoformat()}"
+        )
+        self.booking = booking
+
+
+COLUMNS = "id, resource_type, resource_id, user, start_ts, end_ts, created_at, activated_at"
+
+
+class BookingCalendar:
+    """Future reservations: per-resource time windows that may not overlap.
+
+    Every booking is kept in the bookings table. Those that had not ended
+    by `horizon` (startup), and every booking made since, are also kept per
+    resource in a list sorted by start time with a parallel list of starts.
+    Since a resource's bookings never overlap, the sorted starts also order
+    their ends, and a binary search answers both questions that matter: the
+    only booking that can conflict with a new window, or hold the resource
+    at a given time, is the last one starting before it. Each is O(log n)
+    in the bookings of that resource.
+
+    Conflicts are checked in SQLite, inside the write transaction that
+    inserts the booking, so workers sharing the database (STATE_BACKEND=sqlite)
+    can't accept overlapping windows. The (resource, start) index makes that
+    check a single seek. Queries reaching back before the horizon also go to
+    SQLite; years of past bookings cost neither memory nor startup time.
+    """
+
+    def __init__(self, db_path: Path):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._starts: Dict[Tuple[str, str], List[float]] = {}
+        self._bookings: Dict[Tuple[str, str], List[Booking]] = {}
+        self._by_id: Dict[int, Booking] = {}
+        self._conn: Optional[sqlite3.Connection] = None
+        self.horizon = time.time()
+        with self._lock:
+            self._load(self._connect())
+
+    def _connect(self) -> sqlite3.Connection:
+        """The calendar's connection; call with the lock held."""
+        if self._conn is None:
+            conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS bookings (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    resource_type TEXT NOT NULL,
+                    resource_id TEXT NOT NULL,
+                    user TEXT NOT NULL,
+                    start_ts REAL NOT NULL,
+                    end_ts REAL NOT NULL,
+                    created_at REAL NOT NULL,
+                    activated_at REAL
+                );
+                CREATE INDEX IF NOT EXISTS idx_bookings_resource_start
+                    ON bookings (resource_type, resource_id, start_ts);
+                CREATE INDEX IF NOT EXISTS idx_bookings_end ON bookings (end_ts);
+            """)
+            self._conn = conn
+        return self._conn
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def _load(self, conn: sqlite3.Connection) -> None:
+        """Load the bookings that have not ended by the horizon."""
+        rows = conn.execute(f"""
+            SELECT {COLUMNS} FROM bookings
+            WHERE end_ts > ?
+            ORDER BY resource_type, resource_id, start_ts
+        """, (self.horizon,)).fetchall()
+        keys: Dict[Tuple[str, str], Tuple[str, str]] = {}
+        for booking_id, resource_type, resource_id, user, start, end, created_at, activated_at in rows:
+            # Share one copy of each resource key and user name across years of rows
+            key = keys.setdefault((resource_type, resource_id), (resource_type, resource_id))
+            booking = Booking(booking_id, key[0], key[1], sys.intern(user), start, end, created_at, activated_at)
+            # Rows come in start order, so appending keeps every list sorted
+            self._starts.setdefault(key, []).append(booking.start)
+            self._bookings.setdefault(key, []).append(booking)
+            self._by_id[booking.id] = booking
+
+    def __len__(self) -> int:
+        return len(self._by_id)
+
+    def _preceding(self, key: Tuple[str, str], ts: float, inclusive: bool) -> Optional[Booking]:
+        """The last booking starting before `ts` (or at it, if inclusive). Call with the lock held."""
+        starts = self._starts.get(key)
+        if not starts:
+            return None
+        index = (bisect.bisect_right if inclusive else bisect.bisect_left)(starts, ts) - 1
+        return self._bookings[key][index] if index >= 0 else None
+
+    def book(self, resource_type: str, resource_id: str, user: str, start: float, end: float) -> Booking:
+        """Book [start, end) for a user. Raises BookingConflict if the window is taken.
+
+        The check runs against the table, in the same write transaction as
+        the insert, so workers sharing the database can't both book a window.
+        """
+        if end <= start:
+            raise ValueError("A booking must end after it starts")
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Only the last booking starting before `end` can reach into the window
+                row = conn.execute(f"""
+                    SELECT {COLUMNS} FROM bookings
+                    WHERE resource_type = ? AND resource_id = ? AND start_ts < ?
+                    ORDER BY start_ts DESC
+                    LIMIT 1
+                """, (resource_type, resource_id, end)).fetchone()
+                if row is not None and row[5] > start:
+                    conn.rollback()
+                    previous = Booking(*row)
+                    if previous.id not in self._by_id and previous.end > self.horizon:
+                        # Booked by another worker
+                        self._remember(previous)
+                    raise BookingConflict(previous)
+                created_at = time.time()
+                cursor = conn.execute("""
+                    INSERT INTO bookings (resource_type, resource_id, user, start_ts, end_ts, created_at)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                """, (resource_type, resource_id, user, start, end, created_at))
+                conn.commit()
+            except BaseException:
+                if conn.in_transaction:
+                    conn.rollback()
+                raise
+            booking = Booking(cursor.lastrowid, resource_type, resource_id, user, start, end, created_at)
+            # Anything cached in the window was cancelled by another worker
+            key = (resource_type, resource_id)
+            previous = self._preceding(key, end, inclusive=False)
+            while previous is not None and previous.end > start:
+                self._forget(previous)
+                previous = self._preceding(key, end, inclusive=False)
+            self._remember(booking)
+            return booking
+
+    def _remember(self, booking: Booking) -> None:
+        """Add a booking to the in-memory lists; call with the lock held."""
+        key = (booking.resource_type, booking.resource_id)
+        starts = self._starts.setdefault(key, [])
+        index = bisect.bisect_left(starts, booking.start)
+        starts.insert(index, booking.start)
+        self._bookings.setdefault(key, []).insert(index, booking)
+        self._by_id[booking.id] = booking
+
+    def _forget(self, booking: Booking) -> None:
+        """Drop a booking from the in-memory lists; call with the lock held."""
+        key = (booking.resource_type, booking.resource_id)
+        starts = self._starts[key]
+        index = bisect.bisect_left(starts, booking.start)
+        del starts[index]
+        del self._bookings[key][index]
+        if not starts:
+            del self._starts[key]
+            del self._bookings[key]
+        del self._by_id[booking.id]
+
+    def cancel(self, booking_id: int) -> Optional[Booking]:
+        """Delete a booking. Returns it, or None if there is no such booking."""
+        with self._lock:
+            booking = self._by_id.get(booking_id)
+            conn = self._connect()
+            if booking is None:
+                row = conn.execute(f"SELECT {COLUMNS} FROM bookings WHERE id = ?", (booking_id,)).fetchone()
+                if row is None:
+                    return None
+                with conn:
+                    conn.execute("DELETE FROM bookings WHERE id = ?", (booking_id,))
+                return Booking(*row)
+            with conn:
+                conn.execute("DELETE FROM bookings WHERE id = ?", (booking_id,))
+            self._forget(booking)
+            return booking
+
+    def get(self, booking_id: int) -> Optional[Booking]:
+        with self._lock:
+            booking = self._by_id.get(booking_id)
+            if booking is None:
+                row = self._connect().execute(f"SELECT {COLUMNS} FROM bookings WHERE id = ?", (booking_id,)).fetchone()
+                booking = Booking(*row) if row else None
+        return booking
+
+    def mark_activated(self, booking_id: int, ts: float) -> None:
+        """Record that the booking's owner was given the resource, so it isn't done again."""
+        with self._lock:
+            booking = self._by_id.get(booking_id)
+            if booking is None:
+                return
+            conn = self._connect()
+            with conn:
+                conn.execute("UPDATE bookings SET activated_at = ? WHERE id = ?", (ts, booking_id))
+            key = (booking.resource_type, booking.resource_id)
+            index = bisect.bisect_left(self._starts[key], booking.start)
+            booking = self._bookings[key][index] = booking._replace(activated_at=ts)
+            self._by_id[booking_id] = booking
+
+    def holder_at(self, resource_type: str, resource_id: str, ts: float) -> Optional[Booking]:
+        """The booking covering time `ts`, if any."""
+        with self._lock:
+            if ts >= self.horizon:
+                booking = self._preceding((resource_type, resource_id), ts, inclusive=True)
+            else:
+                row = self._connect().execute(f"""
+                    SELECT {COLUMNS} FROM bookings
+                    WHERE resource_type = ? AND resource_id = ? AND start_ts <= ?
+                    ORDER BY start_ts DESC
+                    LIMIT 1
+                """, (resource_type, resource_id, ts)).fetchone()
+                booking = Booking(*row) if row else None
+        return booking if booking is not None and booking.end > ts else None
+
+    def find(
+        self,
+        resource_type: Optional[str] = None,
+        resource_id: Optional[str] = None,
+        user: Optional[str] = None,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        limit: Optional[int] = None
+    ) -> List[Booking]:
+        """Bookings overlapping [since, until), by resource and then start time."""
+        if since is None or since < self.horizon:
+            return self._find_stored(resource_type, resource_id, user, since, until, limit)
+        with self._lock:
+            if resource_type is not None and resource_id is not None:
+                keys = [(resource_type, resource_id)] if (resource_type, resource_id) in self._starts else []
+            else:
+                keys = sorted(
+                    key for key in self._starts
+                    if (resource_type is None or key[0] == resource_type)
+                    and (resource_id is None or key[1] == resource_id)
+                )
+            found = []
+            for key in keys:
+                starts = self._starts[key]
+                bookings = self._bookings[key]
+                low = 0
+                if since is not None:
+                    low = max(0, bisect.bisect_right(starts, since) - 1)
+                    if low < len(bookings) and bookings[low].end <= since:
+                        low += 1
+                high = len(starts) if until is None else bisect.bisect_left(starts, until)
+                for booking in bookings[low:high]:
+                    if user is None or booking.user == user:
+                        found.append(booking)
+                        if limit is not None and len(found) >= limit:
+                            return found
+            return found
+
+    def _find_stored(
+        self,
+        resource_type: Optional[str],
+        resource_id: Optional[str],
+        user: Optional[str],
+        since: Optional[float],
+        until: Optional[float],
+        limit: Optional[int]
+    ) -> List[Booking]:
+        """find() over every booking in the table, for windows reaching before the horizon."""
+        conditions = []
+        params: List[Any] = []
+        for column, value in (("resource_type", resource_type), ("resource_id", resource_id), ("user", user)):
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                params.append(value)
+        if since is not None:
+            conditions.append("end_ts > ?")
+            params.append(since)
+            if resource_type is not None and resource_id is not None:
+                # Nothing starting before the booking that covers `since` can overlap,
+                # so the index range can start there rather than at the first booking
+                with self._lock:
+                    row = self._connect().execute("""
+                        SELECT start_ts FROM bookings
+                        WHERE resource_type = ? AND resource_id = ? AND start_ts <= ?
+                        ORDER BY start_ts DESC
+                        LIMIT 1
+                    """, (resource_type, resource_id, since)).fetchone()
+                conditions.append("start_ts >= ?")
+                params.append(row[0] if row else since)
+        if until is not None:
+            conditions.append("start_ts < ?")
+            params.append(until)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        query = f"SELECT {COLUMNS} FROM bookings {where} ORDER BY resource_type, resource_id, start_ts"
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+        with self._lock:
+            rows = self._connect().execute(query, params).fetchall()
+        return [Booking(*row) for row in rows]
+
+    def pending(self, now: float) -> List[Booking]:
+        """Bookings not yet activated that have not ended, in no particular order."""
+        with self._lock:
+            return [booking for booking in self._by_id.values()
+                    if booking.activated_at is None and booking.end > now]
@@ -0,0 +1,140 @@
+import json
+import os
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, NamedTuple, Optional
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+# Catalog section -> resource type
+SECTIONS = {
+    "publishers": "publisher",
+    "environments": "environment",
+}
+
+
+class CatalogEntry(NamedTuple):
+    name: str
+    metadata: Dict[str, Any]
+
+
+class ResourceCatalog:
+    """The set of publishers and environments, read from a file instead of code.
+
+    JSON and YAML files hold a list of {"id", "name", "metadata"} entries
+    under "publishers" and "environments". A SQLite file holds a
+    `catalog (resource_type, resource_id, name, metadata)` table with
+    metadata as JSON text. The path comes from CATALOG_PATH and defaults
+    to backend/catalog.json.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        if path is None:
+            path = os.environ.get("CATALOG_PATH")
+        self.path = Path(path) if path else Path(__file__).parent / "catalog.json"
+
+    def mtime(self) -> Optional[float]:
+        try:
+            return self.path.stat().st_mtime
+        except FileNotFoundError:
+            return None
+
+    def load(self) -> Dict[str, Dict[str, CatalogEntry]]:
+        """Read the catalog as {resource_type: {resource_id: entry}}. Raises ValueError if it is invalid."""
+        suffix = self.path.suffix.lower()
+        if suffix in (".db", ".sqlite", ".sqlite3"):
+            return self._load_sqlite()
+        try:
+            text = self.path.read_text()
+        except OSError as e:
+            raise ValueError(f"Cannot read catalog {self.path}: {e}")
+        if suffix in (".yaml", ".yml"):
+            if yaml is None:
+                raise ValueError(f"PyYAML is required to load {self.path}")
+            try:
+                document = yaml.safe_load(text)
+            except yaml.YAMLError as e:
+                raise ValueError(f"Invalid YAML in {self.path}: {e}")
+        else:
+            try:
+                document = json.loads(text)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"Invalid JSON in {self.path}: {e}")
+        return self._parse(document or {})
+
+    def _parse(self, document: Dict[str, Any]) -> Dict[str, Dict[str, CatalogEntry]]:
+        catalog = {}
+        for section, resource_type in SECTIONS.items():
+            entries = catalog[resource_type] = {}
+            for item in document.get(section) or []:
+                if "id" not in item or "name" not in item:
+                    raise ValueError(f"Catalog entry in {section} needs an id and a name: {item}")
+                resource_id = str(item["id"])
+                if resource_id in entries:
+                    raise ValueError(f"Duplicate {resource_type} id in catalog: {resource_id}")
+                entries[resource_id] = CatalogEntry(item["name"], item.get("metadata") or {})
+        return catalog
+
+    def _load_sqlite(self) -> Dict[str, Dict[str, CatalogEntry]]:
+        if not self.path.exists():
+            raise ValueError(f"Cannot read catalog {self.path}: no such file")
+        catalog = {resource_type: {} for resource_type in SECTIONS.values()}
+        conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+        try:
+            rows = conn.execute("""
+                SELECT resource_type, resource_id, name, metadata
+                FROM catalog
+                ORDER BY rowid
+            """)
+            for resource_type, resource_id, name, metadata in rows:
+                if resource_type not in catalog:
+                    raise ValueError(f"Unknown resource type in catalog: {resource_type}")
+                catalog[resource_type][str(resource_id)] = CatalogEntry(
+                    name, json.loads(metadata) if metadata else {}
+                )
+        except sqlite3.Error as e:
+            raise ValueError(f"Cannot read catalog {self.path}: {e}")
+        finally:
+            conn.close()
+        return catalog
+
+
+class CatalogWatcher:
+    """Poll the catalog file's mtime and call `on_change` when it moves."""
+
+    def __init__(self, catalog: ResourceCatalog, on_change: Callable[[], Any], interval: float):
+        self.catalog = catalog
+        self.on_change = on_change
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="catalog-watcher", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        seen = self.catalog.mtime()
+        while not self._stop.wait(self.interval):
+            mtime = self.catalog.mtime()
+            if mtime == seen:
+                continue
+            seen = mtime
+            try:
+                self.on_change()
+            except Exception as e:
+                print(f"Error reloading catalog: {e}")
+                import traceback
+                traceback.print_exc()
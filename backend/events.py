@@ -0,0 +1,70 @@
+import asyncio
+import threading
+from typing import Any, Dict, Set
+
+
+class Subscriber:
+    """A single /events client. Events are delivered on the client's event loop."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, max_pending: int):
+        self.loop = loop
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_pending)
+        # Set when the client fell too far behind and needs a fresh snapshot
+        self.overflowed = False
+
+    def _offer(self, event: Dict[str, Any]) -> None:
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait({"type": "resync"})
+
+    async def get(self) -> Dict[str, Any]:
+        event = await self.queue.get()
+        if event["type"] == "resync":
+            self.overflowed = False
+        return event
+
+
+class EventBroker:
+    """Fan out resource changes to every connected subscriber.
+
+    Changes are published from whichever thread performed the mutation, so
+    delivery is handed to each subscriber's event loop thread-safely.
+    """
+
+    def __init__(self, max_pending: int = 1000):
+        self.max_pending = max_pending
+        self._subscribers: Set[Subscriber] = set()
+        self._lock = threading.Lock()
+
+    def has_subscribers(self) -> bool:
+        return bool(self._subscribers)
+
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def subscribe(self) -> Subscriber:
+        """Register a subscriber. Must be called from the subscriber's event loop."""
+        subscriber = Subscriber(asyncio.get_running_loop(), self.max_pending)
+        with self._lock:
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber) -> None:
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def publish(self, event: Dict[str, Any]) -> None:
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            try:
+                subscriber.loop.call_soon_threadsafe(subscriber._offer, event)
+            except RuntimeError:
+                # The subscriber's loop has been closed
+                self.unsubscribe(subscriber)
@@ -0,0 +1,251 @@
+import asyncio
+import ssl
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlsplit
+from Resource import Resource
+
+# Metadata keys naming endpoints to probe. health_url, when present, is the
+# only one probed; a domain is probed at its https root.
+HEALTH_URL_KEY = "health_url"
+ENDPOINT_KEYS = ("domain", "transformer_url")
+
+MAX_HEADER_LINES = 100
+
+
+def probe_urls(metadata: Dict) -> List[str]:
+    """The URLs whose responses decide a resource's health."""
+    if metadata.get(HEALTH_URL_KEY):
+        return [metadata[HEALTH_URL_KEY]]
+    urls = []
+    for key in ENDPOINT_KEYS:
+        value = metadata.get(key)
+        if isinstance(value, str) and value:
+            urls.append(value if "://" in value else f"https://{value}/")
+    return urls
+
+
+class _HostPool:
+    """Idle keep-alive connections to one host, and a cap on connections in use."""
+
+    def __init__(self, limit: int):
+        self.slots = asyncio.Semaphore(limit)
+        self.idle: List[Tuple[asyncio.StreamReader, asyncio.StreamWriter]] = []
+
+
+async def _read_response(reader: asyncio.StreamReader) -> Tuple[int, bool]:
+    """Read one response, discarding the body. Returns (status, connection reusable)."""
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionResetError("Connection closed before the response")
+    version, status = status_line.split(None, 2)[:2]
+    status = int(status)
+    headers: Dict[str, str] = {}
+    for _ in range(MAX_HEADER_LINES):
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    keep_alive = version == b"HTTP/1.1" and headers.get("connection", "").lower() != "close"
+
+    if status < 200 or status in (204, 304):
+        return status, keep_alive
+    if headers.get("transfer-encoding", "").lower() == "chunked":
+        while True:
+            size = int((await reader.readline()).split(b";")[0].strip() or b"0", 16)
+            if size == 0:
+                # Trailers, up to the blank line
+                while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    pass
+                break
+            await reader.readexactly(size + 2)
+    elif "content-length" in headers:
+        remaining = int(headers["content-length"])
+        while remaining:
+            chunk = await reader.read(min(remaining, 65536))
+            if not chunk:
+                raise asyncio.IncompleteReadError(b"", remaining)
+            remaining -= len(chunk)
+    else:
+        # Delimited by the server closing the connection
+        while await reader.read(65536):
+            pass
+        keep_alive = False
+    return status, keep_alive
+
+
+class HealthProber:
+    """Probe the endpoints in every resource's metadata, concurrently, on an interval.
+
+    The prober runs its own asyncio loop on a background thread. Each cycle,
+    `concurrency` workers take resources off a shared iterator and GET their
+    endpoints, so at most that many probes are in flight however large the
+    fleet is. Connections are HTTP/1.1 keep-alive and pooled per host, with
+    at most `per_host` open to any one host, so a cycle against a shared
+    host reuses a handful of connections instead of reconnecting per probe.
+
+    A resource is healthy when every endpoint answers below 500 within
+    `timeout`. Results are recorded on the resource (see
+    Resource.record_health), where get_status reports them and requests
+    read them without probing. A result is trusted for `ttl` seconds.
+    """
+
+    def __init__(
+        self,
+        resources: Callable[[], Iterable[Resource]],
+        interval: float,
+        timeout: float = 5.0,
+        concurrency: int = 32,
+        per_host: int = 4,
+        ttl: Optional[float] = None
+    ):
+        self.resources = resources
+        self.interval = interval
+        self.timeout = timeout
+        self.concurrency = concurrency
+        self.per_host = per_host
+        self.ttl = ttl if ttl is not None else 3 * interval
+        # Counters for the last cycle, for logs and benchmarks
+        self.probes = 0
+        self.connections_opened = 0
+        self.last_cycle_seconds = 0.0
+        self._pools: Dict[Tuple[str, str, int], _HostPool] = {}
+        self._ssl: Optional[ssl.SSLContext] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._thread is None:
+            ready = threading.Event()
+            self._thread = threading.Thread(target=self._run, args=(ready,), name="health-prober", daemon=True)
+            self._thread.start()
+            ready.wait()
+
+    def stop(self) -> None:
+        """Cancel the running cycle and close pooled connections."""
+        if self._thread is not None:
+            self._loop.call_soon_threadsafe(self._task.cancel)
+            self._thread.join()
+            self._thread = None
+
+    def _run(self, ready: threading.Event) -> None:
+        self._loop = asyncio.new_event_loop()
+        try:
+            self._task = self._loop.create_task(self._probe_forever())
+            ready.set()
+            self._loop.run_until_complete(self._task)
+        except asyncio.CancelledError:
+            pass
+        finally:
+            self._loop.run_until_complete(self.close())
+            self._loop.close()
+
+    async def _probe_forever(self) -> None:
+        while True:
+            started = time.monotonic()
+            try:
+                await self.probe_all()
+            except Exception as e:
+                print(f"Error probing resource health: {e}")
+                import traceback
+                traceback.print_exc()
+            await asyncio.sleep(max(0.0, self.interval - (time.monotonic() - started)))
+
+    async def probe_all(self) -> Dict[str, int]:
+        """Probe every resource once. Returns counts of healthy, unhealthy and changed resources."""
+        started = time.perf_counter()
+        self.probes = 0
+        self.connections_opened = 0
+        counts = {"healthy": 0, "unhealthy": 0, "changed": 0}
+        targets = []
+        for resource in list(self.resources()):
+            urls = probe_urls(resource.metadata)
+            if urls:
+                targets.append((resource, urls))
+            elif resource.health is not None:
+                # Its endpoints were removed from the catalog
+                resource.record_health(None)
+        pending = iter(targets)
+
+        async def worker():
+            for resource, urls in pending:
+                errors = [error for error in [await self._probe(url) for url in urls] if error]
+                healthy = not errors
+                counts["healthy" if healthy else "unhealthy"] += 1
+                if resource.record_health(healthy, "; ".join(errors) or None):
+                    counts["changed"] += 1
+
+        await asyncio.gather(*(worker() for _ in range(min(self.concurrency, len(targets)))))
+        self.last_cycle_seconds = time.perf_counter() - started
+        return counts
+
+    async def _probe(self, url: str) -> Optional[str]:
+        """GET `url`. Returns None if it answered below 500, else what went wrong."""
+        self.probes += 1
+        try:
+            parts = urlsplit(url)
+            if not parts.hostname:
+                raise ValueError(f"No host in {url}")
+            https = parts.scheme == "https"
+            key = (parts.scheme, parts.hostname, parts.port or (443 if https else 80))
+            pool = self._pools.get(key)
+            if pool is None:
+                pool = self._pools[key] = _HostPool(self.per_host)
+            # Queueing for a connection to a busy host is not the host being slow,
+            # so the timeout only starts once a slot is ours
+            async with pool.slots:
+                status = await asyncio.wait_for(self._get(pool, key, parts), self.timeout)
+        except asyncio.TimeoutError:
+            return f"{url}: timed out after {self.timeout:g}s"
+        except (OSError, ValueError, asyncio.IncompleteReadError) as e:
+            return f"{url}: {type(e).__name__}"
+        return f"{url}: HTTP {status}" if status >= 500 else None
+
+    async def _get(self, pool: _HostPool, key: Tuple[str, str, int], parts) -> int:
+        """Send one GET over a pooled connection; call holding one of the pool's slots."""
+        scheme, host, port = key
+        https = scheme == "https"
+        target = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+        host_header = host if parts.port is None else f"{host}:{port}"
+        request = (
+            f"GET {target} HTTP/1.1\r\nHost: {host_header}\r\nUser-Agent: eac-health-prober\r\n"
+            "Accept: */*\r\nConnection: keep-alive\r\n\r\n"
+        ).encode()
+
+        while True:
+            reused = bool(pool.idle)
+            if reused:
+                reader, writer = pool.idle.pop()
+            else:
+                if https and self._ssl is None:
+                    self._ssl = ssl.create_default_context()
+                reader, writer = await asyncio.open_connection(host, port, ssl=self._ssl if https else None)
+                self.connections_opened += 1
+            try:
+                writer.write(request)
+                await writer.drain()
+                status, keep_alive = await _read_response(reader)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                writer.close()
+                if reused:
+                    # The server closed the idle connection; retry on another
+                    continue
+                raise
+            except BaseException:
+                writer.close()
+                raise
+            if keep_alive:
+                pool.idle.append((reader, writer))
+            else:
+                writer.close()
+            return status
+
+    async def close(self) -> None:
+        """Close pooled connections. Call on the loop that opened them."""
+        pools, self._pools = self._pools, {}
+        for pool in pools.values():
+            for _, writer in pool.idle:
+                writer.close()
@@ -0,0 +1,97 @@
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+# Event actions written by the registry
+ACTIONS = (
+    "take", "steal", "release", "force_release", "expire", "renew", "wait", "handoff",
+    "wait_timeout", "wait_cancel",
+)
+
+
+class ReservationHistory:
+    """Read side of the append-only reservation_events log.
+
+    Pages are ordered by (ts, id) and continue from an opaque cursor, so
+    every page is an index range scan no matter how deep into the log it is.
+    Each query uses its own connection; with WAL, readers never block the
+    writer.
+    """
+
+    def __init__(self, db_path: Path):
+        self.db_path = db_path
+
+    @staticmethod
+    def encode_cursor(ts: float, event_id: int) -> str:
+        return f"{ts!r}:{event_id}"
+
+    @staticmethod
+    def decode_cursor(cursor: str) -> Tuple[float, int]:
+        ts, event_id = cursor.split(":", 1)
+        return float(ts), int(event_id)
+
+    @staticmethod
+    def to_dict(row: tuple) -> Dict[str, Any]:
+        event_id, ts, resource_type, resource_id, action, user, previous_holder = row
+        return {
+            "id": event_id,
+            "timestamp": datetime.fromtimestamp(ts).isoformat(),
+            "resource_type": resource_type,
+            "resource_id": resource_id,
+            "action": action,
+            "user": user,
+            "previous_holder": previous_holder,
+        }
+
+    def iter_events(
+        self,
+        resource_type: Optional[str] = None,
+        resource_id: Optional[str] = None,
+        user: Optional[str] = None,
+        action: Optional[str] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        cursor: Optional[str] = None,
+        limit: int = 1000,
+        chunk_size: int = 500
+    ) -> Iterator[tuple]:
+        """Yield raw event rows in (ts, id) order, fetched in chunks."""
+        clauses = []
+        params = []
+        for column, value in (
+            ("resource_type", resource_type),
+            ("resource_id", resource_id),
+            ("user", user),
+            ("action", action),
+        ):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if since is not None:
+            clauses.append("ts >= ?")
+            params.append(since.timestamp())
+        if until is not None:
+            clauses.append("ts < ?")
+            params.append(until.timestamp())
+        if cursor is not None:
+            clauses.append("(ts, id) > (?, ?)")
+            params.extend(self.decode_cursor(cursor))
+
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        try:
+            rows = conn.execute(f"""
+                SELECT id, ts, resource_type, resource_id, action, user, previous_holder
+                FROM reservation_events
+                {where}
+                ORDER BY ts, id
+                LIMIT ?
+            """, (*params, limit))
+            while True:
+                chunk = rows.fetchmany(chunk_size)
+                if not chunk:
+                    return
+                yield from chunk
+        finally:
+            conn.close()
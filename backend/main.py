@@ -1,10 +1,40 @@
-from fastapi import FastAPI, HTTPException
+from contextlib import asynccontextmanager
+from fastapi import Depends, FastAPI, HTTPException, Query, Request
+from pydantic import BaseModel, Field
+from typing import Annotated, Callable, List, Literal, Optional, Tuple
 from fastapi.middleware.cors import CORSMiddleware
-from resources_config import resources
+from fastapi.responses import Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from bookings import BookingConflict
+from history import ACTIONS
+from profiler import SamplingProfiler
+from resources_config import resources, NOT_FOUND, PUBLISHER, ENVIRONMENT
+from serialization import (
+    JSON, MSGPACK, CompressionMiddleware, dumps, encode_body, json_object, negotiate_encoding, negotiate_media
+)
+import asyncio
+import json
+import metrics
+from datetime import datetime
 import os
 import getpass
 
-app = FastAPI(title="Environment Access Controller API", version="1.0.0")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    resources.start()
+    yield
+    profiler.stop()
+    resources.shutdown()
+
+
+app = FastAPI(title="Environment Access Controller API", version="1.0.0", lifespan=lifespan)
+app.add_middleware(metrics.MetricsMiddleware)
+# Compresses other large responses; the registry views negotiate their own encoding
+app.add_middleware(CompressionMiddleware)
+
+# Off until started through /debug/profiler/start
+profiler = SamplingProfiler()
 
 # Configure CORS
 allowed_origins = os.environ.get("CORS_ORIGINS", "http://localhost:3000").split(",")
@@ -14,8 +44,127 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag"],
 )
 
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+
+def _variant_etag(etag: str, media: str, coding: Optional[str]) -> str:
+    """Each representation of a version gets its own entity tag."""
+    if media == JSON and coding is None:
+        return etag
+    return etag[:-1] + ("-msgpack" if media == MSGPACK else "") + (f"-{coding}" if coding else "") + '"'
+
+
+def _versioned_json(request: Request, view: str, build) -> Response:
+    """Serve a cached registry view with an ETag, or 304 if the client is current.
+
+    The body is JSON or, if the client asks for it, MessagePack, and is
+    compressed when the client accepts br or gzip. Each encoding is cached
+    per registry version, so it is produced once per change.
+    """
+    # Listing Accept-Encoding in Vary also keeps CompressionMiddleware off these responses
+    headers = {"Cache-Control": "no-cache", "Vary": "Accept, Accept-Encoding"}
+    media = negotiate_media(request.headers.get("accept"))
+    coding = negotiate_encoding(request.headers.get("accept-encoding"))
+    # Checked before anything is built or encoded, so a current client costs nothing
+    headers["ETag"] = _variant_etag(resources.etag(), media, coding)
+    if _etag_matches(request, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    if media == JSON and coding is None:
+        version, body = resources.get_cached_view(view, build)
+    else:
+        version, body = resources.get_encoded_view(
+            view, build, f"{media};{coding}", lambda body: encode_body(body, media, coding)
+        )
+        if coding:
+            headers["Content-Encoding"] = coding
+    # The view may be newer than the version checked above
+    headers["ETag"] = _variant_etag(resources.etag(version), media, coding)
+    return Response(content=body, media_type=media, headers=headers)
+
+
+def _json(body: bytes) -> Response:
+    """Return already-serialized JSON as is, skipping FastAPI's encoder."""
+    return Response(content=body, media_type="application/json")
+
+# Pagination, filtering and projection for the list endpoints
+LIST_PAGE_SIZE = 500
+MAX_LIST_PAGE_SIZE = 5000
+INFO_FIELDS = ("name", "is_taken", "taken_by", "taken_at", "lease_expires_at", "health", "metadata")
+
+
+class ListQuery(BaseModel):
+    cursor: Optional[str] = None
+    limit: Optional[int] = None
+    holder: Optional[str] = None
+    type: Optional[str] = None
+    taken: Optional[bool] = None
+    meta: List[Tuple[str, Optional[str]]] = []
+    fields: Optional[List[str]] = None
+
+    def is_empty(self) -> bool:
+        return self == ListQuery()
+
+
+def list_query(
+    cursor: Optional[str] = None,
+    limit: Annotated[Optional[int], Query(gt=0, le=MAX_LIST_PAGE_SIZE)] = None,
+    holder: Optional[str] = None,
+    type: Annotated[Optional[str], Query(description="type or platform")] = None,
+    taken: Optional[bool] = None,
+    meta: Annotated[Optional[List[str]], Query(description="key or key:value, repeatable")] = None,
+    fields: Annotated[Optional[str], Query(description="comma-separated: " + ",".join(INFO_FIELDS))] = None
+) -> ListQuery:
+    projection = None
+    if fields is not None:
+        projection = [field.strip() for field in fields.split(",") if field.strip()]
+        unknown = [field for field in projection if field not in INFO_FIELDS]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    return ListQuery(
+        cursor=cursor,
+        limit=limit,
+        holder=holder,
+        type=type,
+        taken=taken,
+        meta=[(item.partition(":")[0], item.partition(":")[2] if ":" in item else None) for item in meta or ()],
+        fields=projection,
+    )
+
+
+def _resource_page(resource_type: str, query: ListQuery, key_of: Callable, healthy_only: bool = False) -> Response:
+    """One page of matching resources as {"items": {...}, "next_cursor": ...}."""
+    found, next_cursor = resources.find_resources(
+        resource_type,
+        holder=query.holder,
+        type_value=query.type,
+        taken=query.taken,
+        meta=query.meta,
+        after=query.cursor,
+        limit=query.limit or LIST_PAGE_SIZE,
+        healthy_only=healthy_only
+    )
+    if query.fields is None:
+        items = ((key_of(resource), resource.info_json()) for resource in found)
+    else:
+        items = (
+            (key_of(resource), dumps({field: info[field] for field in query.fields}))
+            for resource, info in ((resource, resource.get_info()) for resource in found)
+        )
+    return _json(b'{"items":' + json_object(items) + b',"next_cursor":' + dumps(next_cursor) + b"}")
+
+# Bounds for ?wait=true take requests, in seconds
+DEFAULT_WAIT_TIMEOUT = 30.0
+MAX_WAIT_TIMEOUT = 3600.0
+
 # Health and utility endpoints
 @app.get("/health")
 def health():
@@ -35,8 +184,68 @@ def echo(payload: dict):
     return {"you_sent": payload}
 
 @app.get("/status")
-def get_all_status():
-    return resources.get_all_status()
+def get_all_status(request: Request):
+    return _versioned_json(request, "status", resources.status_json)
+
+@app.get("/status/changes")
+def get_status_changes(since: int, epoch: Optional[str] = None):
+    """Changes after version `since`, or a full snapshot if they are no longer retained."""
+    version, changes = resources.get_changes_since(since)
+    if epoch is not None and epoch != resources.epoch:
+        changes = None
+
+    if changes is None:
+        return {
+            "epoch": resources.epoch,
+            "version": version,
+            "full": True,
+            "status": resources.get_all_status(),
+        }
+    return {
+        "epoch": resources.epoch,
+        "version": version,
+        "full": False,
+        "changes": changes,
+    }
+
+# Seconds between keep-alive comments on idle /events streams
+EVENTS_KEEPALIVE = 15
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def _sse_raw(event: str, data: bytes) -> bytes:
+    return b"event: " + event.encode() + b"\ndata: " + data + b"\n\n"
+
+
+@app.get("/events")
+async def stream_events():
+    """Server-sent events: a full snapshot, then one update per resource change."""
+    subscriber = resources.events.subscribe()
+
+    async def stream():
+        try:
+            yield _sse_raw("snapshot", resources.snapshot_json())
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscriber.get(), timeout=EVENTS_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                if event["type"] == "resync":
+                    yield _sse_raw("snapshot", resources.snapshot_json())
+                else:
+                    yield _sse(event["type"], event)
+        finally:
+            resources.events.unsubscribe(subscriber)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 @app.get("/help")
 def get_help():
@@ -44,97 +253,165 @@ def get_help():
         "general": [
             "GET /health - Health check",
             "POST /echo - Echo payload",
-            "GET /status - Get all resource statuses",
-            "GET /help - Get this help"
+            "GET /status - Get all resource statuses (Accept-Encoding: br/gzip, Accept: application/msgpack)",
+            "GET /status/changes?since=<version>&epoch=<epoch> - Get changes after a version",
+            "GET /events - Stream a snapshot and then live resource updates (SSE)",
+            "GET /help - Get this help",
+            "GET /metrics - Latency, persistence and registry metrics (Prometheus text format)"
+        ],
+        "debug": [
+            "POST /debug/profiler/start?interval_ms=<ms> - Start the sampling profiler",
+            "POST /debug/profiler/stop - Stop the profiler and return collapsed stacks",
+            "GET /debug/profiler - Collapsed stacks sampled so far"
         ],
         "publishers": [
             "GET /publishers - List all publishers",
-            "GET /publishers/available - List available publishers",
+            "GET /publishers?holder=&type=&taken=&meta=key:value&fields=&limit=&cursor= - Filtered, paginated publishers",
+            "GET /publishers/available - List available publishers (same filters)",
+            "GET /publishers/available?healthy_only=true - Skip publishers that failed their latest health probe",
             "GET /publishers/info/{publisher_id} - Get publisher info",
             "GET /publishers/status/{publisher_id} - Get publisher status",
-            "POST /publishers/take/{publisher_id}?user=<username> - Take publisher",
-            "POST /publishers/steal/{publisher_id}?user=<username> - Steal publisher",
-            "POST /publishers/release/{publisher_id} - Release publisher"
+            "POST /publishers/take/{publisher_id}?user=<username>&ttl=<seconds> - Take publisher, optionally with a lease",
+            "POST /publishers/take/{publisher_id}?user=<username>&wait=true&timeout=<seconds> - Queue for a busy publisher",
+            "POST /publishers/steal/{publisher_id}?user=<username>&ttl=<seconds> - Steal publisher, optionally with a lease",
+            "POST /publishers/release/{publisher_id} - Release publisher",
+            "POST /publishers/renew/{publisher_id}?user=<username>&ttl=<seconds> - Renew publisher lease"
         ],
         "environments": [
             "GET /environments - List all environments",
-            "GET /environments/available - List available environments",
+            "GET /environments?holder=&type=&taken=&meta=key:value&fields=&limit=&cursor= - Filtered, paginated environments",
+            "GET /environments/available - List available environments (same filters)",
+            "GET /environments/available?healthy_only=true - Skip environments that failed their latest health probe",
             "GET /environments/info/{env_name} - Get environment info",
             "GET /environments/status/{env_name} - Get environment status",
-            "POST /environments/take/{env_name}?user=<username> - Take environment",
-            "POST /environments/steal/{env_name}?user=<username> - Steal environment",
-            "POST /environments/release/{env_name} - Release environment"
+            "POST /environments/take/{env_name}?user=<username>&ttl=<seconds> - Take environment, optionally with a lease",
+            "POST /environments/take/{env_name}?user=<username>&wait=true&timeout=<seconds> - Queue for a busy environment",
+            "POST /environments/steal/{env_name}?user=<username>&ttl=<seconds> - Steal environment, optionally with a lease",
+            "POST /environments/release/{env_name} - Release environment",
+            "POST /environments/renew/{env_name}?user=<username>&ttl=<seconds> - Renew environment lease"
+        ],
+        "catalog": [
+            "POST /catalog/reload - Re-read the resource catalog (CATALOG_PATH) and apply the differences"
+        ],
+        "history": [
+            "GET /history?resource_type=&resource_id=&user=&action=&since=&until=&cursor=&limit= - Reservation events, oldest first"
+        ],
+        "analytics": [
+            "GET /analytics/holds - Hold-time percentiles per resource",
+            "GET /analytics/acquire - Time-to-acquire percentiles for queued takes",
+            "GET /analytics/steals - Steal rate per resource",
+            "GET /analytics/occupancy?bucket=hour|day - Occupancy per hour or day"
+        ],
+        "pools": [
+            "GET /pools - List pools with their size and free count",
+            "GET /pools/{pool} - List the members of a pool",
+            "POST /pools/{pool}/acquire?user=<username>&count=<n>&ttl=<seconds> - Take any n free members of a pool"
+        ],
+        "bookings": [
+            "POST /bookings - Book a resource for a future window (resource_type, resource_id, user, start, end)",
+            "GET /bookings?resource_type=&resource_id=&user=&since=&until=&limit= - Bookings overlapping a window",
+            "GET /bookings/at?resource_type=&resource_id=&at=<time> - The booking covering a resource at a time",
+            "GET /bookings/{booking_id} - Get a booking",
+            "DELETE /bookings/{booking_id} - Cancel a booking"
+        ],
+        "batch": [
+            "POST /batch - Apply take/steal/release operations all-or-nothing"
+        ],
+        "users": [
+            "GET /users/{user}/resources - List resources held by a user",
+            "POST /users/{user}/release-all - Release every resource held by a user"
         ]
     }
 
 # ==================== Publisher Endpoints ====================
 
 @app.get("/publishers")
-def list_all_publishers():
-    return {
-        pub_id: pub.get_info()
-        for pub_id, pub in resources.get_all_publishers().items()
-    }
+def list_all_publishers(request: Request, query: Annotated[ListQuery, Depends(list_query)]):
+    if not query.is_empty():
+        return _resource_page(PUBLISHER, query, lambda pub: pub.resource_id)
+    return _versioned_json(request, "publishers", resources.publishers_json)
 
 @app.get("/publishers/available")
-def list_available_publishers():
+def list_available_publishers(query: Annotated[ListQuery, Depends(list_query)], healthy_only: bool = False):
+    if not query.is_empty():
+        if query.taken:
+            raise HTTPException(status_code=400, detail="taken=true conflicts with /available")
+        return _resource_page(
+            PUBLISHER, query.model_copy(update={"taken": False}),
+            lambda pub: pub.metadata.get("publisherId", pub.name),
+            healthy_only
+        )
     available = resources.get_available_publishers()
-    return {
-        pub.metadata.get("publisherId", pub.name): pub.get_info()
+    if healthy_only:
+        available = [pub for pub in available if not resources.is_unhealthy(pub)]
+    return _json(json_object(
+        (pub.metadata.get("publisherId", pub.name), pub.info_json())
         for pub in available
-    }
+    ))
 
 @app.get("/publishers/info/{publisher_id}")
 def get_publisher(publisher_id: str):
     publisher = resources.get_publisher(publisher_id)
     if not publisher:
         raise HTTPException(status_code=404, detail=f"Publisher not found: {publisher_id}")
-    return publisher.get_info()
+    return _json(publisher.info_json())
 
 @app.get("/publishers/status/{publisher_id}")
 def get_publisher_status(publisher_id: str):
     publisher = resources.get_publisher(publisher_id)
     if not publisher:
         raise HTTPException(status_code=404, detail=f"Publisher not found: {publisher_id}")
-    return publisher.get_status()
+    return _json(publisher.status_json())
 
 @app.post("/publishers/take/{publisher_id}")
-def take_publisher(publisher_id: str, user: str):
+async def take_publisher(
+    publisher_id: str,
+    user: str,
+    ttl: Annotated[Optional[float], Query(gt=0)] = None,
+    wait: bool = False,
+    timeout: Annotated[float, Query(gt=0, le=MAX_WAIT_TIMEOUT)] = DEFAULT_WAIT_TIMEOUT
+):
     publisher = resources.get_publisher(publisher_id)
     if not publisher:
         raise HTTPException(status_code=404, detail=f"Publisher not found: {publisher_id}")
 
-    success = publisher.try_to_take(user)
+    wait_loop = asyncio.get_running_loop() if wait else None
+    success, waiter = await run_in_threadpool(resources.take, publisher, user, ttl, wait_loop)
+    if waiter is not None:
+        success = await resources.wait_for(publisher, waiter, timeout)
+    holder = publisher.taken_by
+    status = publisher.get_status()
+
     if success:
-        resources.save_state()
         return {
             "success": True,
             "message": f"Publisher {publisher_id} successfully taken by {user}",
-            "status": publisher.get_status()
+            "status": status
         }
     else:
         return {
             "success": False,
-            "message": f"Publisher {publisher_id} is already taken by {publisher.taken_by}",
-            "status": publisher.get_status()
+            "message": f"Publisher {publisher_id} is already taken by {holder}" +
+                       (f" (waited {timeout:g}s)" if wait else ""),
+            "status": status
         }
 
 @app.post("/publishers/steal/{publisher_id}")
-def steal_publisher(publisher_id: str, user: str):
+def steal_publisher(publisher_id: str, user: str, ttl: Annotated[Optional[float], Query(gt=0)] = None):
     publisher = resources.get_publisher(publisher_id)
     if not publisher:
         raise HTTPException(status_code=404, detail=f"Publisher not found: {publisher_id}")
 
-    previous_owner = publisher.taken_by
-    publisher.steal(user)
-    resources.save_state()
+    with resources.transaction(publisher):
+        previous_owner = publisher.steal(user, ttl)["previous_holder"]
+        status = publisher.get_status()
 
     return {
         "success": True,
         "message": f"Publisher {publisher_id} stolen by {user}" +
                    (f" from {previous_owner}" if previous_owner else ""),
         "previous_owner": previous_owner,
-        "status": publisher.get_status()
+        "status": status
     }
 
 @app.post("/publishers/release/{publisher_id}")
@@ -143,88 +420,133 @@ def release_publisher(publisher_id: str):
     if not publisher:
         raise HTTPException(status_code=404, detail=f"Publisher not found: {publisher_id}")
 
-    success = publisher.release()
+    with resources.transaction(publisher):
+        success = publisher.release()
+        status = publisher.get_status()
+
     if success:
-        resources.save_state()
         return {
             "success": True,
             "message": f"Publisher {publisher_id} successfully released",
-            "status": publisher.get_status()
+            "status": status
         }
     else:
         return {
             "success": False,
             "message": f"Publisher {publisher_id} was not taken",
-            "status": publisher.get_status()
+            "status": status
+        }
+
+@app.post("/publishers/renew/{publisher_id}")
+def renew_publisher(publisher_id: str, user: str, ttl: Annotated[float, Query(gt=0)]):
+    publisher = resources.get_publisher(publisher_id)
+    if not publisher:
+        raise HTTPException(status_code=404, detail=f"Publisher not found: {publisher_id}")
+
+    with resources.transaction(publisher):
+        success = publisher.renew(user, ttl)
+        holder = publisher.taken_by
+        status = publisher.get_status()
+
+    if success:
+        return {
+            "success": True,
+            "message": f"Publisher {publisher_id} lease renewed for {user}",
+            "status": status
+        }
+    else:
+        return {
+            "success": False,
+            "message": f"Publisher {publisher_id} is not held by {user}" +
+                       (f" (held by {holder})" if holder else ""),
+            "status": status
         }
 
 # ==================== Environment Endpoints ====================
 @app.get("/environments")
-def list_all_environments():
-    return {
-        env_id: env.get_info()
-        for env_id, env in resources.get_all_environments().items()
-    }
+def list_all_environments(request: Request, query: Annotated[ListQuery, Depends(list_query)]):
+    if not query.is_empty():
+        return _resource_page(ENVIRONMENT, query, lambda env: env.resource_id)
+    return _versioned_json(request, "environments", resources.environments_json)
 
 @app.get("/environments/available")
-def list_available_environments():
+def list_available_environments(query: Annotated[ListQuery, Depends(list_query)], healthy_only: bool = False):
+    if not query.is_empty():
+        if query.taken:
+            raise HTTPException(status_code=400, detail="taken=true conflicts with /available")
+        return _resource_page(
+            ENVIRONMENT, query.model_copy(update={"taken": False}),
+            lambda env: env.name,
+            healthy_only
+        )
     available = resources.get_available_environments()
-    return {
-        env.name: env.get_info()
-        for env in available
-    }
+    if healthy_only:
+        available = [env for env in available if not resources.is_unhealthy(env)]
+    return _json(json_object((env.name, env.info_json()) for env in available))
 
 @app.get("/environments/info/{env_name}")
 def get_environment(env_name: str):
     environment = resources.get_environment(env_name)
     if not environment:
         raise HTTPException(status_code=404, detail=f"Environment not found: {env_name}")
-    return environment.get_info()
+    return _json(environment.info_json())
 
 @app.get("/environments/status/{env_name}")
 def get_environment_status(env_name: str):
     environment = resources.get_environment(env_name)
     if not environment:
         raise HTTPException(status_code=404, detail=f"Environment not found: {env_name}")
-    return environment.get_status()
+    return _json(environment.status_json())
 
 @app.post("/environments/take/{env_name}")
-def take_environment(env_name: str, user: str):
+async def take_environment(
+    env_name: str,
+    user: str,
+    ttl: Annotated[Optional[float], Query(gt=0)] = None,
+    wait: bool = False,
+    timeout: Annotated[float, Query(gt=0, le=MAX_WAIT_TIMEOUT)] = DEFAULT_WAIT_TIMEOUT
+):
     environment = resources.get_environment(env_name)
     if not environment:
         raise HTTPException(status_code=404, detail=f"Environment not found: {env_name}")
 
-    success = environment.try_to_take(user)
+    wait_loop = asyncio.get_running_loop() if wait else None
+    success, waiter = await run_in_threadpool(resources.take, environment, user, ttl, wait_loop)
+    if waiter is not None:
+        success = await resources.wait_for(environment, waiter, timeout)
+    holder = environment.taken_by
+    status = environment.get_status()
+
     if success:
-        resources.save_state()
         return {
             "success": True,
             "message": f"Environment {env_name} successfully taken by {user}",
-            "status": environment.get_status()
+            "status": status
         }
     else:
         return {
             "success": False,
-            "message": f"Environment {env_name} is already taken by {environment.taken_by}",
-            "status": environment.get_status()
+            "message": f"Environment {env_name} is already taken by {holder}" +
+                       (f" (waited {timeout:g}s)" if wait else ""),
+            "status": status
         }
 
 @app.post("/environments/steal/{env_name}")
-def steal_environment(env_name: str, user: str):
+def steal_environment(env_name: str, user: str, ttl: Annotated[Optional[float], Query(gt=0)] = None):
     environment = resources.get_environment(env_name)
     if not environment:
         raise HTTPException(status_code=404, detail=f"Environment not found: {env_name}")
 
-    previous_owner = environment.taken_by
-    environment.steal(user)
-    resources.save_state()
+    with resources.transaction(environment):
+        previous_owner = environment.steal(user, ttl)["previous_holder"]
+        status = environment.get_status()
 
     return {
         "success": True,
         "message": f"Environment {env_name} stolen by {user}" +
                    (f" from {previous_owner}" if previous_owner else ""),
         "previous_owner": previous_owner,
-        "status": environment.get_status()
+        "status": status
     }
 
 @app.post("/environments/release/{env_name}")
@@ -233,17 +555,383 @@ def release_environment(env_name: str):
     if not environment:
         raise HTTPException(status_code=404, detail=f"Environment not found: {env_name}")
 
-    success = environment.release()
+    with resources.transaction(environment):
+        success = environment.release()
+        status = environment.get_status()
+
     if success:
-        resources.save_state()
         return {
             "success": True,
             "message": f"Environment {env_name} successfully released",
-            "status": environment.get_status()
+            "status": status
         }
     else:
         return {
             "success": False,
             "message": f"Environment {env_name} was not taken",
-            "status": environment.get_status()
-        }
\ No newline at end of file
+            "status": status
+        }
+
+@app.post("/environments/renew/{env_name}")
+def renew_environment(env_name: str, user: str, ttl: Annotated[float, Query(gt=0)]):
+    environment = resources.get_environment(env_name)
+    if not environment:
+        raise HTTPException(status_code=404, detail=f"Environment not found: {env_name}")
+
+    with resources.transaction(environment):
+        success = environment.renew(user, ttl)
+        holder = environment.taken_by
+        status = environment.get_status()
+
+    if success:
+        return {
+            "success": True,
+            "message": f"Environment {env_name} lease renewed for {user}",
+            "status": status
+        }
+    else:
+        return {
+            "success": False,
+            "message": f"Environment {env_name} is not held by {user}" +
+                       (f" (held by {holder})" if holder else ""),
+            "status": status
+        }
+
+# ==================== User Endpoints ====================
+
+def _group_by_type(resources_list) -> dict:
+    grouped = {"publishers": {}, "environments": {}}
+    for resource in resources_list:
+        key = "publishers" if resource.resource_type == PUBLISHER else "environments"
+        grouped[key][resource.resource_id] = resource.get_info()
+    return grouped
+
+@app.get("/users/{user}/resources")
+def get_user_resources(user: str):
+    return {"user": user, **_group_by_type(resources.get_held_by(user))}
+
+@app.post("/users/{user}/release-all")
+def release_all_user_resources(user: str):
+    released = resources.release_all(user)
+    grouped = _group_by_type(released)
+    return {
+        "success": True,
+        "message": f"Released {len(released)} resource(s) held by {user}",
+        "released": {key: list(ids) for key, ids in grouped.items()}
+    }
+
+# ==================== Pool Endpoints ====================
+
+# Most members one acquire request can take
+POOL_MAX_ACQUIRE = 100
+
+@app.get("/pools")
+def list_pools():
+    """Every pool (named by member metadata pool/type/platform) with its size and free count"""
+    return resources.get_pools()
+
+@app.get("/pools/{pool}")
+def get_pool(pool: str):
+    members = resources.get_pool_members(pool)
+    if members is None:
+        raise HTTPException(status_code=404, detail=f"Pool not found: {pool}")
+    return {"pool": pool, **_group_by_type(members)}
+
+@app.post("/pools/{pool}/acquire")
+def acquire_from_pool(
+    pool: str,
+    user: str,
+    count: Annotated[int, Query(ge=1, le=POOL_MAX_ACQUIRE)] = 1,
+    ttl: Annotated[Optional[float], Query(gt=0)] = None
+):
+    """Take any `count` free members of a pool, all or none"""
+    acquired = resources.acquire_from_pool(pool, user, count, ttl)
+    if acquired is None:
+        raise HTTPException(status_code=404, detail=f"Pool not found: {pool}")
+    if not acquired:
+        return {
+            "success": False,
+            "message": f"Pool {pool} has fewer than {count} free member(s)",
+            "acquired": {"publishers": {}, "environments": {}}
+        }
+    return {
+        "success": True,
+        "message": f"{len(acquired)} resource(s) from pool {pool} taken by {user}",
+        "acquired": _group_by_type(acquired)
+    }
+
+# ==================== Booking Endpoints ====================
+
+# Bookings per GET /bookings response
+BOOKINGS_PAGE_SIZE = 1000
+BOOKINGS_MAX_PAGE_SIZE = 10000
+
+
+class BookingRequest(BaseModel):
+    resource_type: Literal["publisher", "environment"]
+    resource_id: str
+    user: str
+    start: datetime
+    end: datetime
+
+
+@app.post("/bookings")
+def create_booking(request: BookingRequest):
+    """Book a resource for a future window; the owner takes it when the window starts"""
+    resource = resources.get_resource(request.resource_type, request.resource_id)
+    if not resource:
+        raise HTTPException(status_code=404, detail=f"Resource not found: {request.resource_type} {request.resource_id}")
+    try:
+        booking = resources.book(resource, request.user, request.start.timestamp(), request.end.timestamp())
+    except BookingConflict as e:
+        raise HTTPException(status_code=409, detail={"message": str(e), "conflict": e.booking.to_dict()})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"success": True, "booking": booking.to_dict()}
+
+@app.get("/bookings")
+def list_bookings(
+    resource_type: Optional[Literal["publisher", "environment"]] = None,
+    resource_id: Optional[str] = None,
+    user: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    limit: Annotated[int, Query(ge=1, le=BOOKINGS_MAX_PAGE_SIZE)] = BOOKINGS_PAGE_SIZE
+):
+    """Bookings overlapping [since, until), by resource and then start time"""
+    bookings = resources.bookings.find(
+        resource_type=resource_type,
+        resource_id=resource_id,
+        user=user,
+        since=since.timestamp() if since else None,
+        until=until.timestamp() if until else None,
+        limit=limit
+    )
+    return {"bookings": [booking.to_dict() for booking in bookings]}
+
+@app.get("/bookings/at")
+def get_booking_at(
+    resource_type: Literal["publisher", "environment"],
+    resource_id: str,
+    at: Optional[datetime] = None
+):
+    """The booking covering a resource at a given time (default now), if any"""
+    ts = at.timestamp() if at else datetime.now().timestamp()
+    booking = resources.bookings.holder_at(resource_type, resource_id, ts)
+    return {"booking": booking.to_dict() if booking else None}
+
+@app.get("/bookings/{booking_id}")
+def get_booking(booking_id: int):
+    booking = resources.bookings.get(booking_id)
+    if not booking:
+        raise HTTPException(status_code=404, detail=f"Booking not found: {booking_id}")
+    return booking.to_dict()
+
+@app.delete("/bookings/{booking_id}")
+def cancel_booking(booking_id: int):
+    """Cancel a booking; a resource it already handed over stays with its holder"""
+    booking = resources.bookings.cancel(booking_id)
+    if not booking:
+        raise HTTPException(status_code=404, detail=f"Booking not found: {booking_id}")
+    return {"success": True, "booking": booking.to_dict()}
+
+# ==================== Batch Endpoints ====================
+
+class BatchOperation(BaseModel):
+    action: Literal["take", "steal", "release"]
+    resource_type: Literal["publisher", "environment"]
+    resource_id: str
+    user: Optional[str] = None
+    ttl: Optional[float] = Field(None, gt=0)
+
+
+class BatchRequest(BaseModel):
+    operations: List[BatchOperation]
+
+
+@app.post("/batch")
+def apply_batch(batch: BatchRequest):
+    for op in batch.operations:
+        if resources.get_resource(op.resource_type, op.resource_id) is None:
+            raise HTTPException(
+                status_code=404,
+                detail=f"{op.resource_type.capitalize()} not found: {op.resource_id}"
+            )
+        if op.action in ("take", "steal") and not op.user:
+            raise HTTPException(status_code=400, detail=f"A user is required to {op.action} {op.resource_id}")
+
+    success, results = resources.apply_batch([
+        (op.action, op.resource_type, op.resource_id, op.user, op.ttl)
+        for op in batch.operations
+    ])
+    if not success:
+        # Removed by a catalog reload after the check above
+        missing = next((failure for failure in results if failure["error"] == NOT_FOUND), None)
+        if missing is not None:
+            raise HTTPException(
+                status_code=404,
+                detail=f"{missing['resource_type'].capitalize()} not found: {missing['resource_id']}"
+            )
+        raise HTTPException(
+            status_code=409,
+            detail={"message": "Batch rejected, no operations were applied", "failures": results}
+        )
+    return {
+        "success": True,
+        "message": f"Applied {len(results)} operation(s)",
+        "results": results
+    }
+
+# ==================== Catalog Endpoints ====================
+
+@app.post("/catalog/reload")
+def reload_catalog():
+    """Re-read the resource catalog and apply it without dropping reservations"""
+    try:
+        changes = resources.reload_catalog()
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"success": True, "source": str(resources.catalog.path), "changes": changes}
+
+# ==================== History Endpoints ====================
+
+# Events per /history page
+HISTORY_PAGE_SIZE = 1000
+HISTORY_MAX_PAGE_SIZE = 10000
+
+@app.get("/history")
+def get_history(
+    resource_type: Optional[Literal["publisher", "environment"]] = None,
+    resource_id: Optional[str] = None,
+    user: Optional[str] = None,
+    action: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    limit: Annotated[int, Query(gt=0, le=HISTORY_MAX_PAGE_SIZE)] = HISTORY_PAGE_SIZE
+):
+    """Reservation events oldest first, streamed. Pass next_cursor back to get the next page."""
+    if action is not None and action not in ACTIONS:
+        raise HTTPException(status_code=400, detail=f"Unknown action: {action}")
+    if cursor is not None:
+        try:
+            resources.history.decode_cursor(cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"Invalid cursor: {cursor}")
+
+    rows = resources.history.iter_events(
+        resource_type=resource_type,
+        resource_id=resource_id,
+        user=user,
+        action=action,
+        since=since,
+        until=until,
+        cursor=cursor,
+        limit=limit
+    )
+
+    def stream():
+        yield '{"events":['
+        count = 0
+        last = None
+        chunk = []
+        for row in rows:
+            chunk.append(json.dumps(resources.history.to_dict(row)))
+            count += 1
+            last = row
+            if len(chunk) == 500:
+                yield ("," if count > len(chunk) else "") + ",".join(chunk)
+                chunk = []
+        if chunk:
+            yield ("," if count > len(chunk) else "") + ",".join(chunk)
+        next_cursor = resources.history.encode_cursor(last[1], last[0]) if count == limit else None
+        yield f'],"next_cursor":{json.dumps(next_cursor)}}}'
+
+    return StreamingResponse(stream(), media_type="application/json")
+
+# ==================== Analytics Endpoints ====================
+
+def _analytics(query, **filters):
+    """Fold new history events into the rollups, then run an analytics query."""
+    resources.analytics.refresh()
+    return query(**filters)
+
+@app.get("/analytics/holds")
+def get_hold_times(
+    resource_type: Optional[Literal["publisher", "environment"]] = None,
+    resource_id: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None
+):
+    """Hold-time p50/p95/max/mean in seconds, per resource and overall"""
+    return _analytics(resources.analytics.hold_times, resource_type=resource_type,
+                      resource_id=resource_id, since=since, until=until)
+
+@app.get("/analytics/acquire")
+def get_acquire_times(
+    resource_type: Optional[Literal["publisher", "environment"]] = None,
+    resource_id: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None
+):
+    """Time-to-acquire percentiles in seconds for takes that had to wait"""
+    return _analytics(resources.analytics.acquire_times, resource_type=resource_type,
+                      resource_id=resource_id, since=since, until=until)
+
+@app.get("/analytics/steals")
+def get_steal_rates(
+    resource_type: Optional[Literal["publisher", "environment"]] = None,
+    resource_id: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None
+):
+    """Acquisitions, steals, waits and steal rate per resource"""
+    return _analytics(resources.analytics.steal_rates, resource_type=resource_type,
+                      resource_id=resource_id, since=since, until=until)
+
+@app.get("/analytics/occupancy")
+def get_occupancy(
+    bucket: Literal["hour", "day"] = "hour",
+    resource_type: Optional[Literal["publisher", "environment"]] = None,
+    resource_id: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None
+):
+    """Share of each hour or day (UTC) every resource was held"""
+    return _analytics(resources.analytics.occupancy, bucket=bucket, resource_type=resource_type,
+                      resource_id=resource_id, since=since, until=until)
+
+# ==================== Metrics Endpoints ====================
+
+@app.get("/metrics")
+def get_metrics():
+    """Request latency, persistence timing, lock waits and registry gauges (Prometheus text format)"""
+    return Response(content=metrics.render(resources.metrics_gauges()),
+                    media_type="text/plain; version=0.0.4; charset=utf-8")
+
+# Longest and shortest allowed sampling interval, in milliseconds
+PROFILER_MIN_INTERVAL_MS = 1.0
+PROFILER_MAX_INTERVAL_MS = 1000.0
+
+@app.post("/debug/profiler/start")
+def start_profiler(
+    interval_ms: Annotated[float, Query(ge=PROFILER_MIN_INTERVAL_MS, le=PROFILER_MAX_INTERVAL_MS)] = 5.0
+):
+    """Start sampling every thread's stack, discarding earlier samples"""
+    if not profiler.start(interval_ms / 1000):
+        raise HTTPException(status_code=409, detail="Profiler is already running")
+    return {"success": True, "interval_ms": interval_ms}
+
+@app.post("/debug/profiler/stop")
+def stop_profiler():
+    """Stop sampling and return the collapsed stacks"""
+    if not profiler.stop():
+        raise HTTPException(status_code=409, detail="Profiler is not running")
+    return get_profile()
+
+@app.get("/debug/profiler")
+def get_profile():
+    """Samples so far, one "frame;frame;... count" line per stack (flamegraph.pl / speedscope)"""
+    return Response(content=profiler.collapsed(), media_type="text/plain; charset=utf-8",
+                    headers={"X-Profiler-Samples": str(profiler.samples),
+                             "X-Profiler-Running": "true" if profiler.running else "false"})
@@ -0,0 +1,184 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Tuple
+
+# Seconds; fine-grained at the low end where the hot paths live
+DEFAULT_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+    0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """A monotonically increasing count per label set."""
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values: str, amount: float = 1) -> None:
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"] + [
+            f"{self.name}{_labels(self.labels, key)} {_number(value)}" for key, value in values
+        ]
+
+
+class Histogram:
+    """Bucketed observations per label set, rendered cumulatively."""
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labels: Tuple[str, ...] = (),
+        buckets: Tuple[float, ...] = DEFAULT_BUCKETS
+    ):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        # label values -> [count per bucket (last is +Inf), sum]
+        self._series: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: str) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    @contextmanager
+    def time(self, *label_values: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *label_values)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            series = sorted((key, (list(counts), total)) for key, (counts, total) in self._series.items())
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, (counts, total) in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = 'le="' + _number(bound) + '"'
+                lines.append(f"{self.name}_bucket{_labels(self.labels, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, key)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labels, key)} {cumulative}")
+        return lines
+
+
+def render_gauge(name: str, help: str, labels: Tuple[str, ...], values: Iterable[Tuple[Tuple[str, ...], float]]) -> List[str]:
+    """Lines for a gauge whose values are read at scrape time."""
+    return [f"# HELP {name} {help}", f"# TYPE {name} gauge"] + [
+        f"{name}{_labels(labels, key)} {_number(value)}" for key, value in values
+    ]
+
+
+HTTP_REQUESTS = Counter(
+    "eac_http_requests_total", "HTTP requests by route and status code.", ("method", "route", "status")
+)
+HTTP_REQUEST_SECONDS = Histogram(
+    "eac_http_request_duration_seconds", "Time to serve a request, by route.", ("method", "route")
+)
+SAVE_STATE_SECONDS = Histogram(
+    "eac_save_state_duration_seconds", "Time spent persisting changed resources and events.", ("backend",)
+)
+LOAD_STATE_SECONDS = Histogram(
+    "eac_load_state_duration_seconds", "Time spent loading persisted state.", ("backend",)
+)
+SQLITE_COMMIT_SECONDS = Histogram(
+    "eac_sqlite_commit_duration_seconds", "Time spent in SQLite COMMIT.", ("store",)
+)
+LOCK_WAIT_SECONDS = Histogram(
+    "eac_lock_wait_seconds", "Time spent waiting for locks at the start of a transaction.", ("lock",)
+)
+
+METRICS = (HTTP_REQUESTS, HTTP_REQUEST_SECONDS, SAVE_STATE_SECONDS, LOAD_STATE_SECONDS,
+           SQLITE_COMMIT_SECONDS, LOCK_WAIT_SECONDS)
+
+
+def render(gauges: Iterable[List[str]] = ()) -> bytes:
+    """Every metric in the Prometheus text exposition format."""
+    lines = [line for metric in METRICS for line in metric.render()]
+    for gauge in gauges:
+        lines.extend(gauge)
+    return ("\n".join(lines) + "\n").encode()
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording request latency and counts per route template.
+
+    Requests that match no route are grouped under "unmatched" so that
+    arbitrary paths cannot grow the label set. Streaming responses are
+    timed until their last body chunk.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._routes: Dict[object, str] = {}
+
+    def _route(self, scope) -> str:
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return "unmatched"
+        route = self._routes.get(endpoint)
+        if route is None:
+            self._routes = {
+                getattr(r, "endpoint", None): r.path for r in getattr(scope.get("app"), "routes", ())
+            }
+            route = self._routes.setdefault(endpoint, "unmatched")
+        return route
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = self._route(scope)
+            HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started, scope["method"], route)
+            HTTP_REQUESTS.inc(scope["method"], route, str(status))
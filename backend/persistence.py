@@ -1,12 +1,42 @@
 import sqlite3
 import os
+import threading
+import time
 from datetime import datetime
-from typing import Optional
+from typing import Optional, Iterable, Tuple, Any, Dict, List
 from pathlib import Path
 
+from metrics import SQLITE_COMMIT_SECONDS
+
+# Pre-single-store layout: one database file per resource type
+LEGACY_DATABASES = {
+    "publisher": "qa_publishers.db",
+    "environment": "staging_environments.db",
+}
+
+# Failed attempts at a batch, once closing, before it is dropped so shutdown can finish
+SHUTDOWN_WRITE_ATTEMPTS = 3
+
 
 class ResourcePersistence:
-    def __init__(self, data_dir: str = None):
+    """SQLite store for resource state.
+
+    By default every save commits before returning. In write-behind mode
+    saves are queued (coalesced per resource) and a background writer
+    group-commits them once the oldest has waited `flush_interval` seconds
+    or `max_batch` rows are pending, which bounds how much is lost on a
+    crash. The queue is drained by flush() and close().
+    """
+
+    def __init__(
+        self,
+        data_dir: str = None,
+        write_behind: Optional[bool] = None,
+        flush_interval: Optional[float] = None,
+        max_batch: Optional[int] = None
+    ):
+        if data_dir is None:
+            data_dir = os.environ.get("DATA_DIR")
         if data_dir is None:
             # Use absolute path: backend/data/ relative to this script
             script_dir = Path(__file__).parent
@@ -15,103 +45,305 @@ class ResourcePersistence:
             self.data_dir = Path(data_dir)
         self.data_dir.mkdir(exist_ok=True)
 
-        self.publishers_db = self.data_dir / "qa_publishers.db"
-        self.environments_db = self.data_dir / "staging_environments.db"
+        self.db_path = self.data_dir / "resources.db"
+
+        # One long-lived connection in WAL mode is shared by all callers
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+        if write_behind is None:
+            write_behind = os.environ.get("PERSISTENCE_MODE", "sync") == "write-behind"
+        if flush_interval is None:
+            flush_interval = float(os.environ.get("PERSISTENCE_FLUSH_MS", "50")) / 1000
+        if max_batch is None:
+            max_batch = int(os.environ.get("PERSISTENCE_BATCH_SIZE", "1000"))
+        self.write_behind = write_behind
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+
+        # Write-behind queue: latest row per (resource_type, resource_id),
+        # plus history events in the order they happened
+        self._pending: Dict[Tuple[str, str], tuple] = {}
+        self._pending_events: List[tuple] = []
+        self._pending_since: Optional[float] = None
+        self._in_flight = False
+        self._queue_cond = threading.Condition()
+        self._writer: Optional[threading.Thread] = None
+        self._stopping = False
 
-        self._init_databases()
+        self._init_database()
+        self._start_writer()
 
-    def _init_databases(self):
+    def _connect(self) -> sqlite3.Connection:
+        """Return the shared connection, opening it on first use."""
+        if self._conn is None:
+            conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            # With WAL, NORMAL only syncs at checkpoints and stays corruption-safe
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA temp_store=MEMORY")
+            self._conn = conn
+        return self._conn
+
+    def _init_database(self):
         """Initialize the database tables if they don't exist."""
-        # Initialize publishers database
-        with sqlite3.connect(self.publishers_db) as conn:
+        with self._lock:
+            conn = self._connect()
             conn.execute("""
                 CREATE TABLE IF NOT EXISTS resource_state (
-                    resource_id TEXT PRIMARY KEY,
+                    resource_type TEXT NOT NULL,
+                    resource_id TEXT NOT NULL,
                     taken_by TEXT,
                     taken_at TEXT,
-                    last_updated TEXT
+                    lease_expires_at TEXT,
+                    last_updated TEXT,
+                    PRIMARY KEY (resource_type, resource_id)
                 )
             """)
-            conn.commit()
-
-        # Initialize environments database
-        with sqlite3.connect(self.environments_db) as conn:
+            # Append-only reservation history; ts is epoch seconds
             conn.execute("""
-                CREATE TABLE IF NOT EXISTS resource_state (
-                    resource_id TEXT PRIMARY KEY,
-                    taken_by TEXT,
-                    taken_at TEXT,
-                    last_updated TEXT
+                CREATE TABLE IF NOT EXISTS reservation_events (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    ts REAL NOT NULL,
+                    resource_type TEXT NOT NULL,
+                    resource_id TEXT NOT NULL,
+                    action TEXT NOT NULL,
+                    user TEXT,
+                    previous_holder TEXT
+                )
+            """)
+            conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_events_resource_ts
+                ON reservation_events (resource_type, resource_id, ts)
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_events_ts ON reservation_events (ts)")
+            # Used by the shared state backend: seq is bumped on every write to
+            # a row (compare-and-swap), change_seq orders changes across processes
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(resource_state)")}
+            for column in ("seq", "change_seq"):
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE resource_state ADD COLUMN {column} INTEGER NOT NULL DEFAULT 0")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_state_change_seq ON resource_state (change_seq)")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS registry_meta (
+                    key TEXT PRIMARY KEY,
+                    value INTEGER NOT NULL
                 )
             """)
             conn.commit()
+            self._migrate_legacy_databases(conn)
+
+    def _migrate_legacy_databases(self, conn: sqlite3.Connection) -> None:
+        """Import state from the old per-type database files, then set them aside."""
+        for resource_type, filename in LEGACY_DATABASES.items():
+            legacy_path = self.data_dir / filename
+            if not legacy_path.exists():
+                continue
+            try:
+                conn.execute("ATTACH DATABASE ? AS legacy", (str(legacy_path),))
+                try:
+                    columns = {row[1] for row in conn.execute("PRAGMA legacy.table_info(resource_state)")}
+                    if columns:
+                        lease_column = "lease_expires_at" if "lease_expires_at" in columns else "NULL"
+                        with conn:
+                            conn.execute(f"""
+                                INSERT OR IGNORE INTO resource_state
+                                (resource_type, resource_id, taken_by, taken_at, lease_expires_at, last_updated)
+                                SELECT ?, resource_id, taken_by, taken_at, {lease_column}, last_updated
+                                FROM legacy.resource_state
+                            """, (resource_type,))
+                finally:
+                    conn.execute("DETACH DATABASE legacy")
+                legacy_path.rename(legacy_path.with_name(legacy_path.name + ".migrated"))
+                print(f"Migrated {filename} into {self.db_path.name}")
+            except Exception as e:
+                print(f"Error migrating {filename}: {e}")
+                import traceback
+                traceback.print_exc()
+
+    @staticmethod
+    def state_row(resource_type: str, resource_id: str, resource: Any, now: str) -> tuple:
+        """A resource_state row: (resource_type, resource_id, taken_by, taken_at, lease_expires_at, last_updated)."""
+        return (
+            resource_type,
+            resource_id,
+            resource.taken_by,
+            resource.taken_at.isoformat() if resource.taken_at else None,
+            resource.lease_expires_at.isoformat() if resource.lease_expires_at else None,
+            now
+        )
+
+    def _write_rows(self, rows: Iterable[tuple], events: Iterable[tuple] = ()) -> None:
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.executemany("""
+                    INSERT OR REPLACE INTO resource_state
+                    (resource_type, resource_id, taken_by, taken_at, lease_expires_at, last_updated)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                """, rows)
+                conn.executemany("""
+                    INSERT INTO reservation_events
+                    (ts, resource_type, resource_id, action, user, previous_holder)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                """, events)
+                with SQLITE_COMMIT_SECONDS.time("persistence"):
+                    conn.commit()
+
+    def save_changes(
+        self,
+        changes: Iterable[Tuple[str, str, Any]],
+        events: List[tuple] = ()
+    ) -> bool:
+        """Write (resource_type, resource_id, resource) rows and history events in one transaction.
+
+        Events are (ts, resource_type, resource_id, action, user, previous_holder)
+        tuples. Rows are read from the resources under the writer's lock, so
+        when two saves race the later one always writes the newer state. In
+        write-behind mode everything is only queued and this always succeeds.
+        """
+        now = datetime.now().isoformat()
+        rows = (self.state_row(resource_type, resource_id, resource, now)
+                for resource_type, resource_id, resource in changes)
+        if self.write_behind:
+            self._enqueue(rows, events)
+            return True
 
-    def save_state(self, resources_registry) -> None:
-        """Save the current state of all resources to SQLite databases."""
         try:
-            # Save publishers to qa_publishers.db
-            with sqlite3.connect(self.publishers_db) as conn:
-                for pub_id, publisher in resources_registry.publishers.items():
-                    conn.execute("""
-                        INSERT OR REPLACE INTO resource_state
-                        (resource_id, taken_by, taken_at, last_updated)
-                        VALUES (?, ?, ?, ?)
-                    """, (
-                        pub_id,
-                        publisher.taken_by,
-                        publisher.taken_at.isoformat() if publisher.taken_at else None,
-                        datetime.now().isoformat()
-                    ))
-                conn.commit()
-
-            # Save environments to staging_environments.db
-            with sqlite3.connect(self.environments_db) as conn:
-                for env_id, environment in resources_registry.environments.items():
-                    conn.execute("""
-                        INSERT OR REPLACE INTO resource_state
-                        (resource_id, taken_by, taken_at, last_updated)
-                        VALUES (?, ?, ?, ?)
-                    """, (
-                        env_id,
-                        environment.taken_by,
-                        environment.taken_at.isoformat() if environment.taken_at else None,
-                        datetime.now().isoformat()
-                    ))
-                conn.commit()
+            self._write_rows(rows, events)
+            return True
 
         except Exception as e:
             print(f"Error saving state: {e}")
             import traceback
             traceback.print_exc()
+            return False
+
+    # Write-behind queue
+    def _enqueue(self, rows: Iterable[tuple], events: List[tuple] = (), retry: bool = False) -> None:
+        with self._queue_cond:
+            for row in rows:
+                key = (row[0], row[1])
+                # A retried row must not overwrite a newer one queued meanwhile
+                if retry and key in self._pending:
+                    continue
+                self._pending[key] = row
+            if retry:
+                self._pending_events[:0] = events
+            else:
+                self._pending_events.extend(events)
+            if (self._pending or self._pending_events) and self._pending_since is None:
+                self._pending_since = time.monotonic()
+            self._queue_cond.notify_all()
+
+    def _start_writer(self) -> None:
+        if self.write_behind and self._writer is None:
+            self._stopping = False
+            self._writer = threading.Thread(target=self._write_behind_loop, name="persistence-writer", daemon=True)
+            self._writer.start()
+
+    def _next_batch(self) -> Optional[Tuple[List[tuple], List[tuple]]]:
+        """Wait for the flush interval or batch size, then take the queued rows and events."""
+        with self._queue_cond:
+            while True:
+                if self._pending or self._pending_events:
+                    waited = time.monotonic() - self._pending_since
+                    queued = len(self._pending) + len(self._pending_events)
+                    if self._stopping or waited >= self.flush_interval or queued >= self.max_batch:
+                        rows = list(self._pending.values())
+                        events = self._pending_events
+                        self._pending = {}
+                        self._pending_events = []
+                        self._pending_since = None
+                        self._in_flight = True
+                        return rows, events
+                    self._queue_cond.wait(self.flush_interval - waited)
+                elif self._stopping:
+                    return None
+                else:
+                    self._queue_cond.wait()
+
+    def _write_behind_loop(self) -> None:
+        failures = 0
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            rows, events = batch
+            try:
+                self._write_rows(rows, events)
+                failures = 0
+            except Exception as e:
+                print(f"Error saving state: {e}")
+                import traceback
+                traceback.print_exc()
+                failures += 1
+                if self._stopping and failures >= SHUTDOWN_WRITE_ATTEMPTS:
+                    # Retrying forever would keep close() from returning
+                    with self._queue_cond:
+                        dropped_rows = len(rows) + len(self._pending)
+                        dropped_events = len(events) + len(self._pending_events)
+                        self._pending = {}
+                        self._pending_events = []
+                        self._pending_since = None
+                    print(f"Giving up on saving state after {failures} attempts: "
+                          f"dropped {dropped_rows} resource rows and {dropped_events} events")
+                else:
+                    self._enqueue(rows, events, retry=True)
+                    time.sleep(self.flush_interval)
+            finally:
+                with self._queue_cond:
+                    self._in_flight = False
+                    self._queue_cond.notify_all()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Block until every queued row has been committed. Returns False on timeout."""
+        if not self.write_behind:
+            return True
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._queue_cond:
+            # Don't wait out the flush interval for what is already queued
+            if self._pending_since is not None:
+                self._pending_since -= self.flush_interval
+            self._queue_cond.notify_all()
+            while self._pending or self._pending_events or self._in_flight:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._queue_cond.wait(remaining)
+        return True
+
+    def save_state(self, resources_registry) -> None:
+        """Save the current state of all resources."""
+        self.save_changes(
+            [("publisher", pub_id, pub) for pub_id, pub in resources_registry.publishers.items()] +
+            [("environment", env_id, env) for env_id, env in resources_registry.environments.items()]
+        )
 
     def load_state(self, resources_registry) -> bool:
-        """Load the saved state from SQLite databases and apply it to the resources registry."""
+        """Load the saved state from SQLite and apply it to the resources registry."""
         try:
             loaded_any = False
+            registries = {
+                "publisher": resources_registry.publishers,
+                "environment": resources_registry.environments,
+            }
 
-            # Load publishers from qa_publishers.db
-            if self.publishers_db.exists():
-                with sqlite3.connect(self.publishers_db) as conn:
-                    cursor = conn.execute("SELECT resource_id, taken_by, taken_at FROM resource_state")
-                    for row in cursor:
-                        resource_id, taken_by, taken_at_str = row
-                        if resource_id in resources_registry.publishers:
-                            publisher = resources_registry.publishers[resource_id]
-                            publisher.taken_by = taken_by
-                            publisher.taken_at = datetime.fromisoformat(taken_at_str) if taken_at_str else None
-                            loaded_any = True
-
-            # Load environments from staging_environments.db
-            if self.environments_db.exists():
-                with sqlite3.connect(self.environments_db) as conn:
-                    cursor = conn.execute("SELECT resource_id, taken_by, taken_at FROM resource_state")
-                    for row in cursor:
-                        resource_id, taken_by, taken_at_str = row
-                        if resource_id in resources_registry.environments:
-                            environment = resources_registry.environments[resource_id]
-                            environment.taken_by = taken_by
-                            environment.taken_at = datetime.fromisoformat(taken_at_str) if taken_at_str else None
-                            loaded_any = True
+            with self._lock:
+                cursor = self._connect().execute("""
+                    SELECT resource_type, resource_id, taken_by, taken_at, lease_expires_at
+                    FROM resource_state
+                """)
+                for row in cursor:
+                    resource_type, resource_id, taken_by, taken_at_str, lease_expires_str = row
+                    registry = registries.get(resource_type, {})
+                    if resource_id in registry:
+                        resource = registry[resource_id]
+                        resource.taken_by = taken_by
+                        resource.taken_at = datetime.fromisoformat(taken_at_str) if taken_at_str else None
+                        resource.lease_expires_at = datetime.fromisoformat(lease_expires_str) if lease_expires_str else None
+                        resource.invalidate()
+                        loaded_any = True
 
             return loaded_any
 
@@ -121,9 +353,25 @@ class ResourcePersistence:
             traceback.print_exc()
             return False
 
+    def close(self) -> None:
+        """Drain the write-behind queue and close the shared connection."""
+        if self._writer is not None:
+            with self._queue_cond:
+                self._stopping = True
+                self._queue_cond.notify_all()
+            self._writer.join()
+            self._writer = None
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
     def clear_state(self) -> None:
         """Clear all persisted state by deleting the database files."""
-        if self.publishers_db.exists():
-            self.publishers_db.unlink()
-        if self.environments_db.exists():
-            self.environments_db.unlink()
+        self.close()
+        for suffix in ("", "-wal", "-shm"):
+            path = self.db_path.with_name(self.db_path.name + suffix)
+            if path.exists():
+                path.unlink()
+        self._init_database()
+        self._start_writer()
@@ -0,0 +1,76 @@
+import sys
+import threading
+import time
+from typing import Dict, Optional
+
+
+class SamplingProfiler:
+    """Periodically samples every thread's stack and counts identical stacks.
+
+    Nothing is traced between samples, so the cost is one stack walk per
+    thread every `interval` seconds, paid by the sampling thread. Results
+    are in the collapsed-stack format read by flamegraph.pl and speedscope.
+    """
+
+    def __init__(self, max_depth: int = 64):
+        self.max_depth = max_depth
+        self.interval = 0.0
+        self.samples = 0
+        self.started_at: Optional[float] = None
+        self._stacks: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def start(self, interval: float = 0.005) -> bool:
+        """Start sampling, discarding earlier samples. Returns False if already running."""
+        with self._lock:
+            if self._thread is not None:
+                return False
+            self.interval = interval
+            self.samples = 0
+            self.started_at = time.time()
+            self._stacks = {}
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+            self._thread.start()
+            return True
+
+    def stop(self) -> bool:
+        """Stop sampling; the samples are kept until the next start. Returns False if not running."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is None:
+            return False
+        self._stop.set()
+        thread.join()
+        return True
+
+    def collapsed(self) -> str:
+        """One "frame;frame;... count" line per distinct stack, root first."""
+        with self._lock:
+            stacks = sorted(self._stacks.items(), key=lambda item: -item[1])
+        return "".join(f"{stack} {count}\n" for stack, count in stacks)
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            frames = sys._current_frames()
+            with self._lock:
+                for ident, frame in frames.items():
+                    if ident == own:
+                        continue
+                    stack = []
+                    while frame is not None and len(stack) < self.max_depth:
+                        code = frame.f_code
+                        stack.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{code.co_firstlineno})")
+                        frame = frame.f_back
+                    stack.append(names.get(ident, str(ident)))
+                    key = ";".join(reversed(stack))
+                    self._stacks[key] = self._stacks.get(key, 0) + 1
+                self.samples += 1
@@ -1,122 +1,391 @@
-from typing import Dict, Optional, List
+import asyncio
+import bisect
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager, ExitStack
+from datetime import datetime
+from itertools import islice
+from typing import Any, Callable, Dict, Optional, List, Tuple
+from Resource import Resource, intern_metadata, prune_metadata_pool
+from catalog import CatalogEntry, CatalogWatcher, ResourceCatalog
 from QAPPublisher import QAPPublisher
 from StagingEnv import StagingEnv
 from persistence import ResourcePersistence
+from analytics import UtilizationAnalytics
+from bookings import Booking, BookingCalendar
+from events import EventBroker
+from health import HealthProber
+from metrics import LOAD_STATE_SECONDS, LOCK_WAIT_SECONDS, SAVE_STATE_SECONDS, render_gauge
+from history import ReservationHistory
+from scheduler import DeadlineScheduler
+from serialization import JsonObjectCache
+from state_backend import make_state_backend
+from waitqueue import WaitQueues, Waiter
 
-class ResourceRegistry:
+PUBLISHER = "publisher"
+ENVIRONMENT = "environment"
 
-    def __init__(self):
-        self.publishers: Dict[str, QAPPublisher] = {}
-        self.environments: Dict[str, StagingEnv] = {}
-        self.persistence = ResourcePersistence()
-        self._initialize_resources()
-        self._load_state()
 
-    def _initialize_resources(self):
-        self._initialize_qa_publishers()
-        self._initialize_staging_environments()
-
-    def _initialize_qa_publishers(self):
-
-        # QA Publisher 1: PaidPubs
-        self.publishers["1469036"] = QAPPublisher(
-            publisherId="1469036",
-            name="PaidPubs",
-            metadata={
-                "domain": "pushpaidpubs.taboola.qa",
-                "product": "web-push-qa",
-                "transformer_url": "https://transformer.taboola.com/products?accountId=1469036",
-                "type": "paidpubs"
-            }
-        )
+# Number of recent changes kept for GET /status/changes
+CHANGELOG_SIZE = 10000
 
-        # QA Publisher 2: Newsroom
-        self.publishers["1590830"] = QAPPublisher(
-            publisherId="1590830",
-            name="Newsroom",
-            metadata={
-                "domain": "pushnewsroom.taboola.qa",
-                "product": "webpushqa-tropit",
-                "transformer_url": "https://transformer.taboola.com/products?accountId=1590830",
-                "type": "newsroom"
-            }
-        )
+# apply_batch's error for an operation on a resource that is not in the registry
+NOT_FOUND = "not found"
 
-        # QA Publisher 3: SMB
-        self.publishers["1689467"] = QAPPublisher(
-            publisherId="1689467",
-            name="SMB",
-            metadata={
-                "domain": "pushsmb.taboola.qa",
-                "product": "web-push-qa-smb",
-                "transformer_url": "https://transformer.taboola.com/products?accountId=1689467",
-                "type": "smb"
-            }
-        )
+# Metadata keys whose values name the pools a resource belongs to
+POOL_KEYS = ("pool", "type", "platform")
 
-        # QA Publisher 4: Android
-        self.publishers["1704250"] = QAPPublisher(
-            publisherId="1704250",
-            name="Android",
-            metadata={
-                "platform": "android",
-                "package_name": "com.newsplace.app.qa"
-            }
-        )
+# Seconds between catalog file checks; 0 turns the watcher off
+CATALOG_WATCH_SECONDS = float(os.environ.get("CATALOG_WATCH_SECONDS", "0"))
 
-        # QA Publisher 5: iOS
-        self.publishers["1791194"] = QAPPublisher(
-            publisherId="1791194",
-            name="iOS",
-            metadata={
-                "platform": "ios",
-                "bundle_id": "com.taboola.pushAppQA"
-            }
-        )
+# Seconds between health probe cycles; 0 turns the prober off
+HEALTH_PROBE_SECONDS = float(os.environ.get("HEALTH_PROBE_SECONDS", "0"))
+# How long a probe result is trusted; defaults to three cycles
+HEALTH_TTL_SECONDS = float(os.environ.get("HEALTH_TTL_SECONDS", str(3 * HEALTH_PROBE_SECONDS)))
+HEALTH_PROBE_TIMEOUT = float(os.environ.get("HEALTH_PROBE_TIMEOUT", "5"))
+HEALTH_PROBE_CONCURRENCY = int(os.environ.get("HEALTH_PROBE_CONCURRENCY", "32"))
+HEALTH_PROBE_PER_HOST = int(os.environ.get("HEALTH_PROBE_PER_HOST", "4"))
 
-    def _initialize_staging_environments(self):
-        """Initialize staging environments."""
 
-        # Prime
-        self.environments["prime-staging"] = StagingEnv(
-            name="Prime",
-            metadata={}
-        )
+class ResourceRegistry:
 
-        # Epsilon
-        self.environments["epsilon-staging"] = StagingEnv(
-            name="Epsilon",
-            metadata={}
+    def __init__(self, catalog: Optional[ResourceCatalog] = None):
+        self.publishers: Dict[str, QAPPublisher] = {}
+        self.environments: Dict[str, StagingEnv] = {}
+        self.catalog = catalog or ResourceCatalog()
+        self.catalog_watcher = CatalogWatcher(self.catalog, self.reload_catalog, CATALOG_WATCH_SECONDS)
+        self._catalog_lock = threading.Lock()
+        self.persistence = ResourcePersistence()
+        # Where state decisions are made: this process alone, or the shared database
+        self.backend = make_state_backend(self)
+        self.history = ReservationHistory(self.persistence.db_path)
+        self.analytics = UtilizationAnalytics(self.persistence.db_path)
+        self.events = EventBroker()
+        self.leases = DeadlineScheduler(self._expire_leases, name="lease-expiry")
+        self.bookings = BookingCalendar(self.persistence.db_path)
+        self.booking_starts = DeadlineScheduler(self._activate_bookings, name="booking-activation")
+        self.waiters = WaitQueues(self._on_wait_withdrawn)
+        self.health = HealthProber(
+            self._all_resources,
+            HEALTH_PROBE_SECONDS,
+            timeout=HEALTH_PROBE_TIMEOUT,
+            concurrency=HEALTH_PROBE_CONCURRENCY,
+            per_host=HEALTH_PROBE_PER_HOST,
+            ttl=HEALTH_TTL_SECONDS
         )
 
-        # Tropit
-        self.environments["tropit-staging"] = StagingEnv(
-            name="Tropit",
-            metadata={}
-        )
+        # Resources changed since the last save, keyed by (resource_type, resource_id),
+        # and the history events recorded since then
+        self._dirty: Dict[Tuple[str, str], Resource] = {}
+        self._events: List[tuple] = []
+        self._state_lock = threading.Lock()
+
+        # Bumped on every state change. The epoch tells versions from
+        # different processes apart, since the counter restarts at zero.
+        self.epoch = uuid.uuid4().hex[:12]
+        self.version = 0
+        # (version, body) per view name, and per (name, encoding) for re-encoded views
+        self._view_cache: Dict[Any, Tuple[int, Any]] = {}
+        # Serialized list bodies per resource type, re-joined only where something changed
+        self._info_bodies = {t: JsonObjectCache(Resource.info_json) for t in (PUBLISHER, ENVIRONMENT)}
+        self._status_bodies = {t: JsonObjectCache(Resource.status_json) for t in (PUBLISHER, ENVIRONMENT)}
+
+        # (version, resource_type, resource_id, status) for the most recent changes
+        self._changelog: deque = deque(maxlen=CHANGELOG_SIZE)
+
+        # Indexes kept current by resource state transitions. Dicts with None
+        # values are used as insertion-ordered sets.
+        self._free: Dict[str, Dict[str, None]] = {PUBLISHER: {}, ENVIRONMENT: {}}
+        self._holders: Dict[str, Dict[Tuple[str, str], None]] = {}
+        self._by_type: Dict[Tuple[str, str], Dict[str, None]] = {}
+        # Members and free members per pool name, keyed by (resource_type, resource_id)
+        self._pools: Dict[str, Dict[Tuple[str, str], None]] = {}
+        self._pool_free: Dict[str, Dict[Tuple[str, str], None]] = {}
+        # Sorted resource ids per resource type and per (resource_type, type value),
+        # for keyset paging; rebuilt on the next query after their membership changes
+        self._sorted_ids: Dict[Any, List[str]] = {}
+
+        # Freed resources that have waiters, handed over before their transaction unlocks them
+        self._handoffs: Dict[Tuple[str, str], None] = {}
+        self._local = threading.local()
 
-        # Transformer
-        self.environments["transformer-staging"] = StagingEnv(
-            name="Transformer",
-            metadata={}
-        )
+        self._initialize_resources()
+        self._load_state()
+        self._build_indexes()
+        for booking in self.bookings.pending(time.time()):
+            self.booking_starts.schedule(booking.start, booking.id)
 
-        # Jade Pubs 1
-        self.environments["jade-pubs-1-staging"] = StagingEnv(
-            name="Jade Pubs 1",
-            metadata={
-                "instance": "1"
-            }
-        )
+    def _initialize_resources(self):
+        catalog = self.catalog.load()
+        self.publishers = {
+            pub_id: self._build_resource(PUBLISHER, pub_id, entry)
+            for pub_id, entry in catalog[PUBLISHER].items()
+        }
+        self.environments = {
+            env_id: self._build_resource(ENVIRONMENT, env_id, entry)
+            for env_id, entry in catalog[ENVIRONMENT].items()
+        }
+        self._bind_resources()
+
+    @staticmethod
+    def _build_resource(resource_type: str, resource_id: str, entry: CatalogEntry) -> Resource:
+        if resource_type == PUBLISHER:
+            return QAPPublisher(publisherId=resource_id, name=entry.name, metadata=entry.metadata)
+        return StagingEnv(name=entry.name, metadata=entry.metadata)
+
+    def _bind_resources(self):
+        """Let every resource report its changes back to the registry."""
+        for pub_id, pub in self.publishers.items():
+            pub.bind(PUBLISHER, pub_id, self._on_resource_changed)
+        for env_id, env in self.environments.items():
+            env.bind(ENVIRONMENT, env_id, self._on_resource_changed)
+
+    def _resources_of(self, resource_type: str) -> Dict[str, Resource]:
+        return self.publishers if resource_type == PUBLISHER else self.environments
+
+    # Indexes
+    @staticmethod
+    def _type_keys(resource: Resource) -> List[str]:
+        """The values a resource can be looked up by in get_*_by_type."""
+        return [
+            resource.metadata[key] for key in ("type", "platform")
+            if resource.metadata.get(key) is not None
+        ]
 
-        # Jade Pubs 2
-        self.environments["jade-pubs-2-staging"] = StagingEnv(
-            name="Jade Pubs 2",
-            metadata={
-                "instance": "2"
-            }
+    @staticmethod
+    def _pool_names(resource: Resource) -> List[str]:
+        """The pools a resource can be acquired from."""
+        names = []
+        for key in POOL_KEYS:
+            value = resource.metadata.get(key)
+            if value is not None and value not in names:
+                names.append(value)
+        return names
+
+    def _index_resource(self, resource: Resource) -> None:
+        key = (resource.resource_type, resource.resource_id)
+        self._sorted_ids.pop(resource.resource_type, None)
+        if resource.taken_by is None:
+            self._free[resource.resource_type][resource.resource_id] = None
+        else:
+            self._holders.setdefault(resource.taken_by, {})[key] = None
+        for type_key in self._type_keys(resource):
+            self._by_type.setdefault((resource.resource_type, type_key), {})[resource.resource_id] = None
+            self._sorted_ids.pop((resource.resource_type, type_key), None)
+        for pool in self._pool_names(resource):
+            self._pools.setdefault(pool, {})[key] = None
+            free = self._pool_free.setdefault(pool, {})
+            if resource.taken_by is None:
+                free[key] = None
+
+    def _build_indexes(self) -> None:
+        with self._state_lock:
+            for resource_type in (PUBLISHER, ENVIRONMENT):
+                for resource in self._resources_of(resource_type).values():
+                    self._index_resource(resource)
+                    self._schedule_lease(resource)
+
+    def _drop_holder(self, user: str, key: Tuple[str, str]) -> None:
+        held = self._holders.get(user)
+        if held is not None:
+            held.pop(key, None)
+            if not held:
+                del self._holders[user]
+
+    def _update_indexes(self, resource: Resource, previous_holder: Optional[str]) -> None:
+        key = (resource.resource_type, resource.resource_id)
+        free = self._free[resource.resource_type]
+        if previous_holder is not None:
+            self._drop_holder(previous_holder, key)
+        if resource.taken_by is None:
+            free[resource.resource_id] = None
+        else:
+            free.pop(resource.resource_id, None)
+            self._holders.setdefault(resource.taken_by, {})[key] = None
+        for pool in self._pool_names(resource):
+            pool_free = self._pool_free.get(pool)
+            if pool_free is None:
+                continue
+            if resource.taken_by is None:
+                pool_free[key] = None
+            else:
+                pool_free.pop(key, None)
+
+    def add_publisher(self, pub_id: str, publisher: QAPPublisher) -> None:
+        """Register a publisher at runtime."""
+        publisher.bind(PUBLISHER, pub_id, self._on_resource_changed)
+        with self._state_lock:
+            self.publishers[pub_id] = publisher
+            self._index_resource(publisher)
+
+    def add_environment(self, env_id: str, environment: StagingEnv) -> None:
+        """Register a staging environment at runtime."""
+        environment.bind(ENVIRONMENT, env_id, self._on_resource_changed)
+        with self._state_lock:
+            self.environments[env_id] = environment
+            self._index_resource(environment)
+
+    def _unindex_resource(self, resource: Resource) -> None:
+        """Drop a free resource from the availability, type and pool indexes."""
+        key = (resource.resource_type, resource.resource_id)
+        self._free[resource.resource_type].pop(resource.resource_id, None)
+        self._sorted_ids.pop(resource.resource_type, None)
+        for type_key in self._type_keys(resource):
+            self._sorted_ids.pop((resource.resource_type, type_key), None)
+            ids = self._by_type.get((resource.resource_type, type_key))
+            if ids is not None:
+                ids.pop(resource.resource_id, None)
+                if not ids:
+                    del self._by_type[(resource.resource_type, type_key)]
+        for pool in self._pool_names(resource):
+            members = self._pools.get(pool)
+            if members is not None:
+                members.pop(key, None)
+                self._pool_free[pool].pop(key, None)
+                if not members:
+                    del self._pools[pool]
+                    del self._pool_free[pool]
+
+    # Catalog
+    def reload_catalog(self) -> Dict[str, Dict[str, List[str]]]:
+        """Apply the catalog source to the live registry.
+
+        Resources that stay in the catalog keep their reservations; only
+        their name and metadata are updated. Removed resources are released
+        first, so their history closes and the persisted row is left free.
+        Raises ValueError, leaving the registry untouched, if the catalog
+        is invalid.
+        """
+        catalog = self.catalog.load()
+        summary = {}
+        with self._catalog_lock:
+            for resource_type, section in ((PUBLISHER, "publishers"), (ENVIRONMENT, "environments")):
+                entries = catalog[resource_type]
+                current = self._resources_of(resource_type)
+                added = [resource_id for resource_id in entries if resource_id not in current]
+                removed = [resource_id for resource_id in current if resource_id not in entries]
+                updated = [
+                    resource_id for resource_id, entry in entries.items()
+                    if resource_id in current
+                    and (current[resource_id].name, current[resource_id].metadata) != entry
+                ]
+                summary[section] = {"added": added, "updated": updated, "removed": removed}
+                if not (added or removed):
+                    for resource_id in updated:
+                        self._update_resource(current[resource_id], entries[resource_id])
+                    continue
+
+                # Swap in a new dict so readers iterating the old one are unaffected
+                live = dict(current)
+                for resource_id in added:
+                    resource = self._build_resource(resource_type, resource_id, entries[resource_id])
+                    resource.bind(resource_type, resource_id, self._on_resource_changed)
+                    live[resource_id] = resource
+                gone = [live.pop(resource_id) for resource_id in removed]
+                with self._state_lock:
+                    if resource_type == PUBLISHER:
+                        self.publishers = live
+                    else:
+                        self.environments = live
+                    for resource_id in added:
+                        self._index_resource(live[resource_id])
+                    # Readers resolve index ids against the live dict, so drop the removed ones with it
+                    for resource in gone:
+                        self._unindex_resource(resource)
+                        if resource.taken_by is not None:
+                            self._drop_holder(resource.taken_by, (resource_type, resource.resource_id))
+                for resource_id in updated:
+                    self._update_resource(live[resource_id], entries[resource_id])
+                for resource in gone:
+                    self._remove_resource(resource)
+
+            if any(changes for section in summary.values() for changes in section.values()):
+                # Clients can't apply this as per-resource changes; make them refetch
+                with self._state_lock:
+                    self.version += 1
+                    self._changelog.clear()
+                # Metadata that was replaced or removed would otherwise stay interned forever
+                prune_metadata_pool(resource.metadata for resource in self._all_resources())
+                self.events.publish({"type": "resync"})
+                print(f"Reloaded catalog from {self.catalog.path}: {summary}")
+        return summary
+
+    def _update_resource(self, resource: Resource, entry: CatalogEntry) -> None:
+        with resource.lock, self._state_lock:
+            self._unindex_resource(resource)
+            resource.name = entry.name
+            resource.metadata = intern_metadata(entry.metadata)
+            resource.invalidate()
+            self._info_bodies[resource.resource_type].invalidate(resource.resource_id)
+            self._index_resource(resource)
+
+    def _remove_resource(self, resource: Resource) -> None:
+        key = (resource.resource_type, resource.resource_id)
+        with self.transaction(resource):
+            resource.force_release()
+            # Changes through stale references no longer reach the registry
+            resource.bind(resource.resource_type, resource.resource_id, None)
+            with self._state_lock:
+                self._unindex_resource(resource)
+                self._handoffs.pop(key, None)
+
+    def _record_event(self, resource: Resource, action: str, user: Optional[str], previous_holder: Optional[str]) -> None:
+        """Queue a reservation history event; call with the state lock held."""
+        self._events.append(
+            (time.time(), resource.resource_type, resource.resource_id, action, user, previous_holder)
         )
 
+    def _on_resource_changed(self, resource: Resource, action: Optional[str], previous_holder: Optional[str]) -> None:
+        """Propagate a state change. `action` is None for state adopted from the shared store."""
+        status = resource.get_status()
+        key = (resource.resource_type, resource.resource_id)
+        with self._state_lock:
+            if action is not None:
+                self._dirty[key] = resource
+                self._record_event(resource, action, resource.taken_by, previous_holder)
+            self._update_indexes(resource, previous_holder)
+            self._info_bodies[resource.resource_type].invalidate(resource.resource_id)
+            self._status_bodies[resource.resource_type].invalidate(resource.resource_id)
+            if resource.taken_by is None and self.waiters.has_waiters(key):
+                self._handoffs[key] = None
+            self.version += 1
+            self._changelog.append(
+                (self.version, resource.resource_type, resource.resource_id, status)
+            )
+        if action is not None:
+            # Health-only changes (and adopted state, see _apply_stored_state) leave the lease alone
+            self._schedule_lease(resource)
+        if self.events.has_subscribers():
+            self.events.publish({
+                "type": "update",
+                "resource_type": resource.resource_type,
+                "resource_id": resource.resource_id,
+                "info": resource.get_info(),
+            })
+
+    def _apply_stored_state(
+        self,
+        resource: Resource,
+        taken_by: Optional[str],
+        taken_at_ts: Optional[float],
+        lease_expires_ts: Optional[float]
+    ) -> None:
+        """Adopt state another process wrote; call with the resource lock held."""
+        previous_holder = resource.taken_by
+        previous_lease = resource.lease_expires_ts
+        if (previous_holder, resource.taken_at_ts, previous_lease) == (taken_by, taken_at_ts, lease_expires_ts):
+            return
+        resource.taken_by = taken_by
+        resource.taken_at_ts = taken_at_ts
+        resource.lease_expires_ts = lease_expires_ts
+        resource.invalidate()
+        self._on_resource_changed(resource, None, previous_holder)
+        if lease_expires_ts != previous_lease:
+            self._schedule_lease(resource)
+
     def get_publisher(self, publisher_id: str) -> Optional[QAPPublisher]:
         """Get a publisher by ID."""
         return self.publishers.get(publisher_id)
@@ -127,11 +396,10 @@ class ResourceRegistry:
 
     def get_publishers_by_type(self, publisher_type: str) -> List[QAPPublisher]:
         """Get all publishers of a specific type (paidpubs, newsroom, smb, android, ios)."""
-        return [
-            pub for pub in self.publishers.values()
-            if pub.metadata.get("type") == publisher_type or
-               pub.metadata.get("platform") == publisher_type
-        ]
+        with self._state_lock:
+            ids = list(self._by_type.get((PUBLISHER, publisher_type), ()))
+        publishers = self.publishers
+        return [publishers[pub_id] for pub_id in ids if pub_id in publishers]
 
     def get_qa_publishers(self) -> List[QAPPublisher]:
         """Get all QA publishers."""
@@ -148,10 +416,114 @@ class ResourceRegistry:
 
     # Status and info methods
     def get_available_publishers(self) -> List[QAPPublisher]:
-        return [pub for pub in self.publishers.values() if pub.taken_by is None]
+        with self._state_lock:
+            ids = list(self._free[PUBLISHER])
+        # Ids are resolved after the lock is released; skip any removed by a catalog reload meanwhile
+        publishers = self.publishers
+        return [publishers[pub_id] for pub_id in ids if pub_id in publishers]
 
     def get_available_environments(self) -> List[StagingEnv]:
-        return [env for env in self.environments.values() if env.taken_by is None]
+        with self._state_lock:
+            ids = list(self._free[ENVIRONMENT])
+        environments = self.environments
+        return [environments[env_id] for env_id in ids if env_id in environments]
+
+    def _all_resources(self) -> List[Resource]:
+        return list(self.publishers.values()) + list(self.environments.values())
+
+    def is_unhealthy(self, resource: Resource) -> bool:
+        """Whether the resource failed its latest health probe, within the health TTL."""
+        return resource.is_unhealthy(self.health.ttl)
+
+    def get_held_by(self, user: str) -> List[Resource]:
+        """Get every resource currently held by a user."""
+        with self._state_lock:
+            keys = list(self._holders.get(user, ()))
+        return [resource for resource in (self.get_resource(*key) for key in keys) if resource is not None]
+
+    def find_resources(
+        self,
+        resource_type: str,
+        holder: Optional[str] = None,
+        type_value: Optional[str] = None,
+        taken: Optional[bool] = None,
+        meta: Optional[List[Tuple[str, Optional[str]]]] = None,
+        after: Optional[str] = None,
+        limit: Optional[int] = None,
+        healthy_only: bool = False
+    ) -> Tuple[List[Resource], Optional[str]]:
+        """Resources matching every filter, in resource_id order after `after`.
+
+        Candidates are walked in resource_id order from just after `after`,
+        taken from the holder's resources or the sorted ids of the type or
+        resource type, whichever is smaller, and checked against the
+        remaining filters until the page is full.
+        `meta` holds (key, value) pairs; a None value only requires the key.
+        `healthy_only` skips resources that failed their latest health probe.
+        Returns the page and the cursor for the next one, if any.
+        """
+        resources = self._resources_of(resource_type)
+        with self._state_lock:
+            held = self._holders.get(holder, {}) if holder is not None else None
+            of_type = self._by_type.get((resource_type, type_value), {}) if type_value is not None else None
+            if held is not None and (of_type is None or len(held) <= len(of_type)):
+                # A user holds few resources, so these are sorted per query
+                ids = sorted(resource_id for kind, resource_id in held if kind == resource_type)
+            elif of_type is not None:
+                ids = self._sorted_index((resource_type, type_value), of_type)
+            else:
+                ids = self._sorted_index(resource_type, resources)
+
+        def matches(resource: Resource) -> bool:
+            if holder is not None and resource.taken_by != holder:
+                return False
+            if taken is not None and (resource.taken_by is not None) != taken:
+                return False
+            if type_value is not None and type_value not in self._type_keys(resource):
+                return False
+            for key, value in meta or ():
+                if key not in resource.metadata:
+                    return False
+                if value is not None and str(resource.metadata[key]) != value:
+                    return False
+            if healthy_only and self.is_unhealthy(resource):
+                return False
+            return True
+
+        # Filters are checked against live state, since the ids were copied under the lock
+        page = []
+        for index in range(0 if after is None else bisect.bisect_right(ids, after), len(ids)):
+            resource = resources.get(ids[index])
+            if resource is not None and matches(resource):
+                page.append(resource)
+                if limit is not None and len(page) > limit:
+                    break
+        next_cursor = None
+        if limit is not None and len(page) > limit:
+            next_cursor = page[limit - 1].resource_id
+            page = page[:limit]
+        return page, next_cursor
+
+    def _sorted_index(self, name: Any, ids: Dict[str, Any]) -> List[str]:
+        """The sorted ids of an index, re-sorted only after it changed; call with the state lock held."""
+        cached = self._sorted_ids.get(name)
+        if cached is None:
+            # Replaced, never modified in place, so callers can walk it unlocked
+            cached = self._sorted_ids[name] = sorted(ids)
+        return cached
+
+    def get_snapshot(self) -> dict:
+        """Full info for every resource, as sent to new /events subscribers."""
+        return {
+            "publishers": {
+                pub_id: pub.get_info()
+                for pub_id, pub in self.publishers.items()
+            },
+            "environments": {
+                env_id: env.get_info()
+                for env_id, env in self.environments.items()
+            }
+        }
 
     def get_all_status(self) -> dict:
         return {
@@ -165,17 +537,459 @@ class ResourceRegistry:
             }
         }
 
+    def metrics_gauges(self) -> List[List[str]]:
+        """Registry size and occupancy, rendered for /metrics."""
+        with self._state_lock:
+            free = {resource_type: len(ids) for resource_type, ids in self._free.items()}
+            pending = len(self._dirty) + len(self._events)
+            version = self.version
+        sizes = {PUBLISHER: len(self.publishers), ENVIRONMENT: len(self.environments)}
+        waiting = {PUBLISHER: 0, ENVIRONMENT: 0}
+        for (resource_type, _), count in self.waiters.queue_lengths().items():
+            waiting[resource_type] += count
+        return [
+            render_gauge("eac_resources", "Resources in the registry.", ("type",),
+                         (((t,), n) for t, n in sizes.items())),
+            render_gauge("eac_resources_taken", "Resources currently reserved.", ("type",),
+                         (((t,), sizes[t] - free[t]) for t in sizes)),
+            render_gauge("eac_waiters", "Take requests waiting for a busy resource.", ("type",),
+                         (((t,), n) for t, n in waiting.items())),
+            render_gauge("eac_event_subscribers", "Connected /events streams.", (),
+                         [((), self.events.subscriber_count())]),
+            render_gauge("eac_pending_changes", "Changed resources and events not yet saved.", (),
+                         [((), pending)]),
+            render_gauge("eac_registry_version", "Version counter of the registry views.", (),
+                         [((), version)]),
+        ]
+
+    # Serialized views, assembled from each resource's cached JSON
+    def publishers_json(self) -> bytes:
+        return self._info_bodies[PUBLISHER].render(self.publishers)
+
+    def environments_json(self) -> bytes:
+        return self._info_bodies[ENVIRONMENT].render(self.environments)
+
+    def snapshot_json(self) -> bytes:
+        """get_snapshot() as JSON bytes."""
+        return b'{"publishers":' + self.publishers_json() + b',"environments":' + self.environments_json() + b"}"
+
+    def status_json(self) -> bytes:
+        """get_all_status() as JSON bytes."""
+        return (
+            b'{"publishers":' + self._status_bodies[PUBLISHER].render(self.publishers)
+            + b',"environments":' + self._status_bodies[ENVIRONMENT].render(self.environments)
+            + b"}"
+        )
+
+    # Versioned views
+    def etag(self, version: Optional[int] = None) -> str:
+        """Entity tag for the registry state at the given (default: current) version."""
+        return f'"{self.epoch}-{self.version if version is None else version}"'
+
+    def get_cached_view(self, name: str, build: Callable[[], bytes]) -> Tuple[int, bytes]:
+        """Return (version, JSON body) for a read view, rebuilding it only after a change."""
+        version = self.version
+        cached = self._view_cache.get(name)
+        if cached is not None and cached[0] == version:
+            return cached
+        body = build()
+        self._view_cache[name] = (version, body)
+        return version, body
+
+    def get_encoded_view(
+        self,
+        name: str,
+        build: Callable[[], bytes],
+        variant: str,
+        encode: Callable[[bytes], Any]
+    ) -> Tuple[int, Any]:
+        """Return (version, encode(JSON body)) for a view, re-encoding only after a change."""
+        version, body = self.get_cached_view(name, build)
+        cached = self._view_cache.get((name, variant))
+        if cached is not None and cached[0] == version:
+            return cached
+        encoded = (version, encode(body))
+        self._view_cache[(name, variant)] = encoded
+        return encoded
+
+    def get_changes_since(self, since: int) -> Tuple[int, Optional[List[dict]]]:
+        """Return (current version, changes after `since`).
+
+        The change list is None when `since` falls outside the retained
+        window (or is ahead of this process), meaning the caller needs a
+        full snapshot instead.
+        """
+        with self._state_lock:
+            version = self.version
+            if since == version:
+                return version, []
+            if since > version or not self._changelog:
+                return version, None
+            # Versions in the changelog are consecutive, so the start is an offset
+            start = since + 1 - self._changelog[0][0]
+            if start < 0:
+                return version, None
+            entries = list(islice(self._changelog, start, None))
+
+        return version, [
+            {
+                "version": entry_version,
+                "resource_type": resource_type,
+                "resource_id": resource_id,
+                "status": status,
+            }
+            for entry_version, resource_type, resource_id, status in entries
+        ]
+
+    # Concurrency
+    @contextmanager
+    def transaction(self, *resources: Resource):
+        """Lock the given resources and persist whatever changed inside the block.
+
+        Locks are taken in (resource_type, resource_id) order so that
+        transactions spanning several resources cannot deadlock.
+        """
+        ordered = sorted(set(resources), key=lambda r: (r.resource_type, r.resource_id))
+        granted: List[Waiter] = []
+        try:
+            with ExitStack() as stack:
+                started = time.perf_counter()
+                for resource in ordered:
+                    stack.enter_context(resource.lock)
+                LOCK_WAIT_SECONDS.observe(time.perf_counter() - started, "resource")
+                # With a shared backend this also refreshes the resources from the store
+                with self.backend.transaction(ordered):
+                    try:
+                        yield
+                    finally:
+                        # Still under the resource locks, so no direct take can get in first
+                        granted = self._hand_off(ordered)
+                        self.save_state()
+        finally:
+            # Woken only once the hand-off has been persisted and the locks released
+            for waiter in granted:
+                self.waiters.notify(waiter)
+            # Resources freed outside a transaction (state adopted from the shared store)
+            self._run_handoffs()
+
+    # Wait queues
+    def take(
+        self,
+        resource: Resource,
+        user: str,
+        ttl: Optional[float] = None,
+        wait_loop: Optional[asyncio.AbstractEventLoop] = None
+    ) -> Tuple[bool, Optional[Waiter]]:
+        """Take a resource, or queue a waiter on `wait_loop` if it is busy.
+
+        The waiter is queued under the resource lock, so a release can't
+        slip in between the failed take and the enqueue.
+        """
+        with self.transaction(resource):
+            if resource.try_to_take(user, ttl):
+                return True, None
+            if wait_loop is None:
+                return False, None
+            key = (resource.resource_type, resource.resource_id)
+            with self._state_lock:
+                self._record_event(resource, "wait", user, resource.taken_by)
+            return False, self.waiters.enqueue(key, user, ttl, wait_loop)
+
+    async def wait_for(self, resource: Resource, waiter: Waiter, timeout: float) -> bool:
+        """Wait for a queued take to be granted. Returns False on timeout."""
+        key = (resource.resource_type, resource.resource_id)
+        granted = await self.waiters.wait(key, waiter, timeout)
+        if not granted:
+            # Persist the wait_timeout event now rather than with the next change
+            await asyncio.to_thread(self.save_state)
+        return granted
+
+    def _on_wait_withdrawn(self, key: Tuple[str, str], waiter: Waiter, action: str) -> None:
+        """Record that a waiter gave up, so the wait is closed in history and analytics."""
+        resource = self.get_resource(*key)
+        if resource is None:
+            return
+        with self._state_lock:
+            self._record_event(resource, action, waiter.user, resource.taken_by)
+
+    def _hand_off(self, locked: List[Resource]) -> List[Waiter]:
+        """Give each free locked resource to the oldest waiter in its queue; call holding their locks."""
+        granted = []
+        for resource in locked:
+            key = (resource.resource_type, resource.resource_id)
+            if key in self._handoffs:
+                with self._state_lock:
+                    self._handoffs.pop(key, None)
+            if resource.taken_by is not None or not self.waiters.has_waiters(key):
+                continue
+            waiter = self.waiters.pop_next(key)
+            if waiter is not None:
+                resource.try_to_take(waiter.user, waiter.ttl, action="handoff")
+                granted.append(waiter)
+        return granted
+
+    def _run_handoffs(self) -> None:
+        """Hand over resources freed without a transaction of their own."""
+        if not self._handoffs or getattr(self._local, "handing_off", False):
+            return
+        self._local.handing_off = True
+        try:
+            while True:
+                with self._state_lock:
+                    if not self._handoffs:
+                        return
+                    key = next(iter(self._handoffs))
+                    del self._handoffs[key]
+                resource = self.get_resource(*key)
+                if resource is None:
+                    # Removed from the catalog
+                    continue
+                # The transaction hands it to the next waiter before unlocking it
+                with self.transaction(resource):
+                    pass
+        finally:
+            self._local.handing_off = False
+
+    def release_all(self, user: str) -> List[Resource]:
+        """Release everything a user holds and persist it in one transaction."""
+        held = self.get_held_by(user)
+        released = []
+        with self.transaction(*held):
+            for resource in held:
+                # Re-checks the holder now that the resource is locked
+                if resource.release(user):
+                    released.append(resource)
+        return released
+
+    def get_resource(self, resource_type: str, resource_id: str) -> Optional[Resource]:
+        """Get a publisher or environment by resource type and ID."""
+        return self._resources_of(resource_type).get(resource_id)
+
+    # Pools
+    def get_pools(self) -> Dict[str, Dict[str, int]]:
+        """Size and free count of every pool."""
+        with self._state_lock:
+            return {
+                pool: {"size": len(members), "free": len(self._pool_free[pool])}
+                for pool, members in sorted(self._pools.items())
+            }
+
+    def get_pool_members(self, pool: str) -> Optional[List[Resource]]:
+        """Every member of a pool, or None if there is no such pool."""
+        with self._state_lock:
+            members = self._pools.get(pool)
+            if members is None:
+                return None
+            keys = list(members)
+        return [resource for resource in (self.get_resource(*key) for key in keys) if resource is not None]
+
+    def acquire_from_pool(
+        self,
+        pool: str,
+        user: str,
+        count: int = 1,
+        ttl: Optional[float] = None
+    ) -> Optional[List[Resource]]:
+        """Take `count` free members of a pool together, or none of them.
+
+        Returns the resources taken, an empty list if fewer than `count`
+        members are free, or None if there is no such pool. Candidates are
+        claimed off the pool's free list under the state lock, most recently
+        freed first, so concurrent acquirers get different members. If one
+        was taken directly before it could be locked, the rest go back on
+        the free list and the claim is retried.
+        """
+        while True:
+            with self._state_lock:
+                if pool not in self._pools:
+                    return None
+                free = self._pool_free[pool]
+                if len(free) < count:
+                    return []
+                claimed = [free.popitem()[0] for _ in range(count)]
+            candidates = [self.get_resource(*key) for key in claimed]
+            live = [resource for resource in candidates if resource is not None]
+
+            with self.transaction(*live):
+                if len(live) == count and all(resource.taken_by is None for resource in live):
+                    for resource in live:
+                        resource.try_to_take(user, ttl)
+                    return live
+
+            with self._state_lock:
+                free = self._pool_free.get(pool)
+                for key, resource in zip(claimed, candidates):
+                    # Skips members taken meanwhile or dropped from the catalog
+                    if (free is not None and resource is not None and resource.taken_by is None
+                            and self.get_resource(*key) is resource and key in self._pools[pool]):
+                        free[key] = None
+
+    def apply_batch(
+        self,
+        operations: List[Tuple[str, str, str, Optional[str], Optional[float]]]
+    ) -> Tuple[bool, List[dict]]:
+        """Apply (action, resource_type, resource_id, user, ttl) operations all-or-nothing.
+
+        Every resource involved is locked for the whole batch, which is
+        checked against the locked state before anything is changed and
+        then persisted in a single commit. Returns (success, results); on
+        failure nothing was applied and results lists the failing operations,
+        with error NOT_FOUND for resources that are no longer in the registry.
+        """
+        targets = [self.get_resource(resource_type, resource_id)
+                   for _, resource_type, resource_id, _, _ in operations]
+
+        with self.transaction(*(resource for resource in targets if resource is not None)):
+            # Dry run, tracking holders as earlier operations would leave them
+            holders: Dict[int, Optional[str]] = {}
+            failures = []
+            for index, ((action, resource_type, resource_id, user, _), resource) in enumerate(zip(operations, targets)):
+                holder = holders.get(id(resource), resource.taken_by) if resource is not None else None
+                error = None
+                # Looked up again under the lock, since a catalog reload may have removed it
+                if resource is None or self.get_resource(resource_type, resource_id) is not resource:
+                    error = NOT_FOUND
+                elif action == "take" and holder is not None:
+                    error = f"already taken by {holder}"
+                elif action == "release" and holder is None:
+                    error = "not taken"
+                elif action == "release" and user is not None and user != holder:
+                    error = f"taken by {holder}, not {user}"
+                if error:
+                    failures.append({
+                        "index": index,
+                        "action": action,
+                        "resource_type": resource_type,
+                        "resource_id": resource_id,
+                        "error": error,
+                    })
+                holders[id(resource)] = None if action == "release" else user
+            if failures:
+                return False, failures
+
+            results = []
+            for (action, resource_type, resource_id, user, ttl), resource in zip(operations, targets):
+                result = {"action": action, "resource_type": resource_type, "resource_id": resource_id}
+                if action == "take":
+                    resource.try_to_take(user, ttl)
+                elif action == "steal":
+                    result["previous_owner"] = resource.steal(user, ttl)["previous_holder"]
+                else:
+                    resource.release(user)
+                result["status"] = resource.get_status()
+                results.append(result)
+            return True, results
+
+    # Leases
+    def _schedule_lease(self, resource: Resource) -> None:
+        if resource.lease_expires_ts is not None:
+            self.leases.schedule(
+                resource.lease_expires_ts,
+                (resource.resource_type, resource.resource_id)
+            )
+
+    def _expire_leases(self, keys: List[Tuple[str, str]]) -> None:
+        """Release resources whose lease has lapsed, persisting the batch in one commit."""
+        due = {key: self.get_resource(*key) for key in keys}
+        due = [resource for resource in due.values() if resource is not None]
+        now = datetime.now()
+        with self.transaction(*due):
+            # Renewed or released leases leave stale heap entries; expire() skips them
+            expired = sum(1 for resource in due if resource.expire(now))
+        if expired:
+            print(f"Expired {expired} lease(s)")
+
+    # Bookings
+    def book(self, resource: Resource, user: str, start: float, end: float) -> Booking:
+        """Book a future window; the owner is given the resource when it starts.
+
+        Raises BookingConflict if the window overlaps another booking, or
+        ValueError if it is empty or already over.
+        """
+        if end <= time.time():
+            raise ValueError("The booking window is already over")
+        booking = self.bookings.book(resource.resource_type, resource.resource_id, user, start, end)
+        self.booking_starts.schedule(booking.start, booking.id)
+        return booking
+
+    def _activate_bookings(self, booking_ids: List[int]) -> None:
+        """Give each booking's owner its resource, leased until the booking ends.
+
+        Whoever holds the resource when a booking starts loses it to the
+        owner, the same as a steal. Cancelled bookings leave stale heap
+        entries, which are skipped here.
+        """
+        now = time.time()
+        due = [self.bookings.get(booking_id) for booking_id in booking_ids]
+        due = [booking for booking in due if booking is not None and booking.activated_at is None]
+        targets = [(booking, self.get_resource(booking.resource_type, booking.resource_id)) for booking in due]
+        targets = [(booking, resource) for booking, resource in targets if resource is not None]
+        with self.transaction(*(resource for _, resource in targets)):
+            for booking, resource in targets:
+                if booking.end > now:
+                    ttl = booking.end - now
+                    if resource.taken_by == booking.user:
+                        resource.renew(booking.user, ttl)
+                    elif not resource.try_to_take(booking.user, ttl):
+                        resource.steal(booking.user, ttl)
+        for booking, _ in targets:
+            self.bookings.mark_activated(booking.id, now)
+        if targets:
+            print(f"Activated {len(targets)} booking(s)")
+
+    # Lifecycle
+    def start(self) -> None:
+        """Start background work (lease expiry, booking activation, catalog watching, shared state sync, health probes)."""
+        self.leases.start()
+        self.booking_starts.start()
+        self.backend.start()
+        if CATALOG_WATCH_SECONDS > 0:
+            self.catalog_watcher.start()
+        if HEALTH_PROBE_SECONDS > 0:
+            self.health.start()
+
+    def shutdown(self) -> None:
+        """Stop background work, flush outstanding changes and close the store."""
+        self.leases.stop()
+        self.booking_starts.stop()
+        self.catalog_watcher.stop()
+        self.health.stop()
+        self.save_state()
+        self.backend.stop()
+        self.persistence.close()
+        self.analytics.close()
+        self.bookings.close()
+
     # Persistence methods
     def _load_state(self) -> None:
         """Load the persisted state on startup."""
-        if self.persistence.load_state(self):
+        with LOAD_STATE_SECONDS.time(self.backend.name):
+            loaded = self.backend.load_state()
+        if loaded:
             print("Successfully loaded resource state from disk")
         else:
             print("No previous state found, starting fresh")
 
     def save_state(self) -> None:
-        """Save the current state to disk."""
-        self.persistence.save_state(self)
+        """Save the resources changed, and history recorded, since the last save."""
+        with self._state_lock:
+            if not self._dirty and not self._events:
+                return
+            dirty, self._dirty = self._dirty, {}
+            events, self._events = self._events, []
+            for resource in dirty.values():
+                resource.dirty = False
+
+        changes = [(resource_type, resource_id, res) for (resource_type, resource_id), res in dirty.items()]
+        with SAVE_STATE_SECONDS.time(self.backend.name):
+            saved = self.backend.save_changes(changes, events)
+        if not saved:
+            # Keep everything pending so the next save retries it
+            with self._state_lock:
+                for key, resource in dirty.items():
+                    self._dirty.setdefault(key, resource)
+                    resource.dirty = True
+                self._events[:0] = events
 
 
 # Global singleton instance
@@ -0,0 +1,84 @@
+import heapq
+import itertools
+import threading
+import time
+from typing import Any, Callable, Hashable, List, Optional
+
+
+class DeadlineScheduler:
+    """Run a callback for keys whose deadline has passed.
+
+    Deadlines live in a min-heap, so scheduling is O(log n) and the worker
+    thread sleeps until the earliest one instead of scanning. Entries are
+    never removed when a deadline moves; the callback is expected to check
+    whether a key is still due, and stale entries are simply dropped.
+    Keys that come due together are handed over in batches.
+    """
+
+    def __init__(
+        self,
+        callback: Callable[[List[Hashable]], Any],
+        name: str = "deadline-scheduler",
+        batch_size: int = 1000
+    ):
+        self._callback = callback
+        self._name = name
+        self._batch_size = batch_size
+        self._heap: List[tuple] = []
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def schedule(self, deadline: float, key: Hashable) -> None:
+        """Call back for `key` once time.time() reaches `deadline`."""
+        with self._cond:
+            earliest = self._heap[0][0] if self._heap else None
+            heapq.heappush(self._heap, (deadline, next(self._counter), key))
+            if earliest is None or deadline < earliest:
+                self._cond.notify()
+
+    def start(self) -> None:
+        with self._cond:
+            if self._thread is not None:
+                return
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name=self._name, daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        with self._cond:
+            thread, self._thread = self._thread, None
+            self._stopping = True
+            self._cond.notify()
+        if thread is not None:
+            thread.join()
+
+    def _take_due(self) -> Optional[List[Hashable]]:
+        """Wait until something is due and pop it, or return None when stopping."""
+        with self._cond:
+            while not self._stopping:
+                now = time.time()
+                if self._heap and self._heap[0][0] <= now:
+                    due = []
+                    while self._heap and self._heap[0][0] <= now and len(due) < self._batch_size:
+                        due.append(heapq.heappop(self._heap)[2])
+                    return due
+                timeout = self._heap[0][0] - now if self._heap else None
+                self._cond.wait(timeout)
+            return None
+
+    def _run(self) -> None:
+        while True:
+            due = self._take_due()
+            if due is None:
+                return
+            try:
+                self._callback(due)
+            except Exception as e:
+                print(f"Error in {self._name}: {e}")
+                import traceback
+                traceback.print_exc()
@@ -0,0 +1,234 @@
+import gzip
+import json
+import threading
+import zlib
+from json.encoder import encode_basestring_ascii
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+MSGPACK_TYPES = (MSGPACK, "application/x-msgpack", "application/vnd.msgpack")
+
+# CompressionMiddleware sends responses smaller than this uncompressed
+MIN_COMPRESS_SIZE = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+def dumps(obj: Any) -> bytes:
+    """Compact JSON bytes, through orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(",", ":")).encode()
+
+
+def loads(body: bytes) -> Any:
+    return orjson.loads(body) if orjson is not None else json.loads(body)
+
+
+def _accepted(header: str) -> Dict[str, float]:
+    """Parse an Accept or Accept-Encoding header into {token: q}."""
+    accepted = {}
+    for part in header.split(","):
+        token, _, params = part.partition(";")
+        token = token.strip().lower()
+        if not token:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[token] = q
+    return accepted
+
+
+def negotiate_media(accept: Optional[str]) -> str:
+    """MessagePack if the client asks for it at least as strongly as JSON and msgpack is installed."""
+    if msgpack is None or not accept:
+        return JSON
+    accepted = _accepted(accept)
+    msgpack_q = max(accepted.get(media, 0.0) for media in MSGPACK_TYPES)
+    json_q = max(accepted.get(media, 0.0) for media in (JSON, "application/*", "*/*"))
+    return MSGPACK if msgpack_q > 0 and msgpack_q >= json_q else JSON
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """The preferred content coding the client accepts: br (when installed), then gzip."""
+    if not accept_encoding:
+        return None
+    accepted = _accepted(accept_encoding)
+    default = accepted.get("*", 0.0)
+    best, best_q = None, 0.0
+    for coding in (("br",) if brotli is not None else ()) + ("gzip",):
+        q = accepted.get(coding, default)
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+def accepts_encoding(accept_encoding: Optional[str], coding: str) -> bool:
+    """Whether the client accepts `coding`, honouring q=0."""
+    if not accept_encoding:
+        return False
+    accepted = _accepted(accept_encoding)
+    return accepted.get(coding, accepted.get("*", 0.0)) > 0
+
+
+def encode_body(body: bytes, media: str, coding: Optional[str]) -> bytes:
+    """Re-encode a JSON body as `media` and compress it with `coding`.
+
+    The registry views always apply the negotiated coding, so that their
+    entity tag follows from the request alone and a 304 needs no encoding.
+    """
+    if media == MSGPACK:
+        body = msgpack.packb(loads(body))
+    if coding is None:
+        return body
+    if coding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+class CompressionMiddleware:
+    """ASGI middleware gzipping large responses for clients that accept gzip.
+
+    Responses that were already negotiated are passed through untouched:
+    those with a Content-Encoding, and those whose Vary lists
+    Accept-Encoding, such as the cached registry views. Server-sent events
+    are never compressed, so they are delivered as they happen.
+    """
+
+    def __init__(self, app, minimum_size: int = MIN_COMPRESS_SIZE, level: int = GZIP_LEVEL):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.level = level
+
+    @staticmethod
+    def _negotiated(headers: MutableHeaders) -> bool:
+        vary = [token.strip().lower() for token in headers.get("vary", "").split(",")]
+        return ("content-encoding" in headers or "accept-encoding" in vary
+                or headers.get("content-type", "").startswith("text/event-stream"))
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not accepts_encoding(Headers(scope=scope).get("accept-encoding"), "gzip"):
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+        compressor = None
+
+        async def send_wrapper(message):
+            nonlocal start, compressor
+            if message["type"] == "http.response.start":
+                # Held back until the first body chunk shows whether to compress
+                start = message
+                return
+            if start is not None:
+                initial, start = start, None
+                body = message.get("body", b"")
+                more_body = message.get("more_body", False)
+                headers = MutableHeaders(raw=initial["headers"])
+                if (message["type"] == "http.response.body" and not self._negotiated(headers)
+                        and (more_body or len(body) >= self.minimum_size)):
+                    compressor = zlib.compressobj(self.level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+                    headers.add_vary_header("Accept-Encoding")
+                    headers["Content-Encoding"] = "gzip"
+                    if more_body:
+                        del headers["Content-Length"]
+                    else:
+                        message["body"] = compressor.compress(body) + compressor.flush()
+                        headers["Content-Length"] = str(len(message["body"]))
+                        await send(initial)
+                        await send(message)
+                        return
+                await send(initial)
+            if compressor is not None and message["type"] == "http.response.body":
+                more_body = message.get("more_body", False)
+                message["body"] = compressor.compress(message.get("body", b"")) + (
+                    b"" if more_body else compressor.flush()
+                )
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+
+def json_object(items: Iterable[Tuple[Any, bytes]]) -> bytes:
+    """Assemble a JSON object from keys and already-serialized values."""
+    return b"{" + b",".join(
+        encode_basestring_ascii(str(key)).encode() + b":" + value
+        for key, value in items
+    ) + b"}"
+
+
+class JsonObjectCache:
+    """A JSON object body kept as blocks of serialized members.
+
+    invalidate(key) marks the block holding that member stale, so after a
+    change only that block is re-joined; the rest of the body is reused no
+    matter how large the object is. Membership is re-read whenever the
+    source dict is replaced or changes size.
+    """
+
+    def __init__(self, value: Callable[[Any], bytes], block_size: int = 256):
+        self._value = value
+        self.block_size = block_size
+        self._source: Optional[Dict[str, Any]] = None
+        self._size = -1
+        self._members: List[List[Tuple[bytes, Any]]] = []
+        # (block number per key, generation per block), replaced together.
+        # Generations are bumped by invalidate(); a block is reused only if
+        # it was built at its current generation.
+        self._layout: Tuple[Dict[str, int], List[int]] = ({}, [])
+        self._blocks: List[Optional[Tuple[int, bytes]]] = []
+        self._lock = threading.Lock()
+
+    def invalidate(self, key: str) -> None:
+        """Mark a member stale. Callers serialize invalidations (the registry's state lock)."""
+        block_of, generations = self._layout
+        block = block_of.get(key)
+        if block is not None:
+            generations[block] += 1
+
+    def _reset(self, source: Dict[str, Any]) -> None:
+        items = [(encode_basestring_ascii(str(key)).encode() + b":", item) for key, item in source.items()]
+        members = [items[i:i + self.block_size] for i in range(0, len(items), self.block_size)]
+        self._members = members
+        self._blocks = [None] * len(members)
+        self._layout = ({key: i // self.block_size for i, key in enumerate(source)}, [0] * len(members))
+        self._source = source
+        self._size = len(source)
+
+    def render(self, source: Dict[str, Any]) -> bytes:
+        with self._lock:
+            if source is not self._source or len(source) != self._size:
+                self._reset(source)
+            generations = self._layout[1]
+            blocks = []
+            for i, members in enumerate(self._members):
+                generation = generations[i]
+                cached = self._blocks[i]
+                if cached is None or cached[0] != generation:
+                    cached = (generation, b",".join(prefix + self._value(item) for prefix, item in members))
+                    self._blocks[i] = cached
+                blocks.append(cached[1])
+        return b"{" + b",".join(blocks) + b"}"
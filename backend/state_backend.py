@@ -0,0 +1,298 @@
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from metrics import LOCK_WAIT_SECONDS, SQLITE_COMMIT_SECONDS
+from persistence import ResourcePersistence
+
+
+class StateConflict(RuntimeError):
+    """A row changed underneath a transaction that should have held it."""
+
+
+class LocalStateBackend:
+    """State is decided in this process and written through ResourcePersistence.
+
+    Correct for a single worker only: other processes sharing the database
+    never see each other's changes.
+    """
+
+    name = "local"
+
+    def __init__(self, registry):
+        self.registry = registry
+
+    def load_state(self) -> bool:
+        return self.registry.persistence.load_state(self.registry)
+
+    @contextmanager
+    def transaction(self, resources: List[Any]):
+        yield
+
+    def save_changes(self, changes: List[Tuple[str, str, Any]], events: List[tuple]) -> bool:
+        return self.registry.persistence.save_changes(changes, events)
+
+    def start(self) -> None:
+        pass
+
+    def stop(self) -> None:
+        pass
+
+
+def _ts(value: Optional[str]) -> Optional[float]:
+    return datetime.fromisoformat(value).timestamp() if value else None
+
+
+class SQLiteStateBackend:
+    """The shared SQLite database is the authority; each process's registry is a cache.
+
+    Every registry transaction runs inside BEGIN IMMEDIATE, which takes the
+    database write lock across all processes. The resources involved are
+    first refreshed from their rows, so decisions see the latest state.
+    Writes are compare-and-swap on each row's seq, and each write stamps
+    the row with a new global change_seq. A sync thread watches
+    PRAGMA data_version and applies rows with a newer change_seq, which
+    updates indexes, views, /events subscribers and wait queues in this
+    process.
+
+    Works for any number of processes that can open the same database
+    file, i.e. several workers on one host. SQLite over a network
+    filesystem is not safe for hosts sharing it.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, registry, sync_interval: Optional[float] = None):
+        self.registry = registry
+        if sync_interval is None:
+            sync_interval = float(os.environ.get("STATE_SYNC_MS", "100")) / 1000
+        self.sync_interval = sync_interval
+
+        # Row seq last seen per resource, and the highest change_seq applied
+        self._seqs: Dict[Tuple[str, str], int] = {}
+        self._seen = 0
+
+        # One connection per thread; in-process writers queue on _write_lock
+        # rather than in SQLite's sleeping busy handler
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def db_path(self):
+        return self.registry.persistence.db_path
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # Autocommit mode; transactions are begun explicitly
+            conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    def load_state(self) -> bool:
+        conn = self._connect()
+        conn.execute("BEGIN")
+        try:
+            row = conn.execute("SELECT value FROM registry_meta WHERE key = 'seq'").fetchone()
+            rows = conn.execute("""
+                SELECT resource_type, resource_id, taken_by, taken_at, lease_expires_at, seq
+                FROM resource_state
+            """).fetchall()
+        finally:
+            conn.execute("COMMIT")
+        self._seen = row[0] if row else 0
+        loaded_any = False
+        for resource_type, resource_id, taken_by, taken_at, lease_expires_at, seq in rows:
+            self._seqs[(resource_type, resource_id)] = seq
+            resource = self.registry.get_resource(resource_type, resource_id)
+            if resource is not None:
+                resource.taken_by = taken_by
+                resource.taken_at_ts = _ts(taken_at)
+                resource.lease_expires_ts = _ts(lease_expires_at)
+                resource.invalidate()
+                loaded_any = True
+        return loaded_any
+
+    def _apply(self, rows: Iterable[tuple]) -> None:
+        """Adopt rows newer than what this process has seen."""
+        for resource_type, resource_id, taken_by, taken_at, lease_expires_at, seq in rows:
+            key = (resource_type, resource_id)
+            resource = self.registry.get_resource(resource_type, resource_id)
+            if resource is None:
+                self._seqs[key] = max(seq, self._seqs.get(key, 0))
+                continue
+            with resource.lock:
+                # A local transaction may have committed a newer write meanwhile
+                if seq <= self._seqs.get(key, 0):
+                    continue
+                self._seqs[key] = seq
+                self.registry._apply_stored_state(resource, taken_by, _ts(taken_at), _ts(lease_expires_at))
+
+    @contextmanager
+    def transaction(self, resources: List[Any]):
+        if getattr(self._local, "depth", 0):
+            # Nested: part of the enclosing transaction
+            self._local.depth += 1
+            try:
+                yield
+            finally:
+                self._local.depth -= 1
+            return
+
+        started = time.perf_counter()
+        with self._write_lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            LOCK_WAIT_SECONDS.observe(time.perf_counter() - started, "database")
+            self._local.depth = 1
+            try:
+                for resource in resources:
+                    self._apply(conn.execute("""
+                        SELECT resource_type, resource_id, taken_by, taken_at, lease_expires_at, seq
+                        FROM resource_state
+                        WHERE resource_type = ? AND resource_id = ?
+                    """, (resource.resource_type, resource.resource_id)))
+                yield
+                with SQLITE_COMMIT_SECONDS.time("shared"):
+                    conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                # Memory may be ahead of what was rolled back; re-read the rows
+                for resource in resources:
+                    self._seqs.pop((resource.resource_type, resource.resource_id), None)
+                self._apply(self._rows_for(conn, resources))
+                raise
+            finally:
+                self._local.depth = 0
+
+    @staticmethod
+    def _rows_for(conn: sqlite3.Connection, resources: List[Any]) -> List[tuple]:
+        return [
+            row for resource in resources
+            for row in conn.execute("""
+                SELECT resource_type, resource_id, taken_by, taken_at, lease_expires_at, seq
+                FROM resource_state
+                WHERE resource_type = ? AND resource_id = ?
+            """, (resource.resource_type, resource.resource_id))
+        ]
+
+    def save_changes(self, changes: List[Tuple[str, str, Any]], events: List[tuple]) -> bool:
+        """Write rows with compare-and-swap inside the current transaction (or a new one)."""
+        if not getattr(self._local, "depth", 0):
+            with self.transaction([]):
+                return self.save_changes(changes, events)
+
+        conn = self._connect()
+        row = conn.execute("SELECT value FROM registry_meta WHERE key = 'seq'").fetchone()
+        change_seq = (row[0] if row else 0) + 1
+        now = datetime.now().isoformat()
+        written = {}
+        for resource_type, resource_id, resource in changes:
+            key = (resource_type, resource_id)
+            expected = self._seqs.get(key, 0)
+            _, _, taken_by, taken_at, lease_expires_at, _ = ResourcePersistence.state_row(
+                resource_type, resource_id, resource, now
+            )
+            cursor = conn.execute("""
+                UPDATE resource_state
+                SET taken_by = ?, taken_at = ?, lease_expires_at = ?, last_updated = ?,
+                    seq = seq + 1, change_seq = ?
+                WHERE resource_type = ? AND resource_id = ? AND seq = ?
+            """, (taken_by, taken_at, lease_expires_at, now, change_seq, resource_type, resource_id, expected))
+            if cursor.rowcount == 0:
+                cursor = conn.execute("""
+                    INSERT INTO resource_state
+                    (resource_type, resource_id, taken_by, taken_at, lease_expires_at, last_updated, seq, change_seq)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (resource_type, resource_id) DO NOTHING
+                """, (resource_type, resource_id, taken_by, taken_at, lease_expires_at, now, expected + 1, change_seq))
+                if cursor.rowcount == 0:
+                    raise StateConflict(f"{resource_type} {resource_id} changed since seq {expected}")
+            written[key] = expected + 1
+        conn.executemany("""
+            INSERT INTO reservation_events
+            (ts, resource_type, resource_id, action, user, previous_holder)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, events)
+        conn.execute("""
+            INSERT INTO registry_meta (key, value) VALUES ('seq', ?)
+            ON CONFLICT (key) DO UPDATE SET value = excluded.value
+        """, (change_seq,))
+        self._seqs.update(written)
+        return True
+
+    def sync(self) -> None:
+        """Apply every change committed since the last sync."""
+        conn = self._connect()
+        rows = conn.execute("""
+            SELECT resource_type, resource_id, taken_by, taken_at, lease_expires_at, seq, change_seq
+            FROM resource_state
+            WHERE change_seq > ?
+            ORDER BY change_seq
+        """, (self._seen,)).fetchall()
+        if not rows:
+            return
+        self._apply(row[:6] for row in rows)
+        self._seen = max(self._seen, rows[-1][6])
+        # Resources freed elsewhere may be owed to waiters parked here
+        self.registry._run_handoffs()
+
+    def _sync_loop(self) -> None:
+        conn = self._connect()
+        data_version = None
+        while not self._stop.wait(self.sync_interval):
+            try:
+                # Changes whenever another connection commits; cheap to poll
+                current = conn.execute("PRAGMA data_version").fetchone()[0]
+                if current != data_version:
+                    data_version = current
+                    self.sync()
+            except Exception as e:
+                print(f"Error syncing shared state: {e}")
+                import traceback
+                traceback.print_exc()
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._sync_loop, name="state-sync", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+        with self._connections_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections = []
+        self._local = threading.local()
+
+
+STATE_BACKENDS = {
+    LocalStateBackend.name: LocalStateBackend,
+    SQLiteStateBackend.name: SQLiteStateBackend,
+}
+
+
+def make_state_backend(registry, name: Optional[str] = None):
+    """Build the backend named by STATE_BACKEND (local or sqlite)."""
+    if name is None:
+        name = os.environ.get("STATE_BACKEND", LocalStateBackend.name)
+    if name not in STATE_BACKENDS:
+        raise ValueError(f"Unknown STATE_BACKEND {name!r}; expected one of {', '.join(STATE_BACKENDS)}")
+    return STATE_BACKENDS[name](registry)
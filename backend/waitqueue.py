@@ -0,0 +1,121 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, Hashable, Optional
+
+
+class Waiter:
+    """A parked take request, resolved on the event loop that created it."""
+
+    def __init__(self, user: str, ttl: Optional[float], loop: asyncio.AbstractEventLoop):
+        self.user = user
+        self.ttl = ttl
+        self.loop = loop
+        self.future: asyncio.Future = loop.create_future()
+        self.enqueued_at = time.monotonic()
+        # Set, under the queue lock, once the resource has been handed to this waiter
+        self.granted = False
+
+    def _resolve(self) -> None:
+        if not self.future.done():
+            self.future.set_result(True)
+
+
+class WaitQueues:
+    """FIFO queues of waiters for busy resources, keyed by resource.
+
+    `on_withdraw(key, waiter, action)` is called when a waiter leaves its
+    queue without being granted: action is "wait_timeout" or "wait_cancel".
+    """
+
+    def __init__(self, on_withdraw: Optional[Callable[[Hashable, Waiter, str], None]] = None):
+        self._queues: Dict[Hashable, Deque[Waiter]] = {}
+        self._lock = threading.Lock()
+        self._on_withdraw = on_withdraw
+
+    def has_waiters(self, key: Hashable) -> bool:
+        return key in self._queues
+
+    def waiting_count(self, key: Hashable) -> int:
+        with self._lock:
+            return len(self._queues.get(key, ()))
+
+    def queue_lengths(self) -> Dict[Hashable, int]:
+        """Queue length per key with waiters."""
+        with self._lock:
+            return {key: len(queue) for key, queue in self._queues.items()}
+
+    def enqueue(
+        self,
+        key: Hashable,
+        user: str,
+        ttl: Optional[float],
+        loop: asyncio.AbstractEventLoop
+    ) -> Waiter:
+        """Park a take request. Call while holding the resource lock so no release is missed."""
+        waiter = Waiter(user, ttl, loop)
+        with self._lock:
+            self._queues.setdefault(key, deque()).append(waiter)
+        return waiter
+
+    def pop_next(self, key: Hashable) -> Optional[Waiter]:
+        """Remove the oldest waiter and mark it granted."""
+        with self._lock:
+            queue = self._queues.get(key)
+            if not queue:
+                return None
+            waiter = queue.popleft()
+            if not queue:
+                del self._queues[key]
+            waiter.granted = True
+            return waiter
+
+    def notify(self, waiter: Waiter) -> None:
+        """Wake a granted waiter on its own event loop."""
+        try:
+            waiter.loop.call_soon_threadsafe(waiter._resolve)
+        except RuntimeError:
+            # The waiter's loop is gone; the grant stands regardless
+            pass
+
+    def cancel(self, key: Hashable, waiter: Waiter) -> bool:
+        """Withdraw a waiter. Returns False if it was already granted."""
+        with self._lock:
+            if waiter.granted:
+                return False
+            queue = self._queues.get(key)
+            if queue is not None:
+                try:
+                    queue.remove(waiter)
+                except ValueError:
+                    pass
+                if not queue:
+                    del self._queues[key]
+            return True
+
+    async def wait(self, key: Hashable, waiter: Waiter, timeout: float) -> bool:
+        """Wait until the waiter is granted the resource or the timeout passes."""
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), timeout)
+            return True
+        except asyncio.TimeoutError:
+            # A grant may have raced the timeout; it counts if it did
+            if not self.cancel(key, waiter):
+                return True
+            self._withdrawn(key, waiter, "wait_timeout")
+            return False
+        except asyncio.CancelledError:
+            if self.cancel(key, waiter):
+                self._withdrawn(key, waiter, "wait_cancel")
+            raise
+
+    def _withdrawn(self, key: Hashable, waiter: Waiter, action: str) -> None:
+        if self._on_withdraw is None:
+            return
+        try:
+            self._on_withdraw(key, waiter, action)
+        except Exception as e:
+            print(f"Error recording withdrawn waiter: {e}")
+            import traceback
+            traceback.print_exc()
@@ -1,4 +1,4 @@
-import { useState, useEffect, useCallback } from 'react';
+import { useState, useEffect } from 'react';
 import {
   AppBar,
   Toolbar,
@@ -18,8 +18,6 @@ import { ResourceCard } from './components/ResourceCard';
 import { apiService } from './services/api';
 import type { ResourceInfo } from './types/resource';
 
-const REFRESH_INTERVAL = 5000; // 5 seconds
-
 function App() {
   const [username, setUsername] = useState<string>(() => {
     return localStorage.getItem('username') || '';
@@ -42,43 +40,39 @@ function App() {
     setSnackbar({ open: true, message, severity });
   };
 
-  const fetchData = useCallback(async () => {
-    try {
-      const [publishersData, environmentsData] = await Promise.all([
-        apiService.getAllPublishers(),
-        apiService.getAllEnvironments(),
-      ]);
-      setPublishers(publishersData);
-      setEnvironments(environmentsData);
-      setLastUpdate(new Date());
-    } catch (error) {
-      console.error('Error fetching data:', error);
-      showSnackbar('Failed to fetch resources', 'error');
-    } finally {
-      setLoading(false);
-    }
-  }, []);
-
   const handleUsernameChange = (newUsername: string) => {
     setUsername(newUsername);
     localStorage.setItem('username', newUsername);
   };
 
   useEffect(() => {
-    // Initial fetch
-    fetchData();
-
-    // Set up polling
-    const interval = setInterval(fetchData, REFRESH_INTERVAL);
-
-    return () => clearInterval(interval);
-  }, [fetchData]);
+    // Subscribe to server-pushed updates instead of polling
+    const source = apiService.subscribeToEvents({
+      onSnapshot: (snapshot) => {
+        setPublishers(snapshot.publishers);
+        setEnvironments(snapshot.environments);
+        setLastUpdate(new Date());
+        setLoading(false);
+      },
+      onUpdate: (update) => {
+        const setResources = update.resource_type === 'publisher' ? setPublishers : setEnvironments;
+        setResources((prev) => ({ ...prev, [update.resource_id]: update.info }));
+        setLastUpdate(new Date());
+      },
+      onError: () => {
+        console.error('Lost connection to event stream, reconnecting');
+        showSnackbar('Lost connection to server, reconnecting...', 'error');
+        setLoading(false);
+      },
+    });
+
+    return () => source.close();
+  }, []);
 
   const handleTakePublisher = async (publisherId: string) => {
     try {
       const result = await apiService.takePublisher(publisherId, username);
       showSnackbar(result.message, result.success ? 'success' : 'error');
-      await fetchData();
     } catch (error) {
       showSnackbar('Failed to take publisher', 'error');
     }
@@ -88,7 +82,6 @@ function App() {
     try {
       const result = await apiService.releasePublisher(publisherId);
       showSnackbar(result.message, result.success ? 'success' : 'error');
-      await fetchData();
     } catch (error) {
       showSnackbar('Failed to release publisher', 'error');
     }
@@ -98,7 +91,6 @@ function App() {
     try {
       const result = await apiService.stealPublisher(publisherId, username);
       showSnackbar(result.message, 'success');
-      await fetchData();
     } catch (error) {
       showSnackbar('Failed to steal publisher', 'error');
     }
@@ -108,7 +100,6 @@ function App() {
     try {
       const result = await apiService.takeEnvironment(envName, username);
       showSnackbar(result.message, result.success ? 'success' : 'error');
-      await fetchData();
     } catch (error) {
       showSnackbar('Failed to take environment', 'error');
     }
@@ -118,7 +109,6 @@ function App() {
     try {
       const result = await apiService.releaseEnvironment(envName);
       showSnackbar(result.message, result.success ? 'success' : 'error');
-      await fetchData();
     } catch (error) {
       showSnackbar('Failed to release environment', 'error');
     }
@@ -128,7 +118,6 @@ function App() {
     try {
       const result = await apiService.stealEnvironment(envName, username);
       showSnackbar(result.message, 'success');
-      await fetchData();
     } catch (error) {
       showSnackbar('Failed to steal environment', 'error');
     }
@@ -100,6 +100,19 @@ export const ResourceCard = ({
           </Typography>
         )}
 
+        {resource.is_taken && resource.lease_expires_at && (
+          <Typography variant="caption" display="block" color="text.secondary">
+            Lease expires: {new Date(resource.lease_expires_at).toLocaleString()}
+          </Typography>
+        )}
+
+        {resource.health && !resource.health.healthy && (
+          <Typography variant="caption" display="block" color="error">
+            Unhealthy since {new Date(resource.health.since).toLocaleString()}
+            {resource.health.error && `: ${resource.health.error}`}
+          </Typography>
+        )}
+
         {resource.metadata && Object.keys(resource.metadata).length > 0 && (
           <Box mt={2}>
             {Object.entries(resource.metadata).map(([key, value]) => (
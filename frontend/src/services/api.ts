@@ -1,5 +1,11 @@
 import axios from 'axios';
-import type { ResourceInfo, AllResourcesStatus, ActionResponse } from '../types/resource';
+import type {
+  ResourceInfo,
+  AllResourcesStatus,
+  ActionResponse,
+  ResourcesSnapshot,
+  ResourceUpdate,
+} from '../types/resource';
 
 const VITE_API_URL = import.meta.env.VITE_API_URL;
 const VITE_API_URL_DEFAULT = 'http://localhost:8000';
@@ -12,7 +18,29 @@ const api = axios.create({
   },
 });
 
+export interface EventHandlers {
+  onSnapshot: (snapshot: ResourcesSnapshot) => void;
+  onUpdate: (update: ResourceUpdate) => void;
+  onError?: () => void;
+}
+
 export const apiService = {
+  // Live updates: a snapshot on (re)connect, then one update per change.
+  // EventSource reconnects on its own and the server resends the snapshot.
+  subscribeToEvents(handlers: EventHandlers): EventSource {
+    const source = new EventSource(`${API_BASE_URL}/events`);
+    source.addEventListener('snapshot', (event) => {
+      handlers.onSnapshot(JSON.parse((event as MessageEvent).data));
+    });
+    source.addEventListener('update', (event) => {
+      handlers.onUpdate(JSON.parse((event as MessageEvent).data));
+    });
+    if (handlers.onError) {
+      source.onerror = handlers.onError;
+    }
+    return source;
+  },
+
   // Get current system username
   async getUsername(): Promise<string> {
     const response = await api.get<{ username: string }>('/api/whoami');
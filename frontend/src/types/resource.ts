@@ -1,8 +1,16 @@
+export interface ResourceHealth {
+  healthy: boolean;
+  since: string;
+  error: string | null;
+}
+
 export interface ResourceInfo {
   name: string;
   is_taken: boolean;
   taken_by: string | null;
   taken_at: string | null;
+  lease_expires_at: string | null;
+  health: ResourceHealth | null;
   metadata: Record<string, any>;
 }
 
@@ -10,6 +18,8 @@ export interface ResourceStatus {
   is_taken: boolean;
   taken_by: string | null;
   taken_at: string | null;
+  lease_expires_at: string | null;
+  health: ResourceHealth | null;
 }
 
 export interface AllResourcesStatus {
@@ -23,3 +33,17 @@ export interface ActionResponse {
   status: ResourceStatus;
   previous_owner?: string;
 }
+
+export type ResourceType = 'publisher' | 'environment';
+
+export interface ResourcesSnapshot {
+  publishers: Record<string, ResourceInfo>;
+  environments: Record<string, ResourceInfo>;
+}
+
+export interface ResourceUpdate {
+  type: 'update';
+  resource_type: ResourceType;
+  resource_id: string;
+  info: ResourceInfo;
+}